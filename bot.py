@@ -8,9 +8,10 @@ from telebot.types import BotCommand
 from telebot.storage import StateMemoryStorage
 
 import config
-from utils.scheduler import init_scheduler
+from utils import leader, search, warmup
+from utils.scheduler import init_scheduler, pause_scheduler
 from utils.storage import ensure_data_dir
-from utils.crosspost import init_bot
+from utils.crosspost import get_bot_user, init_bot, warm_post_images
 
 # Set up logging
 logging.basicConfig(
@@ -42,6 +43,22 @@ def setup_commands():
     # This limitation is present in the telebot API
     logger.info("Admin commands will be handled based on user ID since telebot doesn't support scoped commands")
 
+def start_warmup():
+    """Start the startup work that users don't have to wait for in the background."""
+    warmup.start_task("setup_commands", setup_commands)
+    warmup.start_task("resolve_bot_user", get_bot_user)
+    warmup.start_task("build_search_index", search.build_index)
+
+def start_runner_duties():
+    """Start the background work only one instance may do, once this instance is elected."""
+    init_scheduler()
+    warmup.start_task("warm_post_images", warm_post_images)
+
+def stop_runner_duties():
+    """Hand the background work over to the instance that took over the runner lease."""
+    pause_scheduler()
+    bot.stop_polling()
+
 def register_handlers():
     """Register message handlers."""
     from handlers.channel import register_channel_handlers
@@ -69,16 +86,21 @@ def main() -> None:
     # Register handlers
     register_handlers()
     
-    # Setup commands
-    setup_commands()
+    # Only the instance holding the runner lease runs the scheduler and polls
+    leader.start(start_runner_duties, stop_runner_duties)
     
-    # Initialize the scheduler
-    init_scheduler()
+    # Everything else is warmed up while the bot already serves users
+    start_warmup()
+    warmup.mark_started()
     
     logger.info("Bot started")
     
     # Start the Bot (this should be the last step as it's blocking)
-    bot.polling(none_stop=True, interval=0)
+    while True:
+        leader.wait_until_leader()
+        bot.polling(none_stop=True, interval=0)
+        if leader.is_leader():
+            break
 
 def initialize() -> telebot.TeleBot:
     """Initialize the bot without starting polling.
@@ -100,11 +122,12 @@ def initialize() -> telebot.TeleBot:
     # Register handlers
     register_handlers()
     
-    # Setup commands
-    setup_commands()
+    # Only the instance holding the runner lease runs the scheduler; web requests are served by every instance
+    leader.start(start_runner_duties, stop_runner_duties)
     
-    # Initialize the scheduler
-    init_scheduler()
+    # Everything else is warmed up while the bot already serves users
+    start_warmup()
+    warmup.mark_started()
     
     logger.info("Bot started")
     
@@ -17,12 +17,138 @@ DATA_DIR = "data"
 CHANNELS_FILE = os.path.join(DATA_DIR, "channels.json")
 PENDING_FILE = os.path.join(DATA_DIR, "pending.json")
 SCHEDULE_FILE = os.path.join(DATA_DIR, "schedule.json")
+OUTBOX_DB = os.path.join(DATA_DIR, "outbox.db")
+SCHEDULER_DB = os.path.join(DATA_DIR, "scheduler.db")
+JOBS_DB = os.path.join(DATA_DIR, "jobs.db")
+MEDIA_CACHE_FILE = os.path.join(DATA_DIR, "media.json")
+CIRCUIT_BREAKERS_FILE = os.path.join(DATA_DIR, "breakers.json")
+PREFLIGHT_FILE = os.path.join(DATA_DIR, "preflight.json")
+SENDER_ASSIGNMENTS_FILE = os.path.join(DATA_DIR, "senders.json")
+SUBSCRIBER_REFRESH_FILE = os.path.join(DATA_DIR, "refresh.json")
+STATS_FILE = os.path.join(DATA_DIR, "stats.json")
+DATA_LOCK_FILE = os.path.join(DATA_DIR, "storage.lock")  # Held by storage transactions
 
 # Crossposting settings
 MAX_CHANNELS_PER_POST = 10
+SMALL_CHANNEL_THRESHOLD = 300  # Channels below this many subscribers get priority in crossposts
+STATS_SUBSCRIBER_BUCKETS = (100, SMALL_CHANNEL_THRESHOLD, 1000, 5000, 10000)  # Bounds of the channel size histogram
 KYIV_TIMEZONE = ZoneInfo("Europe/Kiev")  # For Python 3.9+ compatibility 
 CROSSPOST_START_TIME = time(15, 0, 0)  # 3:00 PM Kyiv time
 CROSSPOST_END_TIME = time(18, 0, 0)    # 6:00 PM Kyiv time
+CROSSPOST_POST_TIME = time(18, 0, 0)   # Daily crosspost goes out at 6:00 PM Kyiv time
+
+def _parse_times(value: str) -> list:
+    """Parse a comma-separated list of HH:MM times."""
+    return [time.fromisoformat(part.strip()) for part in value.split(",") if part.strip()]
+
+# Daily posting slots, as comma-separated HH:MM Kyiv times, optionally set
+# apart for SFW and NSFW channels. Every slot is planned and sent on its own;
+# in window mode a slot is the end of a window as long as the one from
+# CROSSPOST_START_TIME to CROSSPOST_END_TIME.
+CROSSPOST_SLOTS = _parse_times(os.getenv("CROSSPOST_SLOTS", "")) or [CROSSPOST_POST_TIME]
+CROSSPOST_GROUP_SLOTS = {
+    "sfw": _parse_times(os.getenv("CROSSPOST_SFW_SLOTS", "")) or CROSSPOST_SLOTS,
+    "nsfw": _parse_times(os.getenv("CROSSPOST_NSFW_SLOTS", "")) or CROSSPOST_SLOTS,
+}
+
+# "burst" sends everything at CROSSPOST_POST_TIME; "window" spreads the sends
+# between CROSSPOST_START_TIME and CROSSPOST_END_TIME, largest audiences first
+CROSSPOST_DELIVERY_MODE = os.getenv("CROSSPOST_DELIVERY_MODE", "burst")
+
+# Upper bound on crosspost sends per second, to stay clear of Telegram's flood limits
+CROSSPOST_MAX_SENDS_PER_SECOND = float(os.getenv("CROSSPOST_MAX_SENDS_PER_SECOND", "20"))
+
+# "sync" sends crossposts and refreshes subscriber counts one request at a time
+# from the calling thread; "async" runs them concurrently on an asyncio loop
+# with telebot's async client (requires aiohttp)
+CROSSPOST_ENGINE = os.getenv("CROSSPOST_ENGINE", "sync")
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "200"))  # Requests in flight at once
+ASYNC_MAX_CONNECTIONS = 100  # Size of the shared aiohttp connection pool
+
+# The "process" engine splits large crosspost runs into shards delivered by a
+# pool of worker processes, each with its own HTTP session and an equal slice
+# of CROSSPOST_MAX_SENDS_PER_SECOND
+CROSSPOST_WORKER_PROCESSES = int(os.getenv("CROSSPOST_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+CROSSPOST_SHARD_MIN_DELIVERIES = 1000  # Smaller runs are delivered in-process
+# Python interpreter the worker processes are started with; under uWSGI the
+# server's own interpreter is found next to sys.prefix unless this is set
+CROSSPOST_WORKER_PYTHON = os.getenv("CROSSPOST_WORKER_PYTHON")
+
+# Extra bots that share the crosspost sends, each under its own flood limit.
+# A channel is posted to by a sender bot that is an admin there, or by the
+# main bot, which also keeps handling all user interaction.
+SENDER_TOKENS = [token.strip() for token in os.getenv("SENDER_BOT_TOKENS", "").split(",") if token.strip()]
+SENDER_CHECK_WORKERS = 8  # Threads checking where sender bots can post, each sender bot under its own limiter
+
+# Base URL of the Bot API, e.g. a local Bot API server or a stand-in for testing
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Subscriber counts are refreshed continuously, a few channels per tick. Each
+# channel's interval adapts to how fast its count changes and how close it is
+# to SMALL_CHANNEL_THRESHOLD.
+SUBSCRIBER_REFRESH_TICK_SECONDS = 60
+SUBSCRIBER_REFRESH_MIN_MINUTES = 15
+SUBSCRIBER_REFRESH_MAX_MINUTES = 360
+SUBSCRIBER_COUNT_MAX_ATTEMPTS = 3  # Tries per count while Telegram answers with flood waits
+
+# Scheduled jobs are kept in SCHEDULER_DB, so runs that were due while the bot
+# was down are caught up on after a restart, if it's within the grace period.
+# A crosspost caught up on late is delivered within CROSSPOST_CATCHUP_WINDOW_MINUTES.
+SCHEDULER_MISFIRE_GRACE_MINUTES = int(os.getenv("SCHEDULER_MISFIRE_GRACE_MINUTES", "240"))
+CROSSPOST_CATCHUP_WINDOW_MINUTES = 30
+
+# Operations started from the web interface run as background jobs, this many at a time
+JOB_WORKERS = 2
+
+# Only the instance holding the runner lease runs the scheduler and polling.
+# It renews the lease every LEADER_HEARTBEAT_SECONDS; another instance takes
+# over once the lease has gone LEADER_LEASE_SECONDS without a renewal.
+LEADER_LEASE_SECONDS = 30
+LEADER_HEARTBEAT_SECONDS = 10
+
+# Crossposts and full subscriber updates run one at a time across all
+# instances; a caller that comes in while one is running waits for it and gets
+# its result. Manual callers also reuse a result that is at most this old.
+# An operation whose instance died is given up after OPERATION_LEASE_SECONDS.
+CROSSPOST_COOLDOWN_SECONDS = 60
+SUBSCRIBER_UPDATE_COOLDOWN_SECONDS = 300
+OPERATION_LEASE_SECONDS = 60
+OPERATION_POLL_SECONDS = 1
+
+# Live dashboard updates (/api/events) are streamed by a small asyncio server,
+# which uWSGI proxies to from offload threads, so idle connections don't hold
+# worker threads. Changes are picked up every EVENTS_POLL_SECONDS.
+EVENTS_HOST = "127.0.0.1"
+EVENTS_PORT = int(os.getenv("EVENTS_PORT", "5001"))
+EVENTS_POLL_SECONDS = 1
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_MAX_CLIENTS = 500
+
+# Imports (/api/import) are saved this many records at a time, each chunk in a
+# transaction of its own, so the bot isn't locked out of the data for long
+IMPORT_CHUNK_SIZE = 2000
+
+# Retries of crosspost sends that failed transiently (timeouts, 5xx, flood waits)
+CROSSPOST_MAX_SEND_ATTEMPTS = 5
+CROSSPOST_RETRY_BASE_SECONDS = 60    # Doubled after every failed attempt
+CROSSPOST_RETRY_MAX_SECONDS = 1800
+CROSSPOST_RETRY_CHECK_SECONDS = 30   # How often due retries are picked up
+
+# Channels that keep failing permanently (bot kicked, chat deleted) are skipped
+# after this many consecutive failures, and only probed again every few hours
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_PROBE_HOURS = 6
+
+# How long before the daily crosspost its plan is built (selection, captions, image, membership checks)
+CROSSPOST_PLAN_LEAD_MINUTES = int(os.getenv("CROSSPOST_PLAN_LEAD_MINUTES", "15"))
+
+# How long before the daily crosspost the bot checks it can still post to every channel
+CROSSPOST_PREFLIGHT_LEAD_MINUTES = int(os.getenv("CROSSPOST_PREFLIGHT_LEAD_MINUTES", "120"))
+PREFLIGHT_WORKERS = 8
+PREFLIGHT_MAX_REQUESTS_PER_SECOND = 20
+
+# Optional chat (e.g. a private admin channel) used to upload post images ahead of time
+MEDIA_CACHE_CHAT_ID = os.getenv("MEDIA_CACHE_CHAT_ID")
 
 # Default message text
 CROSSPOST_HEADER = "Українське ТҐ-Комʼюніті Презентує:"
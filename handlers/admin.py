@@ -8,9 +8,9 @@ from telebot import types
 from bot import user_dict
 
 import config
-from utils import storage
+from utils import breaker, search, storage
 from utils.scheduler import schedule_immediate_crosspost
-from utils.crosspost import update_all_channel_subscribers
+from utils.crosspost import escape_markdown, update_all_channel_subscribers
 
 logger = logging.getLogger(__name__)
 
@@ -272,7 +272,7 @@ def admin_update_subscribers_command(message, bot):
     
     try:
         # Run the update function
-        update_all_channel_subscribers()
+        update_all_channel_subscribers(cooldown=config.SUBSCRIBER_UPDATE_COOLDOWN_SECONDS)
         
         # Confirm completion
         bot.edit_message_text(
@@ -296,18 +296,15 @@ def admin_stats_command(message, bot):
         bot.reply_to(message, "You don't have permission to use this command.")
         return
     
-    approved_channels = storage.get_channels()
-    pending_channels = storage.get_pending_channels()
-    
-    sfw_count = sum(1 for c in approved_channels.values() if c.get("is_sfw", True))
-    nsfw_count = len(approved_channels) - sfw_count
+    network_stats = storage.get_network_stats()
     
     stats = (
         "*Network Statistics*\n\n"
-        f"Total approved channels: {len(approved_channels)}\n"
-        f"SFW channels: {sfw_count}\n"
-        f"NSFW channels: {nsfw_count}\n"
-        f"Pending applications: {len(pending_channels)}\n"
+        f"Total approved channels: {network_stats['total_channels']}\n"
+        f"SFW channels: {network_stats['sfw_channels']}\n"
+        f"NSFW channels: {network_stats['nsfw_channels']}\n"
+        f"Total subscribers: {network_stats['total_subscribers']}\n"
+        f"Pending applications: {network_stats['pending_applications']}\n"
     )
     
     # Create markup with buttons to view channels and back to admin panel
@@ -320,6 +317,81 @@ def admin_stats_command(message, bot):
     
     bot.reply_to(message, stats, parse_mode="Markdown", reply_markup=markup)
 
+# Admin inline channel search
+INLINE_SEARCH_RESULTS = 20
+
+def admin_inline_search(inline_query, bot):
+    """Answer an inline query with the channels matching it, so admins can find and share any channel from any chat."""
+    if not is_admin(inline_query.from_user.id):
+        bot.answer_inline_query(inline_query.id, [], cache_time=300, is_personal=True)
+        return
+    
+    query = inline_query.query.strip()
+    if query:
+        matches = search.search(query, limit=INLINE_SEARCH_RESULTS)
+    else:
+        # Without a query, show the largest channels
+        largest = storage.query_channels(sort=storage.SORT_SUBSCRIBERS, descending=True,
+                                         page_size=INLINE_SEARCH_RESULTS)
+        matches = [search.to_result(channel_id, channel_data)
+                   for channel_id, channel_data in largest["channels"].items()]
+    
+    results = []
+    for match in matches:
+        channel_type = "SFW" if match["is_sfw"] else "NSFW"
+        username = f"@{match['username']}" if match["username"] else "no username"
+        message_text = (
+            f"*Channel:* {escape_markdown(match['title'] or 'Unknown')}\n"
+            f"{escape_markdown(username)}\n"
+            f"Subscribers: {match['subscribers']}\n"
+            f"Type: {channel_type}\n"
+            f"ID: `{match['channel_id']}`"
+        )
+        results.append(types.InlineQueryResultArticle(
+            id=match["channel_id"],
+            title=match["title"] or "Unknown",
+            description=f"{username} · {match['subscribers']} subscribers · {channel_type}",
+            input_message_content=types.InputTextMessageContent(message_text, parse_mode="Markdown")
+        ))
+    
+    try:
+        bot.answer_inline_query(inline_query.id, results, cache_time=10, is_personal=True)
+    except Exception as e:
+        logger.error(f"Error answering inline query: {e}")
+
+# Admin circuit breaker view
+def show_open_breakers(call, bot):
+    """Show the channels whose circuit breaker is open, with buttons to reset them."""
+    open_breakers = breaker.get_open_breakers()
+    channels = storage.get_channels()
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    
+    if open_breakers:
+        message_text = (
+            "*Open Circuit Breakers*\n\n"
+            "These channels kept failing and are skipped until their next probe:\n\n"
+        )
+        for idx, (channel_id, state) in enumerate(open_breakers.items(), 1):
+            title = channels.get(channel_id, {}).get("title", "Unknown")
+            next_probe = state["next_probe_at"][:16].replace("T", " ")
+            message_text += (
+                f"{idx}. {escape_markdown(title)} ({channel_id})\n"
+                f"   {escape_markdown(state.get('last_error', ''))}\n"
+                f"   Next probe: {next_probe}\n"
+            )
+            markup.add(types.InlineKeyboardButton(f"Reset {title}", callback_data=f"reset_breaker_{channel_id}"))
+    else:
+        message_text = "*Open Circuit Breakers*\n\nAll channels are reachable."
+    
+    markup.add(types.InlineKeyboardButton("« Back to Admin Panel", callback_data="admin_back"))
+    bot.edit_message_text(
+        message_text,
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=markup
+    )
+
 # Admin callback handler
 def admin_callback_handler(call, bot):
     """Handle callbacks for admin actions."""
@@ -428,7 +500,7 @@ def admin_callback_handler(call, bot):
                 parse_mode="Markdown"
             )
             bot.answer_callback_query(call.id, "Failed to reject channel!")
-    
+            
     elif data.startswith("remove_"):
         channel_id = data[len("remove_"):]
         # Get channel info before removal
@@ -476,7 +548,7 @@ def admin_callback_handler(call, bot):
                 parse_mode="Markdown"
             )
             bot.answer_callback_query(call.id, "Failed to remove channel!")
-            
+        
     elif data == "view_pending":
         # Show pending applications
         bot.answer_callback_query(call.id, "Loading pending applications...")
@@ -525,11 +597,25 @@ def admin_callback_handler(call, bot):
         # Call the stats command
         admin_stats_command(fake_message, bot)
         
+    elif data == "view_breakers":
+        # Show channels that are skipped because they keep failing
+        bot.answer_callback_query(call.id, "Loading circuit breakers...")
+        show_open_breakers(call, bot)
+    
+    elif data.startswith("reset_breaker_"):
+        channel_id = data[len("reset_breaker_"):]
+        if breaker.reset(channel_id):
+            logger.info(f"Admin {user_id} reset the circuit breaker for channel {channel_id}")
+            bot.answer_callback_query(call.id, "Circuit breaker reset!")
+        else:
+            bot.answer_callback_query(call.id, "Circuit breaker was already closed.")
+        show_open_breakers(call, bot)
+        
     elif data == "update_subscribers":
         # Manually update subscriber counts
         logger.info("Admin callback: update_subscribers")
         bot.answer_callback_query(call.id, "Starting subscriber count update...")
-        
+            
         # Display processing message
         processing_message = bot.send_message(
             call.message.chat.id,
@@ -538,7 +624,7 @@ def admin_callback_handler(call, bot):
         
         try:
             # Execute the update function
-            update_all_channel_subscribers()
+            update_all_channel_subscribers(cooldown=config.SUBSCRIBER_UPDATE_COOLDOWN_SECONDS)
             
             # Update the processing message
             bot.edit_message_text(
@@ -560,7 +646,7 @@ def admin_callback_handler(call, bot):
                 parse_mode="Markdown",
                 reply_markup=markup
             )
-            
+        
         except Exception as e:
             # Update the processing message with error
             error_message = f"❌ Error updating subscriber counts: {str(e)}"
@@ -570,7 +656,7 @@ def admin_callback_handler(call, bot):
                 processing_message.message_id
             )
             logger.error(f"Manual subscriber count update failed: {e}")
-        
+    
     elif data == "trigger_post":
         # Trigger a manual crosspost
         logger.info("Admin callback: trigger_post")
@@ -658,7 +744,7 @@ def admin_callback_handler(call, bot):
             parse_mode="Markdown",
             reply_markup=markup
         )
-        
+            
         # Store the image type in user_dict for this user
         user_id = str(call.from_user.id)
         from bot import user_dict
@@ -701,7 +787,7 @@ def admin_callback_handler(call, bot):
         if not channel_data:
             bot.answer_callback_query(call.id, "Channel not found!")
             return
-            
+        
         channel_title = channel_data.get("title", "Unknown")
         channel_username = channel_data.get("username", "")
         channel_emojis = " ".join(channel_data.get("emojis", []))
@@ -737,13 +823,13 @@ def admin_callback_handler(call, bot):
             toggle_sfw_text, 
             callback_data=f"toggle_sfw_{channel_id}"
         ))
-        
+            
         # Edit emojis button
         markup.add(types.InlineKeyboardButton(
             "Edit Emojis", 
             callback_data=f"edit_emojis_{channel_id}"
         ))
-        
+            
         # Edit schedule button
         markup.add(types.InlineKeyboardButton(
             "Edit Schedule", 
@@ -767,7 +853,7 @@ def admin_callback_handler(call, bot):
             "« Back to Channels List", 
             callback_data="view_approved"
         ))
-        
+            
         # Format the channel details message
         message_text = (
             f"*Channel Management: {channel_title}*\n\n"
@@ -776,7 +862,7 @@ def admin_callback_handler(call, bot):
         
         if channel_username:
             message_text += f"Username: @{channel_username}\n"
-            
+        
         message_text += f"Type: {is_sfw} {is_sfw_icon}\n"
         message_text += f"{subscriber_text}\n"
         
@@ -786,7 +872,7 @@ def admin_callback_handler(call, bot):
         
         if channel_emojis:
             message_text += f"Emojis: {channel_emojis}\n"
-            
+        
         message_text += f"\n{schedule_text}"
         
         # Send the message with the management options
@@ -808,22 +894,20 @@ def admin_callback_handler(call, bot):
             logger.warning(f"Channel not found when toggling SFW status: {channel_id}")
             bot.answer_callback_query(call.id, "Channel not found!")
             return
-            
+        
         channel_data = channels[channel_id]
         channel_title = channel_data.get("title", "Unknown")
         is_currently_sfw = channel_data.get("is_sfw", True)
         old_status = "SFW" if is_currently_sfw else "NSFW"
         
         # Toggle SFW status
-        channel_data["is_sfw"] = not is_currently_sfw
-        new_status = "SFW" if channel_data["is_sfw"] else "NSFW"
+        new_status = "NSFW" if is_currently_sfw else "SFW"
         
         logger.info(f"Changing channel '{channel_title}' ({channel_id}) from {old_status} to {new_status}")
         
         # Save updated channel data
-        channels[channel_id] = channel_data
-        success = storage.save_channels(channels)
-        
+        success = storage.set_channel_sfw(channel_id, not is_currently_sfw)
+            
         if success:
             # Show confirmation popup
             bot.answer_callback_query(
@@ -862,7 +946,7 @@ def admin_callback_handler(call, bot):
                 "Failed to update channel status! Check server logs.",
                 show_alert=True
             )
-    
+        
     elif data.startswith("edit_schedule_"):
         channel_id = data[len("edit_schedule_"):]
         
@@ -894,7 +978,7 @@ def admin_callback_handler(call, bot):
             "« Back to Channel Details",
             callback_data=f"manage_{channel_id}"
         ))
-        
+            
         # Send the schedule edit message
         bot.edit_message_text(
             f"*Edit Schedule for {channel_title}*\n\n"
@@ -904,14 +988,14 @@ def admin_callback_handler(call, bot):
             parse_mode="Markdown",
             reply_markup=markup
         )
-        
+            
     elif data.startswith("toggle_day_"):
         # Format: toggle_day_<channel_id>_<day_idx>
         parts = data.split("_")
         if len(parts) != 4:
             bot.answer_callback_query(call.id, "Invalid callback data!")
             return
-            
+        
         channel_id = parts[2]
         day_idx = int(parts[3])
         
@@ -933,7 +1017,7 @@ def admin_callback_handler(call, bot):
             admin_callback_handler(fake_callback, bot)
         else:
             bot.answer_callback_query(call.id, "Failed to update schedule!")
-            
+    
     elif data.startswith("edit_emojis_"):
         channel_id = data[len("edit_emojis_"):]
         
@@ -942,11 +1026,11 @@ def admin_callback_handler(call, bot):
         if channel_id not in channels:
             bot.answer_callback_query(call.id, "Channel not found!")
             return
-            
+        
         channel_data = channels[channel_id]
         channel_title = channel_data.get("title", "Unknown")
         current_emojis = channel_data.get("emojis", [])
-        
+            
         # Create a message asking the user to enter new emojis
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton(
@@ -975,7 +1059,7 @@ def admin_callback_handler(call, bot):
         
         # For now, this is not fully implemented since it requires state handling for admin operations
         # In a full implementation, we would add a state handler for emoji messages
-    
+        
     elif data.startswith("set_position_"):
         channel_id = data[len("set_position_"):]
         
@@ -984,7 +1068,7 @@ def admin_callback_handler(call, bot):
         if channel_id not in channels:
             bot.answer_callback_query(call.id, "Channel not found!")
             return
-            
+        
         channel_data = channels[channel_id]
         channel_title = channel_data.get("title", "Unknown")
         is_sfw = channel_data.get("is_sfw", True)
@@ -1012,7 +1096,7 @@ def admin_callback_handler(call, bot):
                 btn_text, callback_data=f"save_position_{channel_id}_{i}"
             ))
         markup.add(*position_buttons_2)
-        
+            
         # Clear button - remove reserved position
         markup.add(types.InlineKeyboardButton(
             "Clear Reserved Position", 
@@ -1044,14 +1128,14 @@ def admin_callback_handler(call, bot):
         )
         
         bot.answer_callback_query(call.id, "Select a position")
-        
+    
     elif data.startswith("save_position_"):
         # Format: save_position_<channel_id>_<position>
         parts = data.split("_")
         if len(parts) != 4:
             bot.answer_callback_query(call.id, "Invalid callback data!")
             return
-            
+        
         channel_id = parts[2]
         position = int(parts[3])
         
@@ -1106,6 +1190,7 @@ def create_admin_markup():
         types.InlineKeyboardButton("View Approved Channels", callback_data="view_approved"),
         types.InlineKeyboardButton("View Pending Applications", callback_data="view_pending"),
         types.InlineKeyboardButton("Network Statistics", callback_data="view_stats"),
+        types.InlineKeyboardButton("Circuit Breakers", callback_data="view_breakers"),
         types.InlineKeyboardButton("Trigger Manual Crosspost", callback_data="trigger_post"),
         types.InlineKeyboardButton("Update Subscriber Counts", callback_data="update_subscribers"),
         types.InlineKeyboardButton("Manage Post Images", callback_data="manage_images")
@@ -1151,7 +1236,7 @@ def handle_admin_photo(message, bot):
     
     # Clear the user state
     user_dict.pop(user_id, None)
-    
+        
     # Show the admin panel again
     bot.send_message(
         message.chat.id,
@@ -1193,7 +1278,7 @@ def register_admin_handlers(bot):
     @bot.message_handler(commands=['stats'])
     def handle_stats(message):
         admin_stats_command(message, bot)
-        
+    
     @bot.message_handler(commands=['updatesubscribers', 'update_subscribers'])
     def handle_update_subscribers(message):
         admin_update_subscribers_command(message, bot)
@@ -1219,9 +1304,14 @@ def register_admin_handlers(bot):
     @bot.callback_query_handler(func=lambda call: call.data.startswith((
         "approve_", "reject_", "remove_", "manage_", "view_", "toggle_sfw_", 
         "edit_emojis_", "edit_schedule_", "trigger_", "upload_", "toggle_day_",
-        "set_position_", "save_position_"
+        "set_position_", "save_position_", "reset_breaker_"
     )) or call.data in ["manage_images", "admin_back", "update_subscribers"])
     def handle_admin_callbacks(call):
         admin_callback_handler(call, bot)
     
+    # Register the inline channel search (inline mode has to be enabled with @BotFather)
+    @bot.inline_handler(func=lambda inline_query: True)
+    def handle_inline_query(inline_query):
+        admin_inline_search(inline_query, bot)
+    
     logger.info("Admin handlers registered")
@@ -1,22 +1,31 @@
 #!/usr/bin/env python
 import os
 import json
+import hashlib
+import io
 import logging
+import time
 from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, abort, g, send_file
+from typing import Dict, Optional, Tuple
+from flask import (
+    Flask, render_template, redirect, url_for, flash, request, jsonify, abort, g, send_file, session,
+    make_response, Response
+)
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
 from wtforms import StringField, BooleanField, SubmitField, SelectField, TextAreaField
 from wtforms.validators import DataRequired, URL, Length
 from dotenv import load_dotenv
 from utils.storage import (
-    get_channels, get_pending_channels, save_channels, save_pending_channels,
+    get_channels, get_pending_channels, transaction, DATA_CHANNELS,
     approve_channel, reject_channel, remove_channel, get_channel_info,
-    update_channel_schedule, update_channel_emojis, is_channel_owner,
-    get_user_channels
+    update_channel_schedule, is_channel_owner,
+    get_user_channels, get_network_stats, get_generation, query_channels, SORT_ADDED,
+    apply_batch, StorageError
 )
-from utils.scheduler import schedule_immediate_crosspost
-from utils.crosspost import update_all_channel_subscribers
+from utils.scheduler import run_crosspost_job, run_subscriber_update_job
+from utils.outbox import count_dead_letters, get_dead_letters, requeue_dead_letters
+from utils import breaker, events, jobs, leader, search, transfer, warmup
 
 # Configure logging
 logging.basicConfig(
@@ -61,13 +70,17 @@ for id_str in admin_ids_str.split(","):
     except ValueError:
         print(f"Warning: Invalid admin user ID: {id_str}")
 
+def is_authorized(auth) -> bool:
+    """Check the basic auth credentials of a request."""
+    return bool(auth) and auth.password == ADMIN_PASSWORD
+
 # Authentication middleware
 def requires_auth(f):
     def decorated(*args, **kwargs):
         auth = request.authorization
-        if not auth or auth.password != ADMIN_PASSWORD:
+        if not is_authorized(auth):
             return authenticate()
-        
+            
         # Store authenticated username as user_id in g object for access in views
         # This will be used for ownership checks across the application
         if auth.username and auth.username.isdigit():
@@ -80,7 +93,7 @@ def requires_auth(f):
         # IMPORTANT: All authenticated users have admin privileges in the web interface
         # Web interface is only for administrators, user-specific views are handled in Telegram
         g.is_admin = True
-            
+        
         return f(*args, **kwargs)
     decorated.__name__ = f.__name__
     return decorated
@@ -96,6 +109,47 @@ def authenticate():
     response.headers['WWW-Authenticate'] = 'Basic realm="Login Required"'
     return response
 
+# Changes when a deploy changes the templates, so cached pages are rendered again
+TEMPLATES_VERSION = max(
+    (entry.stat().st_mtime_ns for entry in os.scandir(os.path.join(app.root_path, 'templates'))),
+    default=0
+)
+
+def cached_by_generation(*extra_parts):
+    """Answer 304 Not Modified when the channel data a page shows hasn't changed.
+    
+    The ETag is derived from the storage generation, so revalidating a page
+    costs a few stat calls instead of loading the data and rendering it. It
+    also covers the user, their CSRF token (renewed well within its time limit)
+    and whatever else the view shows, given as functions that take the view's
+    arguments. Pages with flash messages waiting are always rendered.
+        
+    Must be applied below requires_auth.
+    """
+    def decorator(f):
+        def decorated(*args, **kwargs):
+            if '_flashes' in session:
+                return f(*args, **kwargs)
+            
+            csrf_window = int(time.time() // ((app.config.get('WTF_CSRF_TIME_LIMIT') or 3600) / 2))
+            parts = [f.__name__, request.query_string, TEMPLATES_VERSION, get_generation(), g.user_id,
+                     session.get('csrf_token'), csrf_window]
+            parts.extend(part(*args, **kwargs) for part in extra_parts)
+            etag = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+            
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        decorated.__name__ = f.__name__
+        return decorated
+    return decorator
+
 # Forms
 class ChannelForm(FlaskForm):
     title = StringField('Channel Name', validators=[DataRequired(), Length(min=3, max=100)])
@@ -110,46 +164,137 @@ class PendingChannelForm(FlaskForm):
     approve = SubmitField('Approve')
     reject = SubmitField('Reject')
 
+# Channels listed on a page, unless the request asks for another page size
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+
+# Rows the channel table fetches at a time as it's scrolled
+LIST_VIRTUAL_PAGE_SIZE = 100
+
+# Fields of the rows returned by the list APIs
+CHANNEL_COLUMNS = ("channel_id", "title", "username", "is_sfw", "subscribers", "emojis", "owner_id",
+                   "reserved_position")
+PENDING_COLUMNS = ("channel_id", "title", "username", "is_sfw", "owner_id", "created_at")
+
+# Channels and applications shown on the dashboard
+DASHBOARD_CHANNELS = 5
+DASHBOARD_PENDING = 10
+
+# Channel search results
+SEARCH_RESULTS = 10
+SEARCH_MAX_RESULTS = 50
+SEARCH_MAX_QUERY_LENGTH = 100
+
+# Operations taken by one batch request
+BATCH_MAX_OPERATIONS = 1000
+
+def _get_int_arg(name: str, minimum: int, maximum: int) -> Optional[int]:
+    """Get an integer query parameter, or None if it's missing or out of range."""
+    value = request.args.get(name, type=int)
+    if value is None or not minimum <= value <= maximum:
+        return None
+    return value
+
+def _get_choice_arg(name: str, true_value: str, false_value: str) -> Optional[bool]:
+    """Get a query parameter that selects one of two values, or None for both."""
+    value = request.args.get(name)
+    if value == true_value:
+        return True
+    if value == false_value:
+        return False
+    return None
+
+def get_list_query() -> Dict:
+    """Get the page, sort order and filters of a channel list from the query parameters.
+        
+    Parameters that are missing or invalid fall back to listing every channel,
+    in the order they were added, a page of LIST_PAGE_SIZE at a time.
+    """
+    return {
+        "page": _get_int_arg('page', 1, 1_000_000) or 1,
+        "page_size": _get_int_arg('per_page', 1, LIST_MAX_PAGE_SIZE) or LIST_PAGE_SIZE,
+        "sort": request.args.get('sort', SORT_ADDED),
+        "descending": request.args.get('order') == 'desc',
+        "is_sfw": _get_choice_arg('type', 'sfw', 'nsfw'),
+        "day": _get_int_arg('day', 0, 6),
+        "reserved": _get_choice_arg('reserved', 'yes', 'no'),
+        "owner_id": request.args.get('owner', type=int)
+    }
+
+def list_page_json(result: Dict, columns: Tuple[str, ...]):
+    """Answer with a page of a channel list as rows of values, in the order of `columns`."""
+    rows = []
+    for channel_id, channel in result['channels'].items():
+        values = dict(channel, channel_id=channel_id, title=channel.get('title') or channel.get('name') or '')
+        values.setdefault('is_sfw', True)
+        values.setdefault('subscribers', 0)
+        rows.append([values.get(column) for column in columns])
+    
+    return jsonify({
+        "total": result['total'],
+        "page": result['page'],
+        "page_size": result['page_size'],
+        "pages": result['pages'],
+        "columns": columns,
+        "rows": rows
+    })
+
 # Routes
 @app.route('/')
 @requires_auth
+@cached_by_generation(count_dead_letters)
 def index():
-    # Always show all channels and pending applications - admin-only interface
-    channels = get_channels()
-    pending = get_pending_channels()
+    # The latest channels and applications are fetched by the page from the list APIs
     title = "Admin Dashboard"
     
-    logger.info(f"User {g.user_id} accessed admin dashboard with {len(channels)} channels and {len(pending)} pending applications")
+    logger.info(f"User {g.user_id} accessed admin dashboard")
     
     return render_template('index.html', 
-                           channels=channels, 
-                           pending=pending,
+                           dashboard_channels=DASHBOARD_CHANNELS,
+                           dashboard_pending=DASHBOARD_PENDING,
+                           stats=get_network_stats(),
+                           dead_letter_count=count_dead_letters(),
                            is_admin=True,
                            title=title,
                            now=datetime.now())
 
 @app.route('/channels')
 @requires_auth
+@cached_by_generation()
 def list_channels():
-    # Always show all channels - admin-only interface
-    channels = get_channels()
+    # Only the page itself; the table fetches its rows from /api/channels as it's scrolled
     title = "All Approved Channels"
-        
-    logger.info(f"User {g.user_id} listed {len(channels)} channels")
+    
+    logger.info(f"User {g.user_id} opened the channel list")
     
     return render_template('channels.html', 
-                           channels=channels,
+                           page_size=LIST_VIRTUAL_PAGE_SIZE,
                            is_admin=True,
                            title=title)
 
+@app.route('/api/channels')
+@requires_auth
+@cached_by_generation()
+def api_channels():
+    """Get a page of the approved channels, with the query parameters of /channels."""
+    return list_page_json(query_channels(**get_list_query()), CHANNEL_COLUMNS)
+
+@app.route('/api/pending')
+@requires_auth
+@cached_by_generation()
+def api_pending():
+    """Get a page of the pending applications, with the query parameters of /pending."""
+    return list_page_json(query_channels(pending=True, **get_list_query()), PENDING_COLUMNS)
+
 @app.route('/channels/<channel_id>')
 @requires_auth
+@cached_by_generation()
 def view_channel(channel_id):
     channel = get_channel_info(channel_id)
     if not channel:
         flash("Channel not found", "error")
         return redirect(url_for('list_channels'))
-    
+        
     return render_template('channel_detail.html', 
                            channel=channel,
                            is_owner=True,  # Admin always has owner privileges
@@ -168,30 +313,37 @@ def edit_channel(channel_id):
     form = ChannelForm(obj=None)
     
     if form.validate_on_submit():
-        channel['title'] = form.title.data
-        # Keep backward compatibility with 'name' field
-        channel['name'] = form.title.data
-        channel['username'] = form.username.data
-        channel['is_sfw'] = not form.is_nsfw.data
-        
-        # Handle emojis
-        if form.emojis.data:
-            emojis = [e.strip() for e in form.emojis.data.split(',') if e.strip()]
-            if emojis:
-                update_channel_emojis(channel_id, emojis)
-        
+        emojis = [e.strip() for e in (form.emojis.data or '').split(',') if e.strip()]
+            
         # Try to convert subscribers to int if not empty
+        subscribers = None
         if form.subscribers.data:
             try:
-                channel['subscribers'] = int(form.subscribers.data)
+                subscribers = int(form.subscribers.data)
             except ValueError:
                 flash("Subscriber count must be a number", "error")
-        
-        if save_channels(channels):
+            
+        # Change the channel as it's saved now, so changes made meanwhile are kept
+        try:
+            with transaction() as tx:
+                if channel_id not in tx.get(DATA_CHANNELS):
+                    raise ValueError("Channel not found")
+                channel = tx.change(DATA_CHANNELS)[channel_id]
+                channel['title'] = form.title.data
+                # Keep backward compatibility with 'name' field
+                channel['name'] = form.title.data
+                channel['username'] = form.username.data
+                channel['is_sfw'] = not form.is_nsfw.data
+                if emojis:
+                    tx.set_emojis(channel_id, emojis)
+                if subscribers is not None:
+                    channel['subscribers'] = subscribers
+        except (ValueError, StorageError) as e:
+            logger.warning(f"Failed to update channel {channel_id}: {e}")
+            flash("Failed to update channel", "error")
+        else:
             flash("Channel updated successfully", "success")
             return redirect(url_for('view_channel', channel_id=channel_id))
-        else:
-            flash("Failed to update channel", "error")
     
     # Pre-fill form
     form.title.data = channel.get('title', channel.get('name', ''))
@@ -213,7 +365,7 @@ def edit_schedule(channel_id):
     if not channel:
         flash("Channel not found", "error")
         return redirect(url_for('list_channels'))
-        
+    
     days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     schedule = channel.get('schedule', {})
     
@@ -259,15 +411,17 @@ def remove_channel_route(channel_id):
 
 @app.route('/pending')
 @requires_auth
+@cached_by_generation()
 def list_pending():
     # Always show all pending channels - admin-only interface
-    pending = get_pending_channels()
+    result = query_channels(pending=True, **get_list_query())
     title = "All Pending Applications"
     
-    logger.info(f"User {g.user_id} listed {len(pending)} pending channels")
+    logger.info(f"User {g.user_id} listed page {result['page']} of {result['total']} pending channels")
     
     return render_template('pending.html', 
-                           pending=pending,
+                           pending=result['channels'],
+                           result=result,
                            is_admin=True,
                            title=title)
 
@@ -280,7 +434,7 @@ def view_pending(channel_id):
         return redirect(url_for('list_pending'))
     
     channel = pending[channel_id]
-        
+    
     form = PendingChannelForm()
     
     if form.validate_on_submit():
@@ -303,34 +457,177 @@ def view_pending(channel_id):
                            is_admin=True,
                            title=f"Pending: {channel.get('title', channel.get('name', 'Unknown'))}")
 
-@app.route('/trigger_post')
-@requires_auth
-def trigger_post():
-    """Trigger an immediate crosspost."""
-    success = schedule_immediate_crosspost()
+def job_accepted(job_id: str, message: str):
+    """Answer a request that started a background job.
     
-    if success:
-        logger.info(f"User {g.user_id} triggered a manual crosspost")
-        flash("Crosspost scheduled to run immediately", "success")
-    else:
-        logger.error("Failed to schedule crosspost - no active channels found")
-        flash("Failed to schedule crosspost. No active channels found for today", "error")
+    API clients get 202 with the job ID and where to follow it; browsers are
+    sent back to the dashboard.
+    """
+    status_url = url_for('api_job', job_id=job_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
     
+    flash(message, "info")
     return redirect(url_for('index'))
 
+@app.route('/trigger_post')
+@requires_auth
+def trigger_post():
+    """Trigger an immediate crosspost in the background."""
+    job_id = jobs.submit(jobs.JOB_CROSSPOST, run_crosspost_job, created_by=g.user_id)
+    logger.info(f"User {g.user_id} triggered a manual crosspost (job {job_id})")
+    return job_accepted(job_id, "Crosspost started, it is being sent in the background")
+
 @app.route('/update_subscribers')
 @requires_auth
 def update_subscribers():
-    """Update subscriber counts for all channels."""
+    """Update subscriber counts for all channels in the background."""
+    job_id = jobs.submit(jobs.JOB_UPDATE_SUBSCRIBERS, run_subscriber_update_job, created_by=g.user_id)
+    logger.info(f"User {g.user_id} started a subscriber count update (job {job_id})")
+    return job_accepted(job_id, "Subscriber count update started, it runs in the background")
+
+@app.route('/api/jobs/<job_id>')
+@requires_auth
+def api_job(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@requires_auth
+def api_cancel_job(job_id):
+    if jobs.get_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not jobs.cancel_job(job_id):
+        return jsonify({"error": "Job already finished"}), 409
+    logger.info(f"User {g.user_id} cancelled job {job_id}")
+    return jsonify(jobs.get_job(job_id)), 202
+
+@app.route('/api/channels/batch', methods=['POST'])
+@csrf.exempt
+@requires_auth
+def api_batch():
+    """Apply many channel operations in one storage transaction.
+    
+    Takes {"operations": [...], "all_or_nothing": false}, where every
+    operation is an object with an "op" (approve, reject, remove, schedule,
+    emojis or reserved_position), a "channel_id" and, depending on the op,
+    "days", "emojis" or "position". Answers with the result of every
+    operation. Up to BATCH_MAX_OPERATIONS operations are taken at once.
+    
+    Meant for scripts that log in with basic auth, so there is no CSRF token;
+    requiring a JSON body keeps other sites' forms from posting here.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Expected a JSON body"}), 415
+    body = request.get_json(silent=True)
+    operations = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "Expected a non-empty list of operations"}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_OPERATIONS} operations are taken at once"}), 413
+    
     try:
-        update_all_channel_subscribers()
-        logger.info(f"User {g.user_id} updated subscriber counts")
-        flash("Subscriber counts updated successfully", "success")
-    except Exception as e:
-        logger.error(f"Error updating subscriber counts: {e}")
-        flash(f"Failed to update subscriber counts: {str(e)}", "error")
+        result = apply_batch(operations, all_or_nothing=bool(body.get("all_or_nothing")))
+    except StorageError as e:
+        logger.error(f"Batch of {len(operations)} operations by user {g.user_id} failed: {e}")
+        return jsonify({"error": str(e)}), 500
     
-    return redirect(url_for('index'))
+    logger.info(f"User {g.user_id} applied {result['applied']} of {len(operations)} batch operations"
+                f"{'' if result['committed'] else ' (dropped, as not all could be applied)'}")
+    return jsonify(result)
+
+@app.route('/api/export')
+@requires_auth
+def api_export():
+    """Stream the channel registry as NDJSON (the default) or CSV.
+    
+    `format` picks ndjson or csv, and `types` a comma-separated subset of
+    channel, pending and schedule; everything is exported by default.
+    """
+    export_format = request.args.get('format', transfer.FORMAT_NDJSON)
+    if export_format not in transfer.FORMATS:
+        return jsonify({"error": f"Unknown format, expected one of: {', '.join(transfer.FORMATS)}"}), 400
+    record_types = request.args.get('types', ','.join(transfer.RECORD_TYPES)).split(',')
+    if not record_types or set(record_types) - set(transfer.RECORD_TYPES):
+        return jsonify({"error": f"Unknown types, expected some of: {', '.join(transfer.RECORD_TYPES)}"}), 400
+    
+    logger.info(f"User {g.user_id} exported {', '.join(record_types)} as {export_format}")
+    filename = f"registry-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    mimetype = 'text/csv' if export_format == transfer.FORMAT_CSV else 'application/x-ndjson'
+    return Response(transfer.iter_export(export_format, record_types), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/import', methods=['POST'])
+@csrf.exempt
+@requires_auth
+def api_import():
+    """Import channels, applications and schedules, as exported by /api/export.
+    
+    The body is read as a stream, NDJSON or CSV according to its content type
+    (or `format`). Valid records replace the stored ones with the same channel
+    ID, saved a chunk at a time; invalid ones are skipped and listed. With
+    `dry_run=1` the records are only checked.
+    
+    Like the batch API, this is for scripts: it takes no CSRF token, and only
+    NDJSON or CSV bodies, which other sites' forms can't send.
+    """
+    if request.mimetype == 'text/csv':
+        import_format = transfer.FORMAT_CSV
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        import_format = transfer.FORMAT_NDJSON
+    else:
+        return jsonify({"error": "Expected an application/x-ndjson or text/csv body"}), 415
+    import_format = request.args.get('format', import_format)
+    if import_format not in transfer.FORMATS:
+        return jsonify({"error": f"Unknown format, expected one of: {', '.join(transfer.FORMATS)}"}), 400
+    
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        result = transfer.import_records(lines, import_format, dry_run=request.args.get('dry_run') == '1')
+    except UnicodeDecodeError:
+        return jsonify({"error": "Expected a UTF-8 body"}), 400
+    
+    logger.info(f"User {g.user_id} imported {sum(result['imported'].values())} records "
+                f"({'dry run, ' if result['dry_run'] else ''}{result['invalid']} invalid)")
+    return jsonify(result), 500 if 'error' in result else 200
+
+@app.route('/dead_letters', methods=['GET', 'POST'])
+@requires_auth
+def dead_letters():
+    """Inspect crosspost sends that failed permanently, and requeue them."""
+    if request.method == 'POST':
+        if 'requeue_all' in request.form:
+            requeued = requeue_dead_letters()
+        else:
+            requeued = requeue_dead_letters(request.form.getlist('keys'))
+        
+        logger.info(f"User {g.user_id} requeued {requeued} dead-lettered crosspost sends")
+        if requeued:
+            flash(f"{requeued} publications requeued, they will be sent within a minute", "success")
+        else:
+            flash("No publications selected", "warning")
+        return redirect(url_for('dead_letters'))
+    
+    return render_template('dead_letters.html',
+                           letters=get_dead_letters(),
+                           total=count_dead_letters(),
+                           open_breakers=breaker.get_open_breakers(),
+                           channels=get_channels(),
+                           is_admin=True,
+                           title="Delivery Errors")
+
+@app.route('/breakers/<channel_id>/reset', methods=['POST'])
+@requires_auth
+def reset_breaker(channel_id):
+    """Close a channel's circuit breaker so it is contacted again right away."""
+    if breaker.reset(channel_id):
+        logger.info(f"User {g.user_id} reset the circuit breaker for channel {channel_id}")
+        flash("Circuit breaker reset", "success")
+    else:
+        flash("Circuit breaker was already closed", "info")
+    return redirect(url_for('dead_letters'))
 
 @app.route('/manage_images', methods=['GET', 'POST'])
 @requires_auth
@@ -345,12 +642,12 @@ def manage_images():
             sfw_image.save('generated-icon.png')
             flash("SFW image updated successfully", "success")
             logger.info(f"User {g.user_id} updated SFW image")
-            
+        
         if nsfw_image and nsfw_image.filename:
             nsfw_image.save('nsfw-icon.png')
             flash("NSFW image updated successfully", "success")
             logger.info(f"User {g.user_id} updated NSFW image")
-            
+        
         return redirect(url_for('manage_images'))
     
     # Check if current images exist
@@ -362,32 +659,66 @@ def manage_images():
                           sfw_exists=sfw_exists,
                           nsfw_exists=nsfw_exists)
 
+@app.route('/api/ready')
+def api_ready():
+    # Open to health checks without a login, so only the task states are shown, not their errors
+    readiness = warmup.get_readiness()
+    tasks = {name: task["state"] for name, task in readiness["tasks"].items()}
+    ready = readiness["status"] in (warmup.STATUS_READY, warmup.STATUS_DEGRADED)
+    return jsonify({
+        "status": readiness["status"],
+        "started_at": readiness["started_at"],
+        "tasks": tasks,
+        "runner": leader.is_leader()
+    }), 200 if ready else 503
+
 @app.route('/api/stats')
 @requires_auth
+@cached_by_generation()
 def api_stats():
     # Always show network-wide statistics - admin-only interface
-    channels = get_channels()
-    pending = get_pending_channels()
     stat_scope = "network"
     
-    # Calculate statistics
-    total_subscribers = sum(ch.get('subscribers', 0) for ch in channels.values())
-    sfw_count = sum(1 for ch in channels.values() if ch.get('is_sfw', True))
-    nsfw_count = sum(1 for ch in channels.values() if not ch.get('is_sfw', True))
-    
-    stats = {
-        'total_channels': len(channels),
-        'pending_applications': len(pending),
-        'total_subscribers': total_subscribers,
-        'sfw_channels': sfw_count,
-        'nsfw_channels': nsfw_count,
-        'scope': stat_scope,
-        'timestamp': datetime.now().isoformat()
-    }
+    # Maintained by storage as the data changes, so this doesn't scan the channels
+    stats = dict(get_network_stats())
+    stats['scope'] = stat_scope
+    stats['timestamp'] = datetime.now().isoformat()
+    # Lets the dashboard tell when the lists it shows need fetching again
+    stats['generation'] = get_generation()
     
     logger.info(f"User {g.user_id} retrieved stats with scope: {stat_scope}")
     return jsonify(stats)
 
+@app.route('/api/search')
+@requires_auth
+@cached_by_generation()
+def api_search():
+    """Find approved channels by title or username.
+    
+    Takes the query as `q`, at most `limit` results (up to SEARCH_MAX_RESULTS)
+    and optionally `type=sfw|nsfw`. Answered from the in-memory search index.
+    """
+    query = request.args.get('q', '')[:SEARCH_MAX_QUERY_LENGTH]
+    limit = _get_int_arg('limit', 1, SEARCH_MAX_RESULTS) or SEARCH_RESULTS
+    results = search.search(query, limit=limit, is_sfw=_get_choice_arg('type', 'sfw', 'nsfw'))
+    return jsonify({"query": query, "results": results})
+
+@app.route('/api/events')
+@requires_auth
+def api_events():
+    """Stream live dashboard updates as server-sent events.
+    
+    Under uWSGI the events server answers this path (see uwsgi.ini), as a
+    stream here would hold one of the few worker threads per open dashboard.
+    Getting here then means it isn't routed, and the dashboard falls back to
+    polling. Flask's development server gives every request its own thread.
+    """
+    if os.environ.get("UWSGI_ORIGINAL_PROC_NAME"):
+        return jsonify({"error": "Live updates are not routed to the events server"}), 503
+    
+    return Response(events.iter_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     # Create directories if they don't exist
     os.makedirs('templates', exist_ok=True)
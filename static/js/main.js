@@ -5,71 +5,368 @@ document.addEventListener('DOMContentLoaded', function() {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
 
-    // Update stats from API
-    function updateStats() {
-        fetch('/api/stats')
-            .then(response => response.json())
-            .then(data => {
-                // Update navbar pending count
-                const pendingCountElement = document.querySelector('.pending-count');
-                if (pendingCountElement) {
-                    const pendingCount = data.pending_applications;
-                    if (pendingCount > 0) {
-                        pendingCountElement.textContent = pendingCount;
-                        pendingCountElement.style.display = 'inline-block';
-                    } else {
-                        pendingCountElement.style.display = 'none';
-                    }
+    // Channel lists are fetched as compact JSON pages, so the pages themselves render right away
+    const listRefreshers = [];
+    let dataGeneration = null;
+
+    function toRecords(data) {
+        return data.rows.map(row => Object.fromEntries(data.columns.map((column, i) => [column, row[i]])));
+    }
+
+    function fillUrl(pattern, channelId) {
+        return pattern.replace('__id__', encodeURIComponent(channelId));
+    }
+
+    function fetchPage(url) {
+        return fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
                 }
-                
-                // Update dashboard stats if they exist
-                const totalChannelsElement = document.getElementById('total-channels');
-                const pendingChannelsElement = document.getElementById('pending-channels');
-                const sfwChannelsElement = document.getElementById('sfw-channels');
-                const nsfwChannelsElement = document.getElementById('nsfw-channels');
-                const totalSubscribersElement = document.getElementById('total-subscribers');
-                
-                if (totalChannelsElement) totalChannelsElement.textContent = data.total_channels;
-                if (pendingChannelsElement) pendingChannelsElement.textContent = data.pending_applications;
-                if (sfwChannelsElement) sfwChannelsElement.textContent = data.sfw_channels;
-                if (nsfwChannelsElement) nsfwChannelsElement.textContent = data.nsfw_channels;
-                if (totalSubscribersElement) totalSubscribersElement.textContent = data.total_subscribers;
-                
-                // Check if we should update subtitle based on user scope
-                const statsSubtitle = document.getElementById('stats-subtitle');
-                if (statsSubtitle && data.scope) {
-                    if (data.scope === 'network') {
-                        statsSubtitle.textContent = 'Мережева статистика';
-                    } else {
-                        statsSubtitle.textContent = 'Статистика ваших каналів';
-                    }
+                return response.json();
+            });
+    }
+
+    function createElement(tag, className, text) {
+        const element = document.createElement(tag);
+        if (className) element.className = className;
+        if (text !== undefined) element.textContent = text;
+        return element;
+    }
+
+    function createTypeBadge(isSfw) {
+        return createElement('span', `badge ${isSfw ? 'bg-success' : 'bg-danger'}`, isSfw ? 'SFW' : 'NSFW');
+    }
+
+    function createIconLink(href, className, icon) {
+        const link = createElement('a', className);
+        link.href = href;
+        link.appendChild(createElement('i', `bi ${icon}`));
+        return link;
+    }
+
+    // Latest channels and applications on the dashboard
+    function createDashboardItem(list, channel) {
+        const item = createElement('li', 'list-group-item');
+        const row = createElement('div', 'd-flex justify-content-between align-items-center');
+        const names = createElement('div');
+        names.appendChild(createElement('strong', '', channel.title || 'Без імені'));
+        let details = `@${channel.username || 'невідомий'}`;
+        if (channel.subscribers !== undefined) {
+            details += ` - ${channel.subscribers || 0} підписників`;
+        }
+        names.appendChild(createElement('small', 'text-muted d-block', details));
+        if (channel.owner_id) {
+            names.appendChild(createElement('small', 'text-muted d-block', `Власник ID: ${channel.owner_id}`));
+        }
+
+        const actions = createElement('div');
+        if (channel.subscribers !== undefined) {
+            actions.appendChild(createTypeBadge(channel.is_sfw));
+        }
+        const link = createElement('a', 'btn btn-sm btn-outline-info ms-2');
+        link.href = fillUrl(list.dataset.itemUrl, channel.channel_id);
+        link.append(createElement('i', 'bi bi-eye'), ' Деталі');
+        actions.appendChild(link);
+
+        row.append(names, actions);
+        item.appendChild(row);
+        return item;
+    }
+
+    function loadDashboardList(list) {
+        fetchPage(list.dataset.url)
+            .then(data => {
+                const channels = toRecords(data);
+                if (!channels.length) {
+                    list.replaceChildren(createElement('li', 'list-group-item text-center text-muted', list.dataset.empty));
+                    return;
                 }
-                
-                // Update last updated timestamp
-                const lastUpdatedElement = document.getElementById('last-updated');
-                if (lastUpdatedElement && data.timestamp) {
-                    const date = new Date(data.timestamp);
-                    const formattedDate = date.toLocaleString('uk-UA');
-                    lastUpdatedElement.textContent = `Останнє оновлення: ${formattedDate}`;
+
+                const items = channels.map(channel => createDashboardItem(list, channel));
+                const more = data.total - channels.length;
+                if (more > 0 && list.dataset.moreUrl) {
+                    const moreItem = createElement('li', 'list-group-item text-center');
+                    const moreLink = createElement('a', '', `Ще ${more} заявок`);
+                    moreLink.href = list.dataset.moreUrl;
+                    moreItem.appendChild(moreLink);
+                    items.push(moreItem);
                 }
-                
-                // Update the pie chart if it exists
-                if (window.channelsChart) {
-                    window.channelsChart.data.datasets[0].data = [data.sfw_channels, data.nsfw_channels];
-                    
-                    // Add scope label to chart title if present
-                    if (data.scope) {
-                        const scopeTitle = data.scope === 'network' ? 'Мережеве співвідношення' : 'Ваші канали';
-                        window.channelsChart.options.plugins.title = {
-                            display: true,
-                            text: scopeTitle,
-                            font: {
-                                size: 14
-                            }
-                        };
+                list.replaceChildren(...items);
+            })
+            .catch(error => {
+                console.error('Error fetching the list:', error);
+                list.replaceChildren(createElement('li', 'list-group-item text-center text-danger', 'Помилка завантаження. Спробуйте пізніше.'));
+            });
+    }
+
+    ['dashboard-pending', 'dashboard-channels'].forEach(id => {
+        const list = document.getElementById(id);
+        if (list) {
+            loadDashboardList(list);
+            listRefreshers.push(() => loadDashboardList(list));
+        }
+    });
+
+    // Virtual tables: only the rows in view (and a few around them) are in the DOM,
+    // and the pages holding them are fetched as they scroll into view
+    const VIRTUAL_OVERSCAN = 10;
+
+    function setUpVirtualTable(container) {
+        const tbody = container.querySelector('tbody');
+        const columnCount = container.querySelectorAll('thead th').length;
+        const pageSize = parseInt(container.dataset.pageSize, 10) || 100;
+        const showOwner = container.hasAttribute('data-show-owner');
+        const totalElement = container.dataset.total ? document.querySelector(container.dataset.total) : null;
+        const query = new URLSearchParams(window.location.search);
+        let pages = new Map();
+        let stalePages = new Map();
+        let total = null;
+        let rowHeight = 0;
+        let version = 0;
+        let renderQueued = false;
+
+        function loadPage(page) {
+            if (pages.has(page)) {
+                return;
+            }
+            pages.set(page, null);
+            const requestVersion = version;
+            const params = new URLSearchParams(query);
+            params.set('page', page + 1);
+            params.set('per_page', pageSize);
+            fetchPage(`${container.dataset.url}?${params}`)
+                .then(data => {
+                    if (requestVersion !== version) {
+                        return;
                     }
-                    
-                    window.channelsChart.update();
+                    pages.set(page, toRecords(data));
+                    total = data.total;
+                    if (totalElement) {
+                        totalElement.textContent = `Знайдено: ${total}`;
+                    }
+                    queueRender();
+                })
+                .catch(error => {
+                    console.error('Error fetching channels:', error);
+                    if (requestVersion !== version) {
+                        return;
+                    }
+                    // Fetched again once the page is scrolled to
+                    pages.delete(page);
+                    if (total === null) {
+                        tbody.replaceChildren(createMessageRow('', 'Помилка завантаження. Спробуйте пізніше.'));
+                    }
+                });
+        }
+
+        function getRecord(index) {
+            const page = Math.floor(index / pageSize);
+            const records = pages.get(page) || stalePages.get(page);
+            if (!pages.has(page)) {
+                loadPage(page);
+            }
+            return records ? records[index % pageSize] : undefined;
+        }
+
+        function createCell(content) {
+            const cell = createElement('td');
+            if (content instanceof Node) {
+                cell.appendChild(content);
+            } else {
+                cell.textContent = content;
+            }
+            return cell;
+        }
+
+        function createRow(channel) {
+            const row = createElement('tr', 'channel-row');
+            row.append(
+                createCell(channel.title || 'Без імені'),
+                createCell(`@${channel.username || 'невідомий'}`),
+                createCell(createTypeBadge(channel.is_sfw)),
+                createCell(String(channel.subscribers || 0)),
+                createCell((channel.emojis || []).join(' '))
+            );
+            if (showOwner) {
+                const owner = createElement('span', 'badge bg-secondary');
+                owner.append(createElement('i', channel.owner_id ? 'bi bi-person' : 'bi bi-question-circle'),
+                             ` ${channel.owner_id || 'Невідомо'}`);
+                row.appendChild(createCell(owner));
+            }
+
+            const actions = createElement('div', 'btn-group');
+            actions.setAttribute('role', 'group');
+            actions.append(
+                createIconLink(fillUrl(container.dataset.viewUrl, channel.channel_id), 'btn btn-sm btn-outline-primary', 'bi-eye'),
+                createIconLink(fillUrl(container.dataset.editUrl, channel.channel_id), 'btn btn-sm btn-outline-secondary', 'bi-pencil'),
+                createIconLink(fillUrl(container.dataset.scheduleUrl, channel.channel_id), 'btn btn-sm btn-outline-info', 'bi-calendar'),
+                createIconLink(fillUrl(container.dataset.removeUrl, channel.channel_id), 'btn btn-sm btn-outline-danger', 'bi-trash')
+            );
+            row.appendChild(createCell(actions));
+            return row;
+        }
+
+        function createMessageRow(className, text, height) {
+            const row = createElement('tr', className);
+            const cell = createElement('td', 'text-center text-muted', text);
+            cell.colSpan = columnCount;
+            if (height !== undefined) {
+                cell.style.height = `${height}px`;
+            }
+            row.appendChild(cell);
+            return row;
+        }
+
+        function render() {
+            renderQueued = false;
+            if (total === null) {
+                return;
+            }
+            if (total === 0) {
+                tbody.replaceChildren(createMessageRow('', container.dataset.empty));
+                return;
+            }
+
+            // Until a row was measured, assume the height of a table row with buttons
+            const height = rowHeight || 41;
+            const headHeight = container.querySelector('thead').offsetHeight;
+            const first = Math.max(0, Math.floor((container.scrollTop - headHeight) / height) - VIRTUAL_OVERSCAN);
+            const last = Math.min(total, first + Math.ceil(container.clientHeight / height) + 2 * VIRTUAL_OVERSCAN);
+
+            const rows = [createMessageRow('virtual-spacer', '', first * height)];
+            for (let index = first; index < last; index++) {
+                const channel = getRecord(index);
+                rows.push(channel ? createRow(channel) : createMessageRow('virtual-placeholder', '…', height));
+            }
+            rows.push(createMessageRow('virtual-spacer', '', (total - last) * height));
+            tbody.replaceChildren(...rows);
+
+            // Rows have a fixed height, so measuring one is enough
+            const measured = tbody.querySelector('.channel-row');
+            if (measured && measured.offsetHeight && measured.offsetHeight !== rowHeight) {
+                rowHeight = measured.offsetHeight;
+                queueRender();
+            }
+        }
+
+        function queueRender() {
+            if (!renderQueued) {
+                renderQueued = true;
+                requestAnimationFrame(render);
+            }
+        }
+
+        function refresh() {
+            // Keep showing the rows fetched so far until their pages are fetched again
+            version++;
+            stalePages = pages;
+            pages = new Map();
+            if (total === null) {
+                loadPage(0);
+            } else {
+                queueRender();
+            }
+        }
+
+        container.addEventListener('scroll', queueRender, { passive: true });
+        window.addEventListener('resize', queueRender);
+        loadPage(0);
+        listRefreshers.push(refresh);
+    }
+
+    document.querySelectorAll('[data-virtual-table]').forEach(setUpVirtualTable);
+
+    // Update navbar pending count
+    function showPendingCount(pendingCount) {
+        const pendingCountElement = document.querySelector('.pending-count');
+        if (pendingCountElement) {
+            if (pendingCount > 0) {
+                pendingCountElement.textContent = pendingCount;
+                pendingCountElement.style.display = 'inline-block';
+            } else {
+                pendingCountElement.style.display = 'none';
+            }
+        }
+    }
+
+    function showStats(data) {
+        showPendingCount(data.pending_applications);
+        
+        // Fetch the lists again when the channel data changed since they were
+        if (data.generation) {
+            if (dataGeneration !== null && data.generation !== dataGeneration) {
+                listRefreshers.forEach(refresh => refresh());
+            }
+            dataGeneration = data.generation;
+        }
+        
+        // Update dashboard stats if they exist
+        const totalChannelsElement = document.getElementById('total-channels');
+        const pendingChannelsElement = document.getElementById('pending-channels');
+        const sfwChannelsElement = document.getElementById('sfw-channels');
+        const nsfwChannelsElement = document.getElementById('nsfw-channels');
+        const totalSubscribersElement = document.getElementById('total-subscribers');
+        
+        if (totalChannelsElement) totalChannelsElement.textContent = data.total_channels;
+        if (pendingChannelsElement) pendingChannelsElement.textContent = data.pending_applications;
+        if (sfwChannelsElement) sfwChannelsElement.textContent = data.sfw_channels;
+        if (nsfwChannelsElement) nsfwChannelsElement.textContent = data.nsfw_channels;
+        if (totalSubscribersElement) totalSubscribersElement.textContent = data.total_subscribers;
+        
+        // Check if we should update subtitle based on user scope
+        const statsSubtitle = document.getElementById('stats-subtitle');
+        if (statsSubtitle && data.scope) {
+            if (data.scope === 'network') {
+                statsSubtitle.textContent = 'Мережева статистика';
+            } else {
+                statsSubtitle.textContent = 'Статистика ваших каналів';
+            }
+        }
+        
+        // Update last updated timestamp
+        const lastUpdatedElement = document.getElementById('last-updated');
+        if (lastUpdatedElement && data.timestamp) {
+            const date = new Date(data.timestamp);
+            const formattedDate = date.toLocaleString('uk-UA');
+            lastUpdatedElement.textContent = `Останнє оновлення: ${formattedDate}`;
+        }
+        
+        // Update the pie chart if it exists
+        if (window.channelsChart) {
+            window.channelsChart.data.datasets[0].data = [data.sfw_channels, data.nsfw_channels];
+            
+            // Add scope label to chart title if present
+            if (data.scope) {
+                const scopeTitle = data.scope === 'network' ? 'Мережеве співвідношення' : 'Ваші канали';
+                window.channelsChart.options.plugins.title = {
+                    display: true,
+                    text: scopeTitle,
+                    font: {
+                        size: 14
+                    }
+                };
+            }
+            
+            window.channelsChart.update();
+        }
+    }
+
+    // Update stats from API, skipping the update when they haven't changed
+    let statsEtag = null;
+    function updateStats() {
+        const headers = statsEtag ? {'If-None-Match': statsEtag} : {};
+        fetch('/api/stats', {headers: headers, cache: 'no-store'})
+            .then(response => {
+                if (response.status === 304) {
+                    return null;
+                }
+                statsEtag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(data => {
+                if (data) {
+                    showStats(data);
                 }
             })
             .catch(error => {
@@ -96,11 +393,47 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    // Run immediately
-    updateStats();
-    
-    // Update every 30 seconds
-    setInterval(updateStats, 30000);
+    // Poll every 30 seconds while live updates aren't available
+    let statsTimer = null;
+    function startPolling() {
+        if (statsTimer === null) {
+            updateStats();
+            statsTimer = setInterval(updateStats, 30000);
+        }
+    }
+
+    function stopPolling() {
+        if (statsTimer !== null) {
+            clearInterval(statsTimer);
+            statsTimer = null;
+        }
+    }
+
+    // Live updates: the server pushes stats, the pending count and job progress as they change
+    const followedJobs = {};
+    let liveEvents = null;
+    if (window.EventSource) {
+        liveEvents = new EventSource('/api/events');
+        liveEvents.addEventListener('open', stopPolling);
+        liveEvents.addEventListener('error', () => {
+            // The browser reconnects by itself, unless the server refused the stream
+            startPolling();
+            if (liveEvents.readyState === EventSource.CLOSED) {
+                liveEvents = null;
+            }
+        });
+        liveEvents.addEventListener('stats', event => showStats(JSON.parse(event.data)));
+        liveEvents.addEventListener('pending', event => showPendingCount(JSON.parse(event.data).count));
+        liveEvents.addEventListener('job', event => {
+            const job = JSON.parse(event.data);
+            const alertElement = followedJobs[job.job_id];
+            if (alertElement && showJobProgress(job, alertElement)) {
+                delete followedJobs[job.job_id];
+            }
+        });
+    } else {
+        startPolling();
+    }
 
     // Auto-dismiss flash messages after 5 seconds
     const flashMessages = document.querySelectorAll('.alert');
@@ -113,6 +446,78 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 5000);
     });
 
+    // Background jobs: start them without leaving the page and follow their progress
+    const csrfTokenElement = document.querySelector('meta[name="csrf-token"]');
+    const csrfToken = csrfTokenElement ? csrfTokenElement.content : '';
+    const jobStatusLabels = {
+        queued: 'У черзі',
+        running: 'Виконується',
+        done: 'Завершено',
+        failed: 'Помилка',
+        cancelled: 'Скасовано'
+    };
+
+    function showJobProgress(job, alertElement) {
+        const progress = job.total ? ` — ${job.done}/${job.total}` : '';
+        const error = job.error ? `: ${job.error}` : '';
+        alertElement.querySelector('.job-status').textContent = `${jobStatusLabels[job.status] || job.status}${progress}${error}`;
+
+        const finished = ['done', 'failed', 'cancelled'].includes(job.status);
+        alertElement.className = `alert alert-${job.status === 'failed' ? 'danger' : finished ? 'success' : 'info'} mt-3`;
+        alertElement.querySelector('.job-cancel').style.display = finished ? 'none' : 'inline-block';
+        return finished;
+    }
+
+    function followJob(statusUrl, alertElement) {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(job => {
+                if (showJobProgress(job, alertElement)) {
+                    delete followedJobs[job.job_id];
+                    updateStats();
+                } else if (liveEvents && liveEvents.readyState === EventSource.OPEN) {
+                    // Further progress arrives as events
+                    followedJobs[job.job_id] = alertElement;
+                } else {
+                    setTimeout(() => followJob(statusUrl, alertElement), 2000);
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching job status:', error);
+                setTimeout(() => followJob(statusUrl, alertElement), 5000);
+            });
+    }
+
+    document.querySelectorAll('[data-job-action]').forEach(link => {
+        link.addEventListener('click', function(event) {
+            event.preventDefault();
+
+            fetch(this.href, { headers: { 'Accept': 'application/json' } })
+                .then(response => response.json())
+                .then(data => {
+                    const alertElement = document.createElement('div');
+                    alertElement.className = 'alert alert-info mt-3';
+                    alertElement.innerHTML = `<strong></strong> <span class="job-status">У черзі</span>
+                        <button type="button" class="btn btn-sm btn-outline-danger ms-2 job-cancel">Скасувати</button>`;
+                    alertElement.querySelector('strong').textContent = this.textContent.trim();
+                    alertElement.querySelector('.job-cancel').addEventListener('click', () => {
+                        fetch(`${data.status_url}/cancel`, {
+                            method: 'POST',
+                            headers: { 'Accept': 'application/json', 'X-CSRFToken': csrfToken }
+                        });
+                    });
+
+                    this.closest('.row').after(alertElement);
+                    followJob(data.status_url, alertElement);
+                })
+                .catch(error => {
+                    console.error('Error starting job:', error);
+                    // Fall back to the plain link
+                    window.location.href = this.href;
+                });
+        });
+    });
+
     // Schedule day toggle functionality
     const dayToggleButtons = document.querySelectorAll('.day-toggle');
     dayToggleButtons.forEach(button => {
@@ -0,0 +1,104 @@
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from utils import crosspost, outbox
+
+# Data files redirected to each test's own directory
+_JSON_FILES = (
+    "CHANNELS_FILE", "PENDING_FILE", "SCHEDULE_FILE", "MEDIA_CACHE_FILE", "CIRCUIT_BREAKERS_FILE",
+    "PREFLIGHT_FILE", "SENDER_ASSIGNMENTS_FILE", "SUBSCRIBER_REFRESH_FILE", "STATS_FILE",
+)
+_OTHER_FILES = ("OUTBOX_DB", "SCHEDULER_DB", "JOBS_DB", "DATA_LOCK_FILE")
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Point every data file at an empty data directory of the test's own."""
+    # The post images are found relative to the repository root, where the bot runs
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    monkeypatch.setattr(config, "DATA_DIR", str(tmp_path))
+    for name in _JSON_FILES:
+        path = tmp_path / f"{name.lower()}.json"
+        # Start from an empty file, so caches keyed by file version see a new one
+        path.write_text("{}")
+        monkeypatch.setattr(config, name, str(path))
+    for name in _OTHER_FILES:
+        monkeypatch.setattr(config, name, str(tmp_path / name.lower()))
+    monkeypatch.setattr(outbox, "_schema_ready", False)
+    return tmp_path
+
+class FakeBot:
+    """Stands in for the bot, recording what it sends instead of calling Telegram."""
+    
+    def __init__(self):
+        self.photos = []
+        self.messages = []
+        # Raised by send_photo while set, e.g. to make Telegram reject a post
+        self.send_error = None
+    
+    def get_me(self):
+        return SimpleNamespace(id=42, username="test_bot")
+    
+    def get_chat_member_count(self, chat_id):
+        return 100
+    
+    def get_chat_member(self, chat_id, user_id):
+        return SimpleNamespace(status="administrator", can_post_messages=True)
+    
+    def send_photo(self, chat_id, photo, caption, parse_mode=None, reply_markup=None):
+        if self.send_error is not None:
+            raise self.send_error
+        self.photos.append((str(chat_id), caption))
+        return SimpleNamespace(message_id=len(self.photos), photo=[SimpleNamespace(file_id="file-id")])
+    
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+        return SimpleNamespace(message_id=len(self.messages))
+
+@pytest.fixture(autouse=True)
+def bot():
+    """Send through a fake bot, so no test reaches Telegram."""
+    fake = FakeBot()
+    crosspost.init_bot(fake)
+    yield fake
+    crosspost.init_bot(None)
+
+def write_json(filename: str, data):
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+def make_channels(count: int) -> dict:
+    """Build approved channels with IDs -1001000000000 and down, every fourth one NSFW."""
+    return {
+        str(-1001000000000 - i): {
+            "title": f"Channel {i}",
+            "username": f"channel_{i}",
+            "subscribers": (i * 37) % 1000,
+            "is_sfw": i % 4 != 0,
+            "owner_id": 100 + i % 3,
+            "emojis": ["🔥"],
+        }
+        for i in range(count)
+    }
+
+RUN_ID = "2026-10-19T18:00"
+
+def make_plan(*channel_ids: str) -> dict:
+    """Build a crosspost plan with one target per channel, the last one the largest."""
+    return {
+        "created_at": datetime.now().isoformat(),
+        "post_time": "2026-10-19T18:00:00+03:00",
+        "cta_url": "https://t.me/example",
+        "groups": [{
+            "type_tag": "SFW",
+            "image_path": "generated-icon.png",
+            "targets": [
+                {"channel_id": channel_id, "caption": f"list for {channel_id}", "subscribers": subscribers}
+                for subscribers, channel_id in enumerate(channel_ids)
+            ],
+        }],
+    }
@@ -0,0 +1,96 @@
+import threading
+
+import config
+from conftest import make_channels, write_json
+from utils import storage
+
+def setup_data():
+    channels = make_channels(2)
+    write_json(config.CHANNELS_FILE, channels)
+    write_json(config.PENDING_FILE, {"-5": {"title": "Applicant", "owner_id": 7}})
+    write_json(config.SCHEDULE_FILE, {channel_id: {str(day): True for day in range(7)} for channel_id in channels})
+    return list(channels)
+
+def get_files() -> tuple:
+    return storage.get_channels(), storage.get_pending_channels(), storage.get_schedule()
+
+def test_operations_apply_in_order_and_failures_are_skipped():
+    first, second = setup_data()
+    
+    result = storage.apply_batch([
+        {"op": "approve", "channel_id": "-5"},
+        {"op": "emojis", "channel_id": "-5", "emojis": ["✨", "🌻"]},
+        {"op": "schedule", "channel_id": first, "days": {"6": False}},
+        {"op": "reserved_position", "channel_id": second, "position": 11},
+        {"op": "remove", "channel_id": "-404"},
+        {"op": "rename", "channel_id": first},
+    ])
+    
+    assert (result["committed"], result["applied"], result["failed"]) == (True, 3, 3)
+    assert [item["ok"] for item in result["results"]] == [True, True, True, False, False, False]
+    assert "expected 1-10" in result["results"][3]["error"]
+    assert result["results"][4]["error"] == "Channel -404 not found"
+    assert "Unknown op 'rename'" in result["results"][5]["error"]
+    
+    channels, pending, schedule = get_files()
+    assert channels["-5"]["emojis"] == ["✨", "🌻"]
+    assert pending == {}
+    assert schedule["-5"] == {str(day): True for day in range(7)}
+    assert schedule[first]["6"] is False
+    assert "reserved_position" not in channels[second]
+
+def test_all_or_nothing_batch_with_a_failure_saves_nothing():
+    first, _ = setup_data()
+    before = get_files()
+    
+    result = storage.apply_batch([
+        {"op": "approve", "channel_id": "-5"},
+        {"op": "schedule", "channel_id": first, "days": {"0": False}},
+        {"op": "emojis", "channel_id": first, "emojis": "🔥"},
+    ], all_or_nothing=True)
+    
+    assert (result["committed"], result["applied"], result["failed"]) == (False, 0, 1)
+    assert [item["ok"] for item in result["results"]] == [True, True, False]
+    assert get_files() == before
+
+def test_all_or_nothing_batch_without_failures_is_saved():
+    first, second = setup_data()
+    
+    result = storage.apply_batch([
+        {"op": "reject", "channel_id": "-5"},
+        {"op": "reserved_position", "channel_id": first, "position": 2},
+        {"op": "remove", "channel_id": second},
+    ], all_or_nothing=True)
+    
+    assert (result["committed"], result["applied"], result["failed"]) == (True, 3, 0)
+    channels, pending, schedule = get_files()
+    assert list(channels) == [first]
+    assert channels[first]["reserved_position"] == 2
+    assert pending == {}
+    assert second not in schedule
+
+def test_malformed_operations_are_reported():
+    setup_data()
+    
+    result = storage.apply_batch(["approve", {"op": "approve"}, {"op": "emojis", "channel_id": "-5"}])
+    
+    assert [item["error"] for item in result["results"]] == [
+        "Expected an object with op and channel_id",
+        "Missing channel_id",
+        "Missing emojis",
+    ]
+
+def test_concurrent_writers_do_not_lose_changes():
+    first, _ = setup_data()
+    
+    def apply(index):
+        storage.add_pending_channel(str(-100 - index), {"title": f"Applicant {index}", "owner_id": index})
+        storage.apply_batch([{"op": "schedule", "channel_id": first, "days": {str(index % 7): index % 2 == 0}}])
+    
+    threads = [threading.Thread(target=apply, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert {str(-100 - index) for index in range(20)} <= set(storage.get_pending_channels())
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+import config
+from conftest import write_json
+from utils import breaker, storage
+
+CHANNEL_ID = "-1"
+
+def open_breaker():
+    for _ in range(config.CIRCUIT_BREAKER_THRESHOLD):
+        breaker.record_permanent_failure(CHANNEL_ID, "bot is not an administrator")
+
+def make_probe_due():
+    breakers = storage.get_circuit_breakers()
+    breakers[CHANNEL_ID]["next_probe_at"] = (datetime.now() - timedelta(seconds=1)).isoformat()
+    write_json(config.CIRCUIT_BREAKERS_FILE, breakers)
+
+def test_breaker_opens_after_threshold_permanent_failures():
+    for _ in range(config.CIRCUIT_BREAKER_THRESHOLD - 1):
+        assert not breaker.record_permanent_failure(CHANNEL_ID, "chat not found")
+    assert breaker.allow_request(CHANNEL_ID)
+    
+    assert breaker.record_permanent_failure(CHANNEL_ID, "chat not found")
+    assert breaker.is_open(CHANNEL_ID)
+    assert not breaker.allow_request(CHANNEL_ID)
+    assert list(breaker.get_open_breakers()) == [CHANNEL_ID]
+
+def test_transient_failures_are_not_counted():
+    timeout = requests.exceptions.ReadTimeout("timeout")
+    flood = ApiTelegramException("sendPhoto", None, {"error_code": 429, "description": "Too Many Requests"})
+    for _ in range(config.CIRCUIT_BREAKER_THRESHOLD):
+        assert not breaker.record_failure(CHANNEL_ID, timeout)
+        assert not breaker.record_failure(CHANNEL_ID, flood)
+    
+    assert storage.get_circuit_breakers() == {}
+
+def test_open_breaker_lets_one_probe_through_when_due():
+    open_breaker()
+    make_probe_due()
+    
+    assert breaker.allow_request(CHANNEL_ID)
+    # The next probe was pushed back before the first one was even made
+    assert not breaker.allow_request(CHANNEL_ID)
+
+def test_success_closes_the_breaker():
+    open_breaker()
+    
+    breaker.record_success(CHANNEL_ID)
+    
+    assert not breaker.is_open(CHANNEL_ID)
+    assert storage.get_circuit_breakers() == {}
+
+def test_reset_closes_the_breaker_by_hand():
+    open_breaker()
+    
+    assert breaker.reset(CHANNEL_ID)
+    assert breaker.allow_request(CHANNEL_ID)
+    assert not breaker.reset(CHANNEL_ID)
+
+def test_changes_saved_by_another_process_are_picked_up():
+    assert not breaker.is_open(CHANNEL_ID)
+    
+    # As another process would save it
+    write_json(config.CIRCUIT_BREAKERS_FILE, {CHANNEL_ID: {
+        "failures": config.CIRCUIT_BREAKER_THRESHOLD,
+        "opened_at": datetime.now().isoformat(),
+        "next_probe_at": (datetime.now() + timedelta(hours=1)).isoformat(),
+    }})
+    assert breaker.is_open(CHANNEL_ID)
+    
+    breaker.record_permanent_failure("-2", "chat not found")
+    assert set(storage.get_circuit_breakers()) == {CHANNEL_ID, "-2"}
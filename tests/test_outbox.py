@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+from conftest import RUN_ID, make_plan
+from utils import outbox
+
+def get_states() -> dict:
+    return outbox.get_run(RUN_ID)["counts"]
+
+def test_run_starts_with_every_delivery_pending_largest_first():
+    assert outbox.create_run(RUN_ID, make_plan("-1", "-2", "-3"))
+    
+    run = outbox.get_run(RUN_ID)
+    assert run["status"] == outbox.RUN_PLANNED
+    assert run["counts"] == {outbox.DELIVERY_PENDING: 3}
+    assert [delivery["channel_id"] for delivery in outbox.get_pending_deliveries(RUN_ID)] == ["-3", "-2", "-1"]
+
+def test_planned_run_is_replaced_but_started_run_is_kept():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2"))
+    assert outbox.create_run(RUN_ID, make_plan("-1", "-2", "-3"))
+    assert get_states() == {outbox.DELIVERY_PENDING: 3}
+    
+    outbox.start_run(RUN_ID)
+    assert not outbox.create_run(RUN_ID, make_plan("-4"))
+    assert sorted(outbox.get_run_channel_ids(RUN_ID)) == ["-1", "-2", "-3"]
+
+def test_delivery_moves_from_pending_to_sent():
+    outbox.create_run(RUN_ID, make_plan("-1"))
+    key = outbox.get_delivery_key(RUN_ID, "-1")
+    
+    assert outbox.mark_sending(key)
+    assert get_states() == {outbox.DELIVERY_SENDING: 1}
+    outbox.mark_sent(key, 42)
+    
+    assert get_states() == {outbox.DELIVERY_SENT: 1}
+    assert outbox.get_pending_deliveries(RUN_ID) == []
+    # A sent delivery is never sent again
+    assert not outbox.mark_sending(key)
+
+def test_failed_delivery_is_retried_once_due():
+    outbox.create_run(RUN_ID, make_plan("-1"))
+    key = outbox.get_delivery_key(RUN_ID, "-1")
+    outbox.mark_sending(key)
+    retry_at = datetime.now() + timedelta(minutes=5)
+    outbox.mark_failed(key, "timeout", retry_at)
+    
+    assert get_states() == {outbox.DELIVERY_RETRY: 1}
+    assert outbox.get_due_retries(datetime.now()) == []
+    due = outbox.get_due_retries(retry_at)
+    assert [delivery["idempotency_key"] for delivery in due] == [key]
+    assert due[0]["cta_url"] == "https://t.me/example"
+    assert due[0]["attempts"] == 1
+    
+    assert outbox.mark_sending(key)
+    assert outbox.get_due_retries(retry_at) == []
+
+def test_failure_without_retry_time_is_dead_lettered_and_can_be_requeued():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2"))
+    first, second = (outbox.get_delivery_key(RUN_ID, channel_id) for channel_id in ("-1", "-2"))
+    for key in (first, second):
+        outbox.mark_sending(key)
+        outbox.mark_failed(key, "chat not found")
+    
+    assert outbox.count_dead_letters() == 2
+    assert {delivery["last_error"] for delivery in outbox.get_dead_letters()} == {"chat not found"}
+    
+    assert outbox.requeue_dead_letters([first]) == 1
+    assert get_states() == {outbox.DELIVERY_DEAD: 1, outbox.DELIVERY_RETRY: 1}
+    due = outbox.get_due_retries(datetime.now())
+    assert [(delivery["idempotency_key"], delivery["attempts"]) for delivery in due] == [(first, 0)]
+    assert outbox.requeue_dead_letters() == 1
+
+def test_restart_dead_letters_deliveries_interrupted_mid_send():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2"))
+    outbox.start_run(RUN_ID)
+    outbox.mark_sending(outbox.get_delivery_key(RUN_ID, "-1"))
+    
+    outbox.start_run(RUN_ID)
+    
+    assert get_states() == {outbox.DELIVERY_DEAD: 1, outbox.DELIVERY_PENDING: 1}
+    assert outbox.get_dead_letters()[0]["last_error"] == "interrupted while sending, delivery unknown"
+    assert outbox.dead_letter_interrupted(RUN_ID) == 0
+
+def test_failed_run_dead_letters_its_unsent_deliveries_once():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2", "-3"))
+    outbox.start_run(RUN_ID)
+    sent, retry = (outbox.get_delivery_key(RUN_ID, channel_id) for channel_id in ("-1", "-2"))
+    for key in (sent, retry):
+        outbox.mark_sending(key)
+    outbox.mark_sent(sent, 1)
+    outbox.mark_failed(retry, "timeout", datetime.now())
+    
+    assert outbox.fail_run(RUN_ID, "post rejected") == 2
+    
+    assert outbox.get_run(RUN_ID)["status"] == outbox.RUN_FAILED
+    assert get_states() == {outbox.DELIVERY_SENT: 1, outbox.DELIVERY_DEAD: 2}
+    assert {delivery["last_error"] for delivery in outbox.get_dead_letters()} == {"post rejected"}
+    assert outbox.fail_run(RUN_ID, "post rejected") is None
+    assert outbox.get_runs_by_status(outbox.RUN_RUNNING) == []
+
+def test_failing_a_delivered_run_keeps_it_done():
+    outbox.create_run(RUN_ID, make_plan("-1"))
+    key = outbox.get_delivery_key(RUN_ID, "-1")
+    outbox.mark_sending(key)
+    outbox.mark_failed(key, "timeout", datetime.now())
+    outbox.finish_run(RUN_ID)
+    
+    assert outbox.fail_run(RUN_ID, "post rejected") == 1
+    assert outbox.get_run(RUN_ID)["status"] == outbox.RUN_DONE
+
+def test_cancelling_withdraws_only_unsent_deliveries():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2", "-3"))
+    sent = outbox.get_delivery_key(RUN_ID, "-1")
+    outbox.mark_sending(sent)
+    outbox.mark_sent(sent, 1)
+    
+    assert outbox.cancel_run(RUN_ID) == 2
+    assert get_states() == {outbox.DELIVERY_SENT: 1, outbox.DELIVERY_DEAD: 2}
+    assert not outbox.mark_sending(outbox.get_delivery_key(RUN_ID, "-2"))
+
+def test_drop_pending_deliveries_records_the_reason():
+    outbox.create_run(RUN_ID, make_plan("-1", "-2"))
+    
+    assert outbox.drop_pending_deliveries(RUN_ID, {"-2": "bot is not an administrator", "-9": "unknown"}) == 1
+    assert [(delivery["channel_id"], delivery["last_error"]) for delivery in outbox.get_dead_letters()] == [
+        ("-2", "bot is not an administrator")
+    ]
@@ -0,0 +1,76 @@
+import config
+from conftest import make_channels, write_json
+from utils import storage
+
+def setup_data(count: int = 25) -> dict:
+    channels = make_channels(count)
+    write_json(config.CHANNELS_FILE, channels)
+    write_json(config.SCHEDULE_FILE, {
+        channel_id: {str(day): index % 2 == 0 or day != 6 for day in range(7)}
+        for index, channel_id in enumerate(channels)
+    })
+    return channels
+
+def collect(**kwargs) -> list:
+    """Page through a query, getting every channel ID in order."""
+    ids = []
+    page = storage.query_channels(page=1, **kwargs)
+    while True:
+        ids.extend(page["channels"])
+        if page["page"] == page["pages"]:
+            return ids
+        page = storage.query_channels(page=page["page"] + 1, **kwargs)
+
+def test_pages_cover_every_channel_once_in_order():
+    channels = setup_data()
+    
+    first = storage.query_channels(page_size=10)
+    assert (first["total"], first["page"], first["page_size"], first["pages"]) == (25, 1, 10, 3)
+    assert list(first["channels"]) == list(channels)[:10]
+    assert collect(page_size=10) == list(channels)
+    assert len(storage.query_channels(page=3, page_size=10)["channels"]) == 5
+
+def test_out_of_range_pages_are_clamped():
+    channels = setup_data()
+    
+    assert storage.query_channels(page=99, page_size=10)["page"] == 3
+    assert list(storage.query_channels(page=0, page_size=10)["channels"]) == list(channels)[:10]
+    assert storage.query_channels(page_size=0)["page_size"] == 1
+
+def test_sorting():
+    channels = setup_data()
+    
+    by_size = collect(sort=storage.SORT_SUBSCRIBERS, descending=True, page_size=7)
+    sizes = [channels[channel_id]["subscribers"] for channel_id in by_size]
+    assert sizes == sorted(sizes, reverse=True)
+    
+    by_title = collect(sort=storage.SORT_TITLE, page_size=7)
+    assert by_title == sorted(channels, key=lambda channel_id: channels[channel_id]["title"].casefold())
+    assert collect(sort="unknown", page_size=7) == list(channels)
+
+def test_filters_combine():
+    channels = setup_data()
+    
+    sfw_on_sunday = collect(is_sfw=True, day=6, page_size=4)
+    assert sfw_on_sunday == [
+        channel_id for index, channel_id in enumerate(channels)
+        if channels[channel_id]["is_sfw"] and index % 2 == 0
+    ]
+    owned = storage.query_channels(owner_id=101, page_size=100)
+    assert owned["total"] == sum(1 for data in channels.values() if data["owner_id"] == 101)
+    assert storage.query_channels(reserved=True)["total"] == 0
+
+def test_empty_list_has_one_empty_page():
+    page = storage.query_channels(pending=True)
+    
+    assert (page["channels"], page["total"], page["page"], page["pages"]) == ({}, 0, 1, 1)
+
+def test_changes_are_picked_up():
+    setup_data(3)
+    assert storage.query_channels()["total"] == 3
+    
+    storage.set_channel_reserved_position("-1001000000001", 2)
+    assert list(storage.query_channels(reserved=True)["channels"]) == ["-1001000000001"]
+    
+    storage.add_pending_channel("-5", {"title": "Applicant", "owner_id": 7})
+    assert list(storage.query_channels(pending=True)["channels"]) == ["-5"]
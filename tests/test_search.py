@@ -0,0 +1,65 @@
+import config
+from conftest import write_json
+from utils import search, storage
+
+CHANNELS = {
+    "-1": {"title": "Кава та книги", "username": "kava_books", "subscribers": 100, "is_sfw": True},
+    "-2": {"title": "Ранкова кава", "username": "morning", "subscribers": 5000, "is_sfw": True},
+    "-3": {"title": "Декава", "username": "dekava", "subscribers": 9000, "is_sfw": True},
+    "-4": {"title": "Ґанок", "username": "kava", "subscribers": 10, "is_sfw": False},
+    "-5": {"title": "Пʼятниця", "username": "friday", "subscribers": 50, "is_sfw": True},
+    "-6": {"title": "Café Crème", "username": "cafe", "subscribers": 70, "is_sfw": False},
+}
+
+def setup_function():
+    write_json(config.CHANNELS_FILE, CHANNELS)
+
+def find(query: str, **kwargs) -> list:
+    return [result["channel_id"] for result in search.search(query, **kwargs)]
+
+def test_exact_username_then_word_starts_then_the_rest_by_size():
+    # "kava" is @kava's username; -2 and -1 have a word starting with it, -3 only contains it
+    assert find("kava") == ["-4", "-1", "-3"]
+    assert find("кава") == ["-2", "-1", "-3"]
+
+def test_leading_at_is_ignored():
+    assert find("@kava")[0] == "-4"
+
+def test_every_word_has_to_match():
+    assert find("кава книги") == ["-1"]
+    assert find("кава чай") == []
+
+def test_short_words_only_match_word_starts():
+    assert find("ка") == ["-2", "-1"]
+    assert find("ва") == []
+
+def test_case_diacritics_and_apostrophes_are_ignored():
+    assert find("ганок") == ["-4"]
+    assert find("ПЯТНИЦЯ") == ["-5"]
+    assert find("пʼят") == ["-5"]
+    assert find("creme") == ["-6"]
+
+def test_results_are_filtered_and_limited():
+    assert find("кава", is_sfw=True, limit=2) == ["-2", "-1"]
+    assert find("kava", is_sfw=False) == ["-4"]
+    assert find("kava", limit=0) == []
+    assert find("  ") == []
+
+def test_results_carry_the_channel_fields():
+    assert search.search("dekava") == [
+        {"channel_id": "-3", "title": "Декава", "username": "dekava", "subscribers": 9000, "is_sfw": True}
+    ]
+
+def test_index_follows_saved_channels():
+    assert find("книги") == ["-1"]
+    
+    channels = storage.get_channels()
+    channels["-1"]["title"] = "Кава та журнали"
+    channels["-7"] = {"title": "Нові книги", "username": "new_books", "subscribers": 1}
+    storage.save_channels(channels)
+    assert find("книги") == ["-7"]
+    
+    # As another process would save it
+    del channels["-7"]
+    write_json(config.CHANNELS_FILE, channels)
+    assert find("книги") == []
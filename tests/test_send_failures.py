@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from telebot.apihelper import ApiTelegramException
+
+import config
+from conftest import RUN_ID, make_channels, make_plan, write_json
+from utils import breaker, crosspost, outbox, storage
+from utils.crosspost import _record_send_failure
+from utils.errors import ContentError, get_retry_after, is_content_error, is_permanent_error
+
+CHANNEL_ID = "-1"
+
+def api_error(code: int, description: str, **parameters) -> ApiTelegramException:
+    result = {"error_code": code, "description": description}
+    if parameters:
+        result["parameters"] = parameters
+    return ApiTelegramException("sendPhoto", None, result)
+
+@pytest.fixture
+def delivery():
+    """Start a run with one delivery and get it as the engines see it before sending."""
+    outbox.create_run(RUN_ID, make_plan(CHANNEL_ID))
+    delivery = outbox.get_pending_deliveries(RUN_ID)[0]
+    outbox.mark_sending(delivery["idempotency_key"])
+    return delivery
+
+def get_delivery() -> dict:
+    key = outbox.get_delivery_key(RUN_ID, CHANNEL_ID)
+    for delivery in outbox.get_due_retries(datetime.max) + outbox.get_dead_letters() + outbox.get_pending_deliveries(RUN_ID):
+        if delivery["idempotency_key"] == key:
+            return delivery
+    raise AssertionError("delivery not found")
+
+@pytest.mark.parametrize("error, permanent", [
+    (api_error(403, "Forbidden: bot was kicked from the channel chat"), True),
+    (api_error(400, "Bad Request: chat not found"), True),
+    (api_error(400, "Bad Request: not enough rights to send photos to the chat"), True),
+    (api_error(400, "Bad Request: can't parse entities: Can't find end of the entity"), False),
+    (api_error(400, "Bad Request: wrong file identifier"), False),
+    (api_error(429, "Too Many Requests: retry after 5", retry_after=5), False),
+    (api_error(502, "Bad Gateway"), False),
+    (requests.exceptions.ReadTimeout("timeout"), False),
+])
+def test_only_channel_errors_are_permanent(error, permanent):
+    assert is_permanent_error(error) == permanent
+
+def test_content_errors_are_recognised():
+    assert is_content_error(api_error(400, "Bad Request: can't parse entities: Unsupported start tag"))
+    assert is_content_error(api_error(400, "Bad Request: message caption is too long"))
+    assert not is_content_error(api_error(400, "Bad Request: chat not found"))
+    assert not is_content_error(requests.exceptions.ConnectionError("reset"))
+
+def test_retry_after_is_read_from_flood_waits():
+    assert get_retry_after(api_error(429, "Too Many Requests", retry_after=7)) == 7
+    assert get_retry_after(api_error(400, "Bad Request: chat not found")) is None
+
+def test_transient_failure_is_retried_with_backoff(delivery):
+    before = datetime.now()
+    _record_send_failure(delivery, requests.exceptions.ReadTimeout("timeout"), None)
+    
+    retry = get_delivery()
+    assert retry["state"] == outbox.DELIVERY_RETRY
+    retry_at = datetime.fromisoformat(retry["next_attempt_at"])
+    assert retry_at >= before + timedelta(seconds=config.CROSSPOST_RETRY_BASE_SECONDS)
+    assert not breaker.is_open(CHANNEL_ID)
+
+def test_backoff_respects_retry_after(delivery):
+    before = datetime.now()
+    _record_send_failure(delivery, api_error(429, "Too Many Requests", retry_after=600), None)
+    
+    assert datetime.fromisoformat(get_delivery()["next_attempt_at"]) >= before + timedelta(seconds=600)
+
+def test_permanent_failure_is_dead_lettered_and_counted_by_the_breaker(delivery):
+    write_json(config.SENDER_ASSIGNMENTS_FILE, {CHANNEL_ID: "helper"})
+    
+    _record_send_failure(delivery, api_error(403, "Forbidden: bot was kicked"), None)
+    
+    assert get_delivery()["state"] == outbox.DELIVERY_DEAD
+    assert storage.get_circuit_breakers()[CHANNEL_ID]["failures"] == 1
+    with open(config.SENDER_ASSIGNMENTS_FILE) as f:
+        assert CHANNEL_ID not in f.read()
+
+def test_delivery_is_dead_lettered_after_the_last_attempt(delivery):
+    delivery["attempts"] = config.CROSSPOST_MAX_SEND_ATTEMPTS - 1
+    
+    _record_send_failure(delivery, requests.exceptions.ReadTimeout("timeout"), None)
+    
+    assert get_delivery()["state"] == outbox.DELIVERY_DEAD
+
+def test_retry_past_the_deadline_is_dead_lettered(delivery):
+    deadline = datetime.now() + timedelta(seconds=5)
+    
+    _record_send_failure(delivery, requests.exceptions.ReadTimeout("timeout"), deadline)
+    
+    assert get_delivery()["state"] == outbox.DELIVERY_DEAD
+
+def test_content_error_stops_the_run_without_blaming_the_channel(delivery, bot):
+    outbox.create_run(RUN_ID + "-other", make_plan("-2"))
+    error = api_error(400, "Bad Request: can't parse entities: Can't find end of the entity")
+    
+    with pytest.raises(ContentError):
+        _record_send_failure(delivery, error, None)
+    
+    dead = get_delivery()
+    assert dead["state"] == outbox.DELIVERY_DEAD
+    assert dead["last_error"].startswith("post rejected by Telegram")
+    assert outbox.get_run(RUN_ID)["status"] == outbox.RUN_FAILED
+    assert outbox.get_run(RUN_ID + "-other")["status"] == outbox.RUN_PLANNED
+    assert CHANNEL_ID not in storage.get_circuit_breakers()
+    assert {chat_id for chat_id, _ in bot.messages} == set(config.ADMIN_IDS)
+
+def test_content_error_does_not_block_the_next_crosspost(bot):
+    # Two NSFW channels, so both groups have someone to promote
+    channels = make_channels(8)
+    write_json(config.CHANNELS_FILE, channels)
+    bot.send_error = api_error(400, "Bad Request: can't parse entities: Unsupported start tag")
+    
+    with pytest.raises(ContentError):
+        crosspost.create_and_send_crosspost(list(channels))
+    
+    [failed_run] = outbox.get_runs_by_status(outbox.RUN_FAILED)
+    assert outbox.get_run(failed_run)["counts"] == {outbox.DELIVERY_DEAD: 8}
+    assert not crosspost.resume_interrupted_crossposts()
+    
+    bot.send_error = None
+    run_id = crosspost.create_and_send_crosspost(list(channels))
+    
+    assert run_id != failed_run
+    run = outbox.get_run(run_id)
+    assert (run["status"], run["counts"]) == (outbox.RUN_DONE, {outbox.DELIVERY_SENT: 8})
+    assert sorted(chat_id for chat_id, _ in bot.photos) == sorted(channels)
+
+def test_content_rejected_retry_does_not_hold_up_the_others(bot, monkeypatch):
+    outbox.create_run(RUN_ID, make_plan("-1"))
+    outbox.create_run(RUN_ID + "-other", make_plan("-2"))
+    for run_id, channel_id in ((RUN_ID, "-1"), (RUN_ID + "-other", "-2")):
+        key = outbox.get_delivery_key(run_id, channel_id)
+        outbox.mark_sending(key)
+        outbox.mark_failed(key, "timeout", datetime.now() - timedelta(seconds=1))
+        outbox.finish_run(run_id)
+    
+    send_photo = bot.send_photo
+    def reject_first(chat_id, *args, **kwargs):
+        if chat_id == "-1":
+            raise api_error(400, "Bad Request: message caption is too long")
+        return send_photo(chat_id, *args, **kwargs)
+    monkeypatch.setattr(bot, "send_photo", reject_first)
+    
+    crosspost.retry_due_deliveries()
+    
+    assert outbox.get_run(RUN_ID)["counts"] == {outbox.DELIVERY_DEAD: 1}
+    assert outbox.get_run(RUN_ID + "-other")["counts"] == {outbox.DELIVERY_SENT: 1}
+    # The rejected retry isn't due again
+    assert outbox.get_due_retries(datetime.now()) == []
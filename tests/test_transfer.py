@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+import config
+from conftest import make_channels, write_json
+from utils import storage, transfer
+
+def setup_data():
+    channels = make_channels(5)
+    channels["-1001000000001"].update(reserved_position=3, created_at="2026-10-01T12:00:00", id=-1001000000001)
+    pending = {"-1002000000000": {
+        "title": "Заявка, \"з лапками\"", "username": "zaiavka", "is_sfw": False, "owner_id": 9,
+        "schedule": {str(day): day < 5 for day in range(7)}
+    }}
+    schedule = {channel_id: {str(day): day != 6 for day in range(7)} for channel_id in channels}
+    write_json(config.CHANNELS_FILE, channels)
+    write_json(config.PENDING_FILE, pending)
+    write_json(config.SCHEDULE_FILE, schedule)
+    return channels, pending, schedule
+
+def clear_data():
+    for filename in (config.CHANNELS_FILE, config.PENDING_FILE, config.SCHEDULE_FILE):
+        write_json(filename, {})
+
+def export(export_format: str) -> io.StringIO:
+    return io.StringIO("".join(transfer.iter_export(export_format)), newline="")
+
+@pytest.mark.parametrize("export_format", transfer.FORMATS)
+def test_export_and_import_round_trip(export_format):
+    channels, pending, schedule = setup_data()
+    exported = export(export_format)
+    clear_data()
+    
+    result = transfer.import_records(exported, export_format)
+    
+    assert result["imported"] == {transfer.RECORD_CHANNEL: 5, transfer.RECORD_PENDING: 1, transfer.RECORD_SCHEDULE: 5}
+    assert (result["invalid"], result["errors"]) == (0, [])
+    assert storage.get_channels() == channels
+    assert storage.get_pending_channels() == pending
+    assert storage.get_schedule() == schedule
+
+def test_ndjson_export_starts_with_a_header():
+    setup_data()
+    
+    lines = export(transfer.FORMAT_NDJSON).read().splitlines()
+    
+    header = json.loads(lines[0])
+    assert (header["type"], header["version"]) == (transfer.RECORD_EXPORT, transfer.EXPORT_VERSION)
+    assert header["counts"] == {transfer.RECORD_CHANNEL: 5, transfer.RECORD_PENDING: 1, transfer.RECORD_SCHEDULE: 5}
+    assert len(lines) == 1 + 11
+
+def test_export_is_split_into_pieces(monkeypatch):
+    setup_data()
+    monkeypatch.setattr(transfer, "EXPORT_BATCH_RECORDS", 4)
+    
+    pieces = list(transfer.iter_export(transfer.FORMAT_NDJSON))
+    
+    assert len(pieces) == 3
+    assert sum(piece.count("\n") for piece in pieces) == 12
+
+def test_import_upserts_in_chunks_and_reports_invalid_records():
+    setup_data()
+    lines = [
+        json.dumps({"type": "channel", "channel_id": "-1001000000000", "data": {"title": "Renamed"}}),
+        "{not json",
+        json.dumps({"type": "channel", "channel_id": "@name", "data": {"title": "Bad ID"}}),
+        json.dumps({"type": "schedule", "channel_id": "-1001000000000", "days": {"7": True}}),
+        json.dumps({"type": "pending", "channel_id": -1003000000000, "data": {"title": "New", "subscribers": -1}}),
+        json.dumps({"type": "channel", "channel_id": "-1003000000000", "data": {"title": "New"}}),
+        json.dumps({"type": "schedule", "channel_id": "-1003000000000", "days": {"0": False}}),
+    ]
+    
+    result = transfer.import_records(lines, chunk_size=1)
+    
+    assert result["imported"] == {transfer.RECORD_CHANNEL: 2, transfer.RECORD_PENDING: 0, transfer.RECORD_SCHEDULE: 1}
+    assert result["chunks"] == 3
+    assert [error["line"] for error in result["errors"]] == [2, 3, 4, 5]
+    assert result["errors"][0]["error"].startswith("Invalid JSON")
+    channels = storage.get_channels()
+    assert channels["-1001000000000"] == {"title": "Renamed"}
+    assert channels["-1003000000000"] == {"title": "New"}
+    assert storage.get_schedule()["-1003000000000"] == {"0": False}
+
+def test_dry_run_checks_without_saving():
+    channels, _, _ = setup_data()
+    exported = export(transfer.FORMAT_CSV)
+    clear_data()
+    
+    result = transfer.import_records(exported, transfer.FORMAT_CSV, dry_run=True)
+    
+    assert result["imported"][transfer.RECORD_CHANNEL] == len(channels)
+    assert storage.get_channels() == {}
+
+def test_csv_import_needs_a_header():
+    result = transfer.import_records(io.StringIO("channel,-1001,Title\n"), transfer.FORMAT_CSV)
+    
+    assert result["invalid"] == 1
+    assert "header row" in result["errors"][0]["error"]
@@ -0,0 +1,235 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import InlineKeyboardMarkup
+
+import config
+from utils import breaker, outbox, senders
+from utils.crosspost import (
+    _finish_run_delivery, _prepare_run_delivery, _record_send_failure,
+    get_delivery_file_id, remember_file_id
+)
+from utils.errors import ContentError, get_retry_after
+
+logger = logging.getLogger(__name__)
+
+if config.TELEGRAM_API_URL:
+    asyncio_helper.API_URL = config.TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+
+# The engine runs on one event loop in its own thread. Every request goes
+# through an AsyncTeleBot on that loop, and so through the same aiohttp session.
+_loop = None
+_loop_lock = threading.Lock()
+_bots = {}
+_in_flight = None
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get the engine's event loop, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="crosspost-engine", daemon=True).start()
+            logger.info("Started the async crosspost engine")
+    return _loop
+
+def _run(coro):
+    """Run a coroutine on the engine's loop and block until it is done.
+    
+    This is how the synchronous callers (scheduler jobs, bot handlers and web
+    routes) use the engine, from whatever thread they run in.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+def _get_bot(sender_id: str = senders.PRIMARY_SENDER) -> AsyncTeleBot:
+    """Get the async bot of a sender, creating it on the engine's loop on first use."""
+    global _in_flight
+    if _in_flight is None:
+        # The connection pool is sized when the shared session is created
+        asyncio_helper.REQUEST_LIMIT = config.ASYNC_MAX_CONNECTIONS
+        _in_flight = asyncio.Semaphore(config.ASYNC_MAX_IN_FLIGHT)
+    if sender_id not in _bots:
+        _bots[sender_id] = AsyncTeleBot(senders.get_sender_token(sender_id))
+    return _bots[sender_id]
+
+async def _off_loop(func: Callable, *args) -> Any:
+    """Run blocking storage or outbox I/O on the default executor, so it doesn't hold up the loop's sends."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+async def _get_subscriber_count(channel_id: str) -> int:
+    """Get the number of subscribers for a channel, or 0 if there was an error.
+    
+    Requests share the primary bot's limiter with the sync engine and its
+    sends, and are tried again after the wait Telegram asks for.
+    """
+    if not await _off_loop(breaker.allow_request, channel_id):
+        logger.debug(f"Skipping subscriber count for channel {channel_id}, circuit breaker is open")
+        return 0
+    
+    bot = _get_bot()
+    limiter = senders.get_sender_limiter(senders.PRIMARY_SENDER)
+    for attempt in range(1, config.SUBSCRIBER_COUNT_MAX_ATTEMPTS + 1):
+        await asyncio.sleep(limiter.reserve())
+        try:
+            async with _in_flight:
+                member_count = await bot.get_chat_member_count(int(channel_id))
+            break
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after and attempt < config.SUBSCRIBER_COUNT_MAX_ATTEMPTS:
+                logger.warning(f"Flood wait getting subscriber count for channel {channel_id}, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            await _off_loop(breaker.record_failure, channel_id, e)
+            logger.error(f"Error getting subscriber count for channel {channel_id}: {e}")
+            return 0
+    
+    await _off_loop(breaker.record_success, channel_id)
+    return member_count
+
+async def _get_subscriber_counts(channel_ids: List[str]) -> Dict[str, int]:
+    """Fetch the subscriber counts of all channels concurrently."""
+    counts = await asyncio.gather(*(_get_subscriber_count(channel_id) for channel_id in channel_ids))
+    return dict(zip(channel_ids, counts))
+
+def get_subscriber_counts(channel_ids: List[str]) -> Dict[str, int]:
+    """Get the number of subscribers for several channels at once.
+    
+    Args:
+        channel_ids: IDs of the channels
+        
+    Returns:
+        The subscriber count of each channel, 0 where there was an error
+    """
+    if not channel_ids:
+        return {}
+    return _run(_get_subscriber_counts(channel_ids))
+
+async def _send_delivery(delivery: Dict, keyboard: InlineKeyboardMarkup, file_ids: Dict,
+                         upload_locks: Dict[str, asyncio.Lock]):
+    """Send one outbox delivery from the channel's sender bot and record the result.
+    
+    While an image has no file_id for the sender yet, only one send uploads
+    it and the sender's concurrent sends of the same image wait for its file_id.
+    
+    Args:
+        delivery: The delivery row from the outbox
+        keyboard: The CTA keyboard of its run
+        file_ids: Known file_ids by sender and image path, updated when the image gets uploaded
+        upload_locks: Locks serializing the uploads, by sender and image path
+        
+    Returns:
+        The sent message, or None if the delivery was withdrawn, e.g. because its run was cancelled
+    """
+    sender_id = await _off_loop(senders.get_channel_sender, delivery["channel_id"])
+    bot = _get_bot(sender_id)
+    icon_path = delivery["image_path"]
+    image = (sender_id, icon_path)
+    if image not in file_ids:
+        file_ids[image] = await _off_loop(get_delivery_file_id, delivery, sender_id)
+    
+    if not await _off_loop(outbox.mark_sending, delivery["idempotency_key"]):
+        return None
+    await asyncio.sleep(senders.get_sender_limiter(sender_id).reserve())
+    message = None
+    if not file_ids[image] and os.path.exists(icon_path):
+        async with upload_locks.setdefault(image, asyncio.Lock()):
+            if not file_ids[image]:
+                # Send message with image, and keep its file_id for the remaining targets
+                with open(icon_path, 'rb') as photo:
+                    async with _in_flight:
+                        message = await bot.send_photo(
+                            chat_id=delivery["channel_id"],
+                            photo=photo,
+                            caption=delivery["caption"],
+                            parse_mode="Markdown",
+                            reply_markup=keyboard
+                        )
+                file_ids[image] = message.photo[-1].file_id
+                await _off_loop(remember_file_id, icon_path, file_ids[image], sender_id)
+    
+    if message is None:
+        async with _in_flight:
+            if file_ids[image]:
+                # Reuse the already uploaded image
+                message = await bot.send_photo(
+                    chat_id=delivery["channel_id"],
+                    photo=file_ids[image],
+                    caption=delivery["caption"],
+                    parse_mode="Markdown",
+                    reply_markup=keyboard
+                )
+            else:
+                # Fallback to text-only message if image doesn't exist
+                message = await bot.send_message(
+                    chat_id=delivery["channel_id"],
+                    text=delivery["caption"],
+                    parse_mode="Markdown",
+                    reply_markup=keyboard,
+                    disable_web_page_preview=True
+                )
+    
+    await _off_loop(outbox.mark_sent, delivery["idempotency_key"], message.message_id)
+    await _off_loop(breaker.record_success, delivery["channel_id"])
+    return message
+
+async def _deliver_crosspost_run(run_id: str) -> Dict:
+    """Send all pending deliveries of an outbox run concurrently.
+    
+    Sends are started at the pace of the run's pacer, as in the sync engine,
+    but without waiting for the previous ones to finish; the semaphore bounds
+    how many are in flight at once.
+    """
+    prepared = await _off_loop(_prepare_run_delivery, run_id)
+    if prepared is None:
+        return {}
+    deliveries, keyboard, pacer, projected_completion = prepared
+    file_ids = {}
+    upload_locks = {}
+    content_error = None
+    
+    async def send(delivery: Dict) -> bool:
+        nonlocal content_error
+        try:
+            if await _send_delivery(delivery, keyboard, file_ids, upload_locks) is None:
+                return False
+        except Exception as e:
+            try:
+                await _off_loop(_record_send_failure, delivery, e, pacer.deadline)
+            except ContentError as error:
+                content_error = error
+            return False
+        logger.info(f"Sent {delivery['type_tag']} crosspost to channel {delivery['channel_id']} (excluding itself from list)")
+        return True
+    
+    sends = []
+    for delivery in deliveries:
+        if content_error:
+            break
+        await asyncio.sleep(pacer.next_delay())
+        await asyncio.sleep(pacer.limiter.reserve())
+        sends.append(asyncio.create_task(send(delivery)))
+        pacer.record_send()
+    
+    sent_count = sum(await asyncio.gather(*sends))
+    if content_error:
+        # The sends still in flight have settled; the ones never started were dead-lettered with the run
+        raise content_error
+    return await _off_loop(_finish_run_delivery, run_id, len(deliveries), sent_count, pacer, projected_completion)
+
+def deliver_crosspost_run(run_id: str) -> Dict:
+    """Send all pending deliveries of an outbox run on the async engine.
+    
+    Args:
+        run_id: ID of the run in the outbox
+        
+    Returns:
+        A summary with the number of sends and the projected completion time
+    """
+    return _run(_deliver_crosspost_run(run_id))
@@ -0,0 +1,159 @@
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+import config
+from utils import storage
+from utils.errors import is_permanent_error
+
+logger = logging.getLogger(__name__)
+
+# Breakers are only stored while a channel has failures, keyed by channel ID. Every
+# process keeps a copy, read again whenever another process saved the file.
+_lock = threading.Lock()
+_breakers = None
+_version = None
+
+def _get_breakers() -> Dict[str, Dict]:
+    """Get the breaker state, loading it if it changed since it was last loaded."""
+    global _breakers, _version
+    version = storage.get_file_version(config.CIRCUIT_BREAKERS_FILE)
+    if _breakers is None or version != _version:
+        _breakers = storage.get_circuit_breakers()
+        _version = version
+    return _breakers
+
+@contextmanager
+def _update() -> Iterator[Dict[str, Dict]]:
+    """Change the breaker state, starting from the state saved last, by any process.
+    
+    The change is made under the storage lock, so changes made at the same
+    time by other processes aren't overwritten. The state is saved when the
+    block ends, unless it raises.
+    """
+    global _version
+    with storage.transaction(), _lock:
+        breakers = _get_breakers()
+        yield breakers
+        if storage.save_circuit_breakers(breakers):
+            _version = storage.get_file_version(config.CIRCUIT_BREAKERS_FILE)
+        else:
+            logger.error("Failed to save circuit breaker state")
+
+def is_open(channel_id: str) -> bool:
+    """Check whether a channel's breaker is open, without claiming a probe."""
+    with _lock:
+        breaker = _get_breakers().get(str(channel_id))
+        return bool(breaker and breaker.get("opened_at"))
+
+def allow_request(channel_id: str) -> bool:
+    """Check whether a request to a channel should be made.
+    
+    An open breaker rejects requests until its next probe is due. The caller
+    that gets through then makes the probe request; the next probe is pushed
+    back right away so that concurrent callers, in any process, don't all
+    probe at once.
+    
+    Args:
+        channel_id: The ID of the channel
+    
+    Returns:
+        True if the request should go ahead
+    """
+    def is_probe_due(breakers: Dict[str, Dict]) -> bool:
+        breaker = breakers.get(str(channel_id))
+        return datetime.now() >= datetime.fromisoformat(breaker["next_probe_at"])
+    
+    if not is_open(channel_id):
+        return True
+    with _lock:
+        if not is_probe_due(_get_breakers()):
+            return False
+    
+    with _update() as breakers:
+        breaker = breakers.get(str(channel_id))
+        if breaker and breaker.get("opened_at"):
+            if not is_probe_due(breakers):
+                return False
+            breaker["next_probe_at"] = (datetime.now() + timedelta(hours=config.CIRCUIT_BREAKER_PROBE_HOURS)).isoformat()
+    
+    logger.info(f"Probing channel {channel_id} with an open circuit breaker")
+    return True
+
+def record_success(channel_id: str):
+    """Close a channel's breaker after a successful request."""
+    with _lock:
+        if str(channel_id) not in _get_breakers():
+            return
+    
+    with _update() as breakers:
+        breaker = breakers.pop(str(channel_id), None)
+    
+    if breaker and breaker.get("opened_at"):
+        logger.info(f"Circuit breaker for channel {channel_id} closed")
+
+def record_failure(channel_id: str, error: Exception) -> bool:
+    """Count a failed request to a channel; only permanent failures count.
+    
+    Args:
+        channel_id: The ID of the channel
+        error: The exception raised by the request
+    
+    Returns:
+        True if the channel's breaker is open
+    """
+    if not is_permanent_error(error):
+        return is_open(channel_id)
+    return record_permanent_failure(channel_id, str(error))
+
+def record_permanent_failure(channel_id: str, reason: str) -> bool:
+    """Count a failure that is known to be permanent, e.g. the bot lost its admin rights.
+    
+    Args:
+        channel_id: The ID of the channel
+        reason: Description of the failure
+    
+    Returns:
+        True if the channel's breaker is open
+    """
+    now = datetime.now()
+    with _update() as breakers:
+        breaker = breakers.setdefault(str(channel_id), {"failures": 0, "opened_at": None})
+        breaker["failures"] += 1
+        breaker["last_error"] = reason
+        breaker["last_failure_at"] = now.isoformat()
+        
+        opened = False
+        if breaker["failures"] >= config.CIRCUIT_BREAKER_THRESHOLD:
+            if not breaker["opened_at"]:
+                breaker["opened_at"] = now.isoformat()
+                opened = True
+            breaker["next_probe_at"] = (now + timedelta(hours=config.CIRCUIT_BREAKER_PROBE_HOURS)).isoformat()
+        is_now_open = bool(breaker["opened_at"])
+    
+    if opened:
+        logger.warning(f"Circuit breaker for channel {channel_id} opened after {breaker['failures']} failures: {reason}")
+    return is_now_open
+
+def get_open_breakers() -> Dict[str, Dict]:
+    """Get the open breakers, keyed by channel ID."""
+    with _lock:
+        return {
+            channel_id: dict(breaker)
+            for channel_id, breaker in _get_breakers().items()
+            if breaker.get("opened_at")
+        }
+
+def reset(channel_id: str) -> bool:
+    """Close a channel's breaker by hand, e.g. after the bot was re-added.
+    
+    Returns:
+        True if the channel had a breaker
+    """
+    with _update() as breakers:
+        if breakers.pop(str(channel_id), None) is None:
+            return False
+    logger.info(f"Circuit breaker for channel {channel_id} reset")
+    return True
@@ -1,19 +1,38 @@
 import logging
 import random
-from typing import List, Optional
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import telebot
+from telebot import apihelper
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 import config
-from utils import storage
+from utils import breaker, outbox, senders, singleflight, storage
+from utils.delivery import GROUP_NSFW, GROUP_SFW, DeliveryPacer
+from utils.errors import ContentError, get_retry_after, is_content_error, is_permanent_error
+from utils.ratelimit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Send all requests to a local Bot API server (or a stand-in) if one is configured
+if config.TELEGRAM_API_URL:
+    apihelper.API_URL = config.TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+    apihelper.FILE_URL = config.TELEGRAM_API_URL.rstrip("/") + "/file/bot{0}/{1}"
+
+ENGINE_SYNC = "sync"
+ENGINE_ASYNC = "async"
+ENGINE_PROCESS = "process"
+
+# Keys of the operations that run one at a time across all instances
+OPERATION_CROSSPOST = "crosspost"
+OPERATION_UPDATE_SUBSCRIBERS = "update_subscribers"
+
 # Store a reference to the bot instance for later use
 _bot = None
+_bot_user = None
 
 def get_bot_instance():
     """Get the bot instance."""
@@ -25,77 +44,294 @@ def get_bot_instance():
 
 def init_bot(bot):
     """Initialize with the active bot instance."""
-    global _bot
+    global _bot, _bot_user
     _bot = bot
-    
+    _bot_user = None
+
+def get_sender_bot_instance(sender_id: str):
+    """Get the bot that sends crossposts for a sender."""
+    if sender_id == senders.PRIMARY_SENDER:
+        return get_bot_instance()
+    return senders.get_sender_bot(sender_id)
+
+def get_bot_user():
+    """Get the bot's own user, fetched once per bot instance."""
+    global _bot_user
+    if _bot_user is None:
+        _bot_user = get_bot_instance().get_me()
+    return _bot_user
+
 def get_channel_subscriber_count(channel_id: str) -> int:
     """Get the number of subscribers for a channel.
     
     Args:
         channel_id: The ID of the channel
-        
+    
     Returns:
         The number of subscribers or 0 if there was an error
     """
-    bot = get_bot_instance()
-    try:
-        # Convert string ID to int
-        chat_id = int(channel_id)
-        # Get chat info from Telegram
-        chat_info = bot.get_chat(chat_id)
-        # Get member count
-        member_count = bot.get_chat_member_count(chat_id)
-        return member_count
-    except Exception as e:
-        logger.error(f"Error getting subscriber count for channel {channel_id}: {e}")
+    # Don't spend requests on channels that keep failing
+    if not breaker.allow_request(channel_id):
+        logger.debug(f"Skipping subscriber count for channel {channel_id}, circuit breaker is open")
         return 0
-        
-def update_all_channel_subscribers():
+    
+    bot = get_bot_instance()
+    for attempt in range(1, config.SUBSCRIBER_COUNT_MAX_ATTEMPTS + 1):
+        # Counts share the primary bot's flood limit with its sends
+        senders.get_sender_limiter(senders.PRIMARY_SENDER).acquire()
+        try:
+            # Get member count from Telegram
+            member_count = bot.get_chat_member_count(int(channel_id))
+            break
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after and attempt < config.SUBSCRIBER_COUNT_MAX_ATTEMPTS:
+                logger.warning(f"Flood wait getting subscriber count for channel {channel_id}, retrying in {retry_after}s")
+                time.sleep(retry_after)
+                continue
+            breaker.record_failure(channel_id, e)
+            logger.error(f"Error getting subscriber count for channel {channel_id}: {e}")
+            return 0
+    
+    breaker.record_success(channel_id)
+    return member_count
+
+def get_subscriber_counts(channel_ids: List[str]) -> Dict[str, int]:
+    """Get the number of subscribers for several channels.
+    
+    With the async engine the requests run concurrently, otherwise one after
+    another.
+    
+    Args:
+        channel_ids: IDs of the channels
+    
+    Returns:
+        The subscriber count of each channel, 0 where there was an error
+    """
+    if config.CROSSPOST_ENGINE == ENGINE_ASYNC:
+        # Import here so that aiohttp is only needed when the async engine is used
+        from utils import async_crosspost
+        return async_crosspost.get_subscriber_counts(channel_ids)
+    
+    return {channel_id: get_channel_subscriber_count(channel_id) for channel_id in channel_ids}
+
+# Subscriber counts fetched between two progress reports of update_all_channel_subscribers
+SUBSCRIBER_UPDATE_BATCH_SIZE = 50
+
+def update_all_channel_subscribers(progress: Optional[Callable[[int, int], None]] = None, cooldown: float = 0) -> int:
     """Update subscriber counts for all channels from Telegram API.
     
     This function should be run periodically to ensure statistics are accurate.
+    If an update is already running on any instance, this waits for it and
+    returns its result instead of fetching every count again.
+    
+    Args:
+        progress: Called with the number of channels done and the total after every batch
+        cooldown: Return the result of an update that finished at most this many seconds ago
+    
+    Returns:
+        The number of channels whose count was updated
     """
+    return singleflight.run(OPERATION_UPDATE_SUBSCRIBERS, _update_all_channel_subscribers, progress, cooldown=cooldown)
+
+def _update_all_channel_subscribers(progress: Optional[Callable[[int, int], None]]) -> int:
+    """Fetch and save the subscriber counts of all channels."""
     logger.info("Updating subscriber counts for all channels")
-    channels = storage.get_channels()
-    updated_count = 0
+    channel_ids = list(storage.get_channels())
     
-    for channel_id, channel_data in channels.items():
-        try:
-            # Get current subscriber count from Telegram
-            subscriber_count = get_channel_subscriber_count(channel_id)
-            
-            if subscriber_count > 0:
-                # Update the channel data
-                channel_data['subscribers'] = subscriber_count
-                updated_count += 1
-            else:
-                logger.warning(f"Failed to get subscriber count for channel {channel_id}")
-        except Exception as e:
-            logger.error(f"Error updating subscribers for channel {channel_id}: {e}")
+    # Get current subscriber counts from Telegram
+    subscriber_counts = {}
+    for start in range(0, len(channel_ids), SUBSCRIBER_UPDATE_BATCH_SIZE):
+        subscriber_counts.update(get_subscriber_counts(channel_ids[start:start + SUBSCRIBER_UPDATE_BATCH_SIZE]))
+        if progress:
+            progress(len(subscriber_counts), len(channel_ids))
+    
+    # Apply the counts to the channels as they are now, so edits made meanwhile are kept
+    updated_count = 0
+    try:
+        with storage.transaction() as tx:
+            channels = tx.get(storage.DATA_CHANNELS)
+            for channel_id, subscriber_count in subscriber_counts.items():
+                if channel_id not in channels:
+                    continue
+                if subscriber_count > 0:
+                    # Update the channel data
+                    tx.change(storage.DATA_CHANNELS)[channel_id]['subscribers'] = subscriber_count
+                    updated_count += 1
+                else:
+                    logger.warning(f"Failed to get subscriber count for channel {channel_id}")
+    except storage.StorageError as e:
+        logger.error(f"Failed to save updated channel data: {e}")
+        return 0
     
-    # Save the updated channel data
     if updated_count > 0:
-        if storage.save_channels(channels):
-            logger.info(f"Successfully updated subscriber counts for {updated_count} channels")
-        else:
-            logger.error("Failed to save updated channel data")
+        logger.info(f"Successfully updated subscriber counts for {updated_count} channels")
     else:
         logger.warning("No channel subscriber counts were updated")
+    return updated_count
+
+def escape_markdown(text: str) -> str:
+    """Escape text that is placed outside of entities in legacy Markdown.
+    
+    Args:
+        text: The raw text
+    
+    Returns:
+        The text with entity-opening characters escaped
+    """
+    for char in ('_', '*', '`', '['):
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def escape_markdown_link_text(text: str) -> str:
+    """Make text safe to use as the label of a legacy Markdown link.
+    
+    Telegram takes everything up to the closing bracket literally and does not
+    allow escapes inside an entity, so only ']' needs to be replaced.
+    
+    Args:
+        text: The raw link label
+    
+    Returns:
+        The label with closing brackets replaced by a lookalike character
+    """
+    return text.replace(']', '\uff3d')
+
+def render_channel_fragment(channel: dict) -> str:
+    """Render the list line for a channel (emojis and link) without its number."""
+    # Format channel with emojis
+    emoji_str = " ".join(channel["emojis"]) if channel["emojis"] else ""
+    if emoji_str:
+        emoji_str = f" {escape_markdown(emoji_str)} "
+    
+    # Always use the channel title with a link
+    title = escape_markdown_link_text(channel["title"])
+    if channel["username"]:
+        channel_link = f"[{title}](https://t.me/{channel['username']})"
+    else:
+        channel_link = f"[{title}](https://t.me/{str(channel['id']).replace('@', '')})"
+    
+    return f"{emoji_str}{channel_link}"
+
+# Rendered list lines keyed by channel ID, together with the fields they were rendered from
+_fragment_cache = {}
+
+def get_channel_fragment(channel: dict) -> str:
+    """Get the cached list line for a channel, re-rendering it only if the channel changed."""
+    channel_id = str(channel["id"])
+    signature = (channel["title"], channel["username"], tuple(channel["emojis"]))
+    
+    cached = _fragment_cache.get(channel_id)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    fragment = render_channel_fragment(channel)
+    _fragment_cache[channel_id] = (signature, fragment)
+    return fragment
+
+def render_caption(prefix: str, fragments: List[str]) -> str:
+    """Assemble a crosspost caption from a header prefix and numbered list lines."""
+    return prefix + "".join(f"{idx}. {fragment}\n" for idx, fragment in enumerate(fragments, 1))
+
+def get_icon_path(is_sfw: bool) -> str:
+    """Get the image used for SFW or NSFW crossposts."""
+    if is_sfw:
+        return "generated-icon.png"  # Default icon for SFW
+    
+    # Check if a NSFW-specific icon exists, otherwise fall back to default
+    nsfw_icon_path = "nsfw-icon.png"
+    return nsfw_icon_path if os.path.exists(nsfw_icon_path) else "generated-icon.png"
+
+def _get_image_signature(path: str) -> Optional[List[int]]:
+    """Identify the current version of an image file by its mtime and size."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _get_media_cache_key(path: str, sender_id: str) -> str:
+    """Get the media cache key of an image; file_ids only work for the bot that uploaded the file."""
+    return path if sender_id == senders.PRIMARY_SENDER else f"{sender_id}:{path}"
+
+def get_cached_file_id(path: str, sender_id: str = senders.PRIMARY_SENDER) -> Optional[str]:
+    """Get the Telegram file_id of an image already uploaded by a sender, if it has not changed since."""
+    entry = storage.get_media_cache().get(_get_media_cache_key(path, sender_id))
+    if entry and entry.get("signature") == _get_image_signature(path):
+        return entry.get("file_id")
+    return None
+
+def remember_file_id(path: str, file_id: str, sender_id: str = senders.PRIMARY_SENDER):
+    """Remember the Telegram file_id of an image uploaded by a sender."""
+    media_cache = storage.get_media_cache()
+    media_cache[_get_media_cache_key(path, sender_id)] = {"file_id": file_id, "signature": _get_image_signature(path)}
+    storage.save_media_cache(media_cache)
+
+def warm_image_cache(path: str) -> Optional[str]:
+    """Make sure an image has a file_id so the send stage never has to upload it.
+    
+    The image is uploaded to config.MEDIA_CACHE_CHAT_ID if one is configured.
+    Otherwise the first send of the run uploads it and the file_id is reused
+    from then on.
+    
+    Args:
+        path: Path of the image file
+    
+    Returns:
+        The file_id, or None if it is not known yet
+    """
+    file_id = get_cached_file_id(path)
+    if file_id or not config.MEDIA_CACHE_CHAT_ID or not os.path.exists(path):
+        return file_id
+    
+    bot = get_bot_instance()
+    try:
+        with open(path, 'rb') as photo:
+            message = bot.send_photo(chat_id=config.MEDIA_CACHE_CHAT_ID, photo=photo)
+        file_id = message.photo[-1].file_id
+        remember_file_id(path, file_id)
+        logger.info(f"Uploaded {path} to the media cache chat")
+    except Exception as e:
+        logger.error(f"Failed to upload {path} to the media cache chat: {e}")
+    return file_id
+
+def warm_post_images():
+    """Make sure both the SFW and the NSFW post image have a file_id, see warm_image_cache."""
+    for is_sfw in (True, False):
+        warm_image_cache(get_icon_path(is_sfw))
 
-def create_and_send_crosspost(active_channels: List[str]):
-    """Create and send a crosspost message to all active channels."""
-    logger.info(f"Creating crosspost for {len(active_channels)} active channels")
+def build_crosspost_plan(active_channels: List[str], post_time: Optional[datetime] = None) -> Optional[Dict]:
+    """Do all the preparation for a crosspost so that only the sends remain.
+    
+    This leaves out channels the bot can no longer post to, fetches
+    subscriber counts, selects the channels for each group, renders every
+    target's caption and resolves the image file_id.
+    
+    Args:
+        active_channels: IDs of the channels taking part in the crosspost
+        post_time: When the plan is meant to be sent, if it is scheduled
+    
+    Returns:
+        The plan, or None if there is nothing to post
+    """
+    logger.info(f"Planning crosspost for {len(active_channels)} active channels")
     
     if not active_channels:
         logger.warning("No active channels provided for crosspost")
-        return
-
+        return None
+    
+    # Import here to avoid circular imports
+    from utils import preflight
+    
+    # Channels the bot can't post to are neither sent to nor promoted
+    unpostable = preflight.get_unpostable_channels(active_channels)
+    
     # Get channel data for all active channels
     channels_data = storage.get_channels()
     channels_to_post = []
     
     for channel_id in active_channels:
-        if channel_id in channels_data:
+        if channel_id in channels_data and channel_id not in unpostable:
             channels_to_post.append({
                 "id": channel_id,
                 "title": channels_data[channel_id].get("title", "Unknown Channel"),
@@ -106,40 +342,51 @@ def create_and_send_crosspost(active_channels: List[str]):
     
     if not channels_to_post:
         logger.warning("No valid channels found for crosspost")
-        return
+        return None
+    
+    plan = {
+        "created_at": datetime.now().isoformat(),
+        "post_time": post_time.isoformat() if post_time else None,
+        "cta_url": f"https://t.me/{get_bot_user().username}",
+        "groups": [],
+        "excluded": unpostable
+    }
     
     # Split into SFW and NSFW groups
     sfw_channels = [c for c in channels_to_post if c["is_sfw"]]
     nsfw_channels = [c for c in channels_to_post if not c["is_sfw"]]
     
-    # Process SFW channels if there are any
-    if sfw_channels:
-        process_crosspost_group(sfw_channels, is_sfw=True)
+    for group_channels, is_sfw in ((sfw_channels, True), (nsfw_channels, False)):
+        if group_channels:
+            plan["groups"].append(plan_crosspost_group(group_channels, is_sfw))
     
-    # Process NSFW channels if there are any
-    if nsfw_channels:
-        process_crosspost_group(nsfw_channels, is_sfw=False)
+    logger.info(
+        f"Planned crosspost with {sum(len(g['targets']) for g in plan['groups'])} targets, "
+        f"{len(plan['excluded'])} excluded"
+    )
+    return plan
 
-def process_crosspost_group(channels: List[dict], is_sfw: bool):
-    """Process a group of channels (either SFW or NSFW) for crossposting."""
-    bot = get_bot_instance()
-    from utils import storage
-    
+def plan_crosspost_group(channels: List[dict], is_sfw: bool) -> Dict:
+    """Select the channels to promote for a group (either SFW or NSFW) and render every target's caption."""
     # Get subscriber counts for all channels and categorize them
-    small_channels = []  # Channels with less than 300 subscribers (priority)
-    large_channels = []  # Channels with 300+ subscribers
+    small_channels = []  # Channels below SMALL_CHANNEL_THRESHOLD subscribers (priority)
+    large_channels = []  # Channels with at least SMALL_CHANNEL_THRESHOLD subscribers
+    
+    subscriber_counts = get_subscriber_counts([channel["id"] for channel in channels])
     
     for channel in channels:
-        # Get subscriber count
-        subscriber_count = get_channel_subscriber_count(channel["id"])
+        subscriber_count = subscriber_counts[channel["id"]]
         channel["subscribers"] = subscriber_count
         
-        if subscriber_count < 300:
+        if subscriber_count < config.SMALL_CHANNEL_THRESHOLD:
             small_channels.append(channel)
         else:
             large_channels.append(channel)
     
-    logger.info(f"Found {len(small_channels)} small channels (<300 subscribers) and {len(large_channels)} large channels")
+    logger.info(
+        f"Found {len(small_channels)} small channels (<{config.SMALL_CHANNEL_THRESHOLD} subscribers) "
+        f"and {len(large_channels)} large channels"
+    )
     
     # Get channels with reserved positions for this content type (SFW/NSFW)
     reserved_positions = storage.get_channels_with_reserved_positions(is_sfw=is_sfw)
@@ -158,14 +405,14 @@ def process_crosspost_group(channels: List[dict], is_sfw: bool):
         if array_position < 0 or array_position >= config.MAX_CHANNELS_PER_POST:
             logger.warning(f"Reserved position {position} out of bounds, skipping")
             continue
-            
+        
         # Find the channel data for this ID
         channel_data = None
         for channel in channels:
             if str(channel["id"]) == str(channel_id):
                 channel_data = channel
                 break
-                
+        
         if channel_data:
             final_channels[array_position] = channel_data
             reserved_channel_ids.add(str(channel_id))
@@ -212,12 +459,9 @@ def process_crosspost_group(channels: List[dict], is_sfw: bool):
     else:
         header = config.CROSSPOST_HEADER_NSFW
     
-    # Create the message text
-    message_text = f"{header}\n\n"
-    
     # Add type indicator for better visibility
     type_tag = "SFW" if is_sfw else "NSFW 🔞"
-    message_text += f"#{type_tag}\n\n"
+    caption_prefix = f"{header}\n\n#{type_tag}\n\n"
     
     # If we don't have enough channels total, use all available ones
     if len(selected_channels) < config.MAX_CHANNELS_PER_POST and len(channels) < config.MAX_CHANNELS_PER_POST:
@@ -232,92 +476,513 @@ def process_crosspost_group(channels: List[dict], is_sfw: bool):
     else:
         logger.info(f"Selected {len(selected_channels)} channels for posting")
     
-    for idx, channel in enumerate(selected_channels, 1):
-        # Format channel with emojis
-        emoji_str = " ".join(channel["emojis"]) if channel["emojis"] else ""
-        if emoji_str:
-            emoji_str = f" {emoji_str} "
-        
-        # Always use the channel title with a link
-        if channel["username"]:
-            channel_link = f"[{channel['title']}](https://t.me/{channel['username']})"
-        else:
-            channel_link = f"[{channel['title']}](https://t.me/{channel['id'].replace('@', '')})"
-        
-        message_text += f"{idx}. {emoji_str}{channel_link}\n"
+    # Render each selected channel's list line once; per-target captions are joined from these
+    selected_fragments = [(str(c["id"]), get_channel_fragment(c)) for c in selected_channels]
+    selected_ids = {channel_id for channel_id, _ in selected_fragments}
     
-    # Add the CTA button
-    bot_info = bot.get_me()
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton(config.CTA_BUTTON_TEXT, url=f"https://t.me/{bot_info.username}"))
+    # Every target outside the selection gets the same full list
+    shared_caption = render_caption(caption_prefix, [fragment for _, fragment in selected_fragments])
     
-    # Choose the appropriate icon based on content type
-    if is_sfw:
-        icon_path = "generated-icon.png"  # Default icon for SFW
-    else:
-        # Check if a NSFW-specific icon exists, otherwise fall back to default
-        nsfw_icon_path = "nsfw-icon.png"
-        icon_path = nsfw_icon_path if os.path.exists(nsfw_icon_path) else "generated-icon.png"
+    icon_path = get_icon_path(is_sfw)
+    targets = []
     
-    # Log the crosspost details
-    logger.info(f"Preparing {type_tag} crosspost for {len(selected_channels)} channels")
-    
-    # Send to each channel in the group
     for target_channel in channels:
         # Only send to channels of the same type (SFW->SFW, NSFW->NSFW)
         if target_channel["is_sfw"] != is_sfw:
             logger.warning(f"Skipping channel {target_channel['id']} - content type mismatch")
             continue
         
-        # Create a custom message for each channel that excludes itself from the list
-        custom_selected_channels = [ch for ch in selected_channels if ch["id"] != target_channel["id"]]
+        target_id = str(target_channel["id"])
+        if target_id in selected_ids:
+            # Selected channels get a list that excludes themselves
+            custom_fragments = [fragment for channel_id, fragment in selected_fragments if channel_id != target_id]
+            
+            if not custom_fragments:
+                logger.warning(f"No other channels to promote to {target_channel['id']}, skipping")
+                continue
+            
+            caption = render_caption(caption_prefix, custom_fragments)
+        else:
+            caption = shared_caption
+        
+        targets.append({
+            "channel_id": target_id,
+            "caption": caption,
+            "subscribers": target_channel.get("subscribers", 0)
+        })
+    
+    # Log the crosspost details
+    logger.info(f"Prepared {type_tag} crosspost of {len(selected_channels)} channels for {len(targets)} targets")
+    
+    return {
+        "is_sfw": is_sfw,
+        "type_tag": type_tag,
+        "image_path": icon_path,
+        "file_id": warm_image_cache(icon_path),
+        "targets": targets
+    }
+
+def get_daily_run_id(post_time: str) -> str:
+    """Get the outbox run ID of the scheduled crosspost for post_time."""
+    return f"daily-{post_time}"
+
+def _build_cta_keyboard(cta_url: str) -> InlineKeyboardMarkup:
+    """Build the call-to-action keyboard attached to every crosspost."""
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton(config.CTA_BUTTON_TEXT, url=cta_url))
+    return keyboard
+
+def send_crosspost_message(bot, delivery: Dict, keyboard: InlineKeyboardMarkup, file_id: Optional[str]):
+    """Send the crosspost message of one delivery, without recording anything.
+    
+    Args:
+        bot: The bot to send with
+        delivery: The delivery row from the outbox
+        keyboard: The CTA keyboard of its run
+        file_id: The file_id of the delivery's image, if it was uploaded before
+    
+    Returns:
+        The sent message
+    """
+    if file_id:
+        # Reuse the already uploaded image
+        return bot.send_photo(
+            chat_id=delivery["channel_id"],
+            photo=file_id,
+            caption=delivery["caption"],
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
+    
+    if os.path.exists(delivery["image_path"]):
+        # Send message with image
+        with open(delivery["image_path"], 'rb') as photo:
+            return bot.send_photo(
+                chat_id=delivery["channel_id"],
+                photo=photo,
+                caption=delivery["caption"],
+                parse_mode="Markdown",
+                reply_markup=keyboard
+            )
+    
+    # Fallback to text-only message if image doesn't exist
+    return bot.send_message(
+        chat_id=delivery["channel_id"],
+        text=delivery["caption"],
+        parse_mode="Markdown",
+        reply_markup=keyboard,
+        disable_web_page_preview=True
+    )
+
+def get_delivery_file_id(delivery: Dict, sender_id: str) -> Optional[str]:
+    """Get the file_id a sender can use for a delivery's image, if it has one."""
+    file_id = get_cached_file_id(delivery["image_path"], sender_id)
+    if file_id is None and sender_id == senders.PRIMARY_SENDER:
+        # The image may have been replaced since planning, in which case the planned file_id is stale
+        file_id = delivery["file_id"]
+    return file_id
+
+def _send_delivery(delivery: Dict, keyboard: InlineKeyboardMarkup, file_ids: Dict[tuple, Optional[str]]):
+    """Send one outbox delivery from the channel's sender bot and record the result.
+    
+    Args:
+        delivery: The delivery row from the outbox
+        keyboard: The CTA keyboard of its run
+        file_ids: Known file_ids by sender and image path, updated when the image gets uploaded
+    
+    Returns:
+        The sent message, or None if the delivery was withdrawn, e.g. because its run was cancelled
+    """
+    sender_id = senders.get_channel_sender(delivery["channel_id"])
+    icon_path = delivery["image_path"]
+    if (sender_id, icon_path) not in file_ids:
+        file_ids[sender_id, icon_path] = get_delivery_file_id(delivery, sender_id)
+    file_id = file_ids[sender_id, icon_path]
+    
+    if not outbox.mark_sending(delivery["idempotency_key"]):
+        return None
+    senders.get_sender_limiter(sender_id).acquire()
+    message = send_crosspost_message(get_sender_bot_instance(sender_id), delivery, keyboard, file_id)
+    if not file_id and getattr(message, "photo", None):
+        # Keep the uploaded image's file_id for the sender's remaining targets
+        file_ids[sender_id, icon_path] = message.photo[-1].file_id
+        remember_file_id(icon_path, file_ids[sender_id, icon_path], sender_id)
+    
+    outbox.mark_sent(delivery["idempotency_key"], message.message_id)
+    breaker.record_success(delivery["channel_id"])
+    return message
+
+def _fail_run(delivery: Dict, error: Exception):
+    """Stop the run of a delivery Telegram rejected for its content, and tell the admins.
+    
+    The other channels would reject the same post, so the run's unsent
+    deliveries are dead-lettered with the error and the run is not resumed.
+    """
+    reason = f"post rejected by Telegram: {error}"
+    outbox.mark_failed(delivery["idempotency_key"], reason)
+    dropped = outbox.fail_run(delivery["run_id"], reason)
+    if dropped is None:
+        # Another send of the run was rejected first and already reported it
+        return
+    logger.error(
+        f"Crosspost to channel {delivery['channel_id']} was rejected for its content, "
+        f"stopped run {delivery['run_id']} and dead-lettered {dropped + 1} deliveries: {error}"
+    )
+    
+    # Plain text, since the error is about Markdown that didn't parse
+    bot = get_bot_instance()
+    for admin_id in config.ADMIN_IDS:
+        try:
+            bot.send_message(
+                admin_id,
+                f"⚠️ Telegram rejected crosspost run {delivery['run_id']} for its content, so it was stopped: "
+                f"{error}\n\nIts unsent deliveries were moved to the dead letters."
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify admin {admin_id} of the stopped crosspost run: {e}")
+
+def _record_send_failure(delivery: Dict, error: Exception, deadline: Optional[datetime]):
+    """Schedule a retry for a transient send failure, or dead-letter a permanent one.
+    
+    Raises:
+        ContentError: If Telegram rejected the post itself; its whole run is
+            stopped, rather than failing every channel in turn
+    """
+    if is_content_error(error):
+        _fail_run(delivery, error)
+        raise ContentError(str(error)) from error
+    
+    attempts = delivery["attempts"] + 1
+    breaker.record_failure(delivery["channel_id"], error)
+    
+    if is_permanent_error(error):
+        reason = "permanent error"
+        # The sender bot may have lost its rights there; the primary bot takes over from the next run
+        senders.unassign_sender(delivery["channel_id"])
+    elif attempts >= config.CROSSPOST_MAX_SEND_ATTEMPTS:
+        reason = f"gave up after {attempts} attempts"
+    else:
+        # Exponential backoff, but never sooner than Telegram asked us to wait
+        delay = min(config.CROSSPOST_RETRY_BASE_SECONDS * 2 ** (attempts - 1), config.CROSSPOST_RETRY_MAX_SECONDS)
+        delay = max(delay, get_retry_after(error) or 0)
         
-        if not custom_selected_channels:
-            logger.warning(f"No other channels to promote to {target_channel['id']}, skipping")
+        if deadline and datetime.now(deadline.tzinfo) + timedelta(seconds=delay) > deadline:
+            reason = "delivery window closed"
+        else:
+            outbox.mark_failed(delivery["idempotency_key"], str(error), datetime.now() + timedelta(seconds=delay))
+            logger.warning(
+                f"Failed to send crosspost to channel {delivery['channel_id']}, "
+                f"retrying in {delay}s (attempt {attempts}): {error}"
+            )
+            return
+    
+    outbox.mark_failed(delivery["idempotency_key"], str(error))
+    logger.error(f"Failed to send crosspost to channel {delivery['channel_id']} ({reason}), dead-lettered: {error}")
+
+def _prepare_run_delivery(run_id: str) -> Optional[Tuple[List[Dict], InlineKeyboardMarkup, DeliveryPacer, datetime]]:
+    """Start delivering an outbox run and get the deliveries that should be sent.
+    
+    Args:
+        run_id: ID of the run in the outbox
+    
+    Returns:
+        The deliveries to send, the run's CTA keyboard, the pacer to space the
+        sends with and their projected completion, or None if the run does not exist
+    """
+    run = outbox.get_run(run_id)
+    if run is None:
+        logger.error(f"Crosspost run {run_id} not found in the outbox")
+        return None
+    
+    outbox.start_run(run_id)
+    deadline = datetime.fromisoformat(run["deadline"]) if run["deadline"] else None
+    
+    # Dead-letter channels that keep failing up front, instead of waiting for their errors
+    deliveries = []
+    for delivery in outbox.get_pending_deliveries(run_id):
+        if breaker.allow_request(delivery["channel_id"]):
+            deliveries.append(delivery)
+        else:
+            outbox.mark_failed(delivery["idempotency_key"], "circuit breaker open")
+            logger.warning(f"Skipping channel {delivery['channel_id']}, circuit breaker is open")
+    
+    # Each sender also waits for its own limiter, so this only caps the combined rate
+    pacer = DeliveryPacer(len(deliveries), deadline, RateLimiter(senders.get_total_send_rate()))
+    projected_completion = pacer.projected_completion()
+    logger.info(
+        f"Delivering crosspost run {run_id} to {len(deliveries)} channels ({pacer.mode} mode), "
+        f"projected completion at {projected_completion.strftime('%H:%M:%S')}"
+    )
+    if deadline and projected_completion > deadline:
+        logger.warning(f"Crosspost delivery will overrun the window ending at {deadline.strftime('%H:%M:%S')}")
+    
+    return deliveries, _build_cta_keyboard(run["cta_url"]), pacer, projected_completion
+
+def _finish_run_delivery(run_id: str, total: int, sent_count: int, pacer: DeliveryPacer,
+                         projected_completion: datetime) -> Dict:
+    """Mark an outbox run as delivered and summarize how it went."""
+    outbox.finish_run(run_id)
+    logger.info(f"Completed crosspost run {run_id}: {sent_count}/{total} sent")
+    return {
+        "run_id": run_id,
+        "total": total,
+        "sent": sent_count,
+        "mode": pacer.mode,
+        "projected_completion": projected_completion.isoformat()
+    }
+
+def deliver_crosspost_run(run_id: str) -> Dict:
+    """Send all pending deliveries of an outbox run.
+    
+    Deliveries go out in order of audience size, largest first, across both
+    groups. Without a deadline they go out as fast as the rate limit allows;
+    with one they are spread out to finish just before it. Every delivery's
+    state is written to the outbox as it happens, so an interrupted run can
+    be resumed without sending anything twice. Failed sends are left to
+    retry_due_deliveries, so they never hold up the first pass.
+    
+    Args:
+        run_id: ID of the run in the outbox
+    
+    Returns:
+        A summary with the number of sends and the projected completion time
+    
+    Raises:
+        ContentError: If Telegram rejected the post itself. The run is
+            marked failed and its unsent deliveries are dead-lettered
+    """
+    if config.CROSSPOST_ENGINE == ENGINE_ASYNC:
+        # Import here so that aiohttp is only needed when the async engine is used
+        from utils import async_crosspost
+        return async_crosspost.deliver_crosspost_run(run_id)
+    
+    prepared = _prepare_run_delivery(run_id)
+    if prepared is None:
+        return {}
+    deliveries, keyboard, pacer, projected_completion = prepared
+    
+    if config.CROSSPOST_ENGINE == ENGINE_PROCESS and len(deliveries) >= config.CROSSPOST_SHARD_MIN_DELIVERIES:
+        # Import here to avoid circular imports
+        from utils import sharding
+        sent_count = sharding.deliver_in_shards(deliveries, keyboard, pacer)
+        return _finish_run_delivery(run_id, len(deliveries), sent_count, pacer, projected_completion)
+    
+    file_ids = {}
+    sent_count = 0
+    for delivery in deliveries:
+        pacer.wait()
+        try:
+            if _send_delivery(delivery, keyboard, file_ids) is None:
+                continue
+            sent_count += 1
+            logger.info(f"Sent {delivery['type_tag']} crosspost to channel {delivery['channel_id']} (excluding itself from list)")
+        except Exception as e:
+            _record_send_failure(delivery, e, pacer.deadline)
+        pacer.record_send()
+    
+    return _finish_run_delivery(run_id, len(deliveries), sent_count, pacer, projected_completion)
+
+def retry_due_deliveries():
+    """Retry the failed crosspost sends whose backoff has elapsed.
+    
+    This runs as its own periodic job, next to any first pass in progress;
+    both share the send rate limit.
+    """
+    deliveries = outbox.get_due_retries(datetime.now())
+    if not deliveries:
+        return
+    
+    logger.info(f"Retrying {len(deliveries)} failed crosspost sends")
+    keyboards = {}
+    file_ids = {}
+    
+    for delivery in deliveries:
+        deadline = datetime.fromisoformat(delivery["deadline"]) if delivery["deadline"] else None
+        if delivery["cta_url"] not in keyboards:
+            keyboards[delivery["cta_url"]] = _build_cta_keyboard(delivery["cta_url"])
+        
+        if not breaker.allow_request(delivery["channel_id"]):
+            outbox.mark_failed(delivery["idempotency_key"], "circuit breaker open")
             continue
-            
-        # Recreate the message text for this specific channel (without itself)
-        custom_message_text = f"{header}\n\n"
-        custom_message_text += f"#{type_tag}\n\n"
         
-        # Add each channel (except the current one) to the message
-        for idx, channel in enumerate(custom_selected_channels, 1):
-            # Format channel with emojis
-            emoji_str = " ".join(channel["emojis"]) if channel["emojis"] else ""
-            if emoji_str:
-                emoji_str = f" {emoji_str} "
-            
-            # Always use the channel title with a link
-            if channel["username"]:
-                channel_link = f"[{channel['title']}](https://t.me/{channel['username']})"
-            else:
-                channel_link = f"[{channel['title']}](https://t.me/{channel['id'].replace('@', '')})"
-            
-            custom_message_text += f"{idx}. {emoji_str}{channel_link}\n"
-            
         try:
-            # Check if the icon exists
-            if os.path.exists(icon_path):
-                # Send message with image
-                with open(icon_path, 'rb') as photo:
-                    bot.send_photo(
-                        chat_id=target_channel["id"],
-                        photo=photo,
-                        caption=custom_message_text,
-                        parse_mode="Markdown",
-                        reply_markup=keyboard
-                    )
-            else:
-                # Fallback to text-only message if image doesn't exist
-                bot.send_message(
-                    chat_id=target_channel["id"],
-                    text=custom_message_text,
-                    parse_mode="Markdown",
-                    reply_markup=keyboard,
-                    disable_web_page_preview=True
-                )
-            logger.info(f"Sent {type_tag} crosspost to channel {target_channel['id']} (excluding itself from list)")
+            if _send_delivery(delivery, keyboards[delivery["cta_url"]], file_ids) is not None:
+                logger.info(f"Sent crosspost to channel {delivery['channel_id']} on retry")
         except Exception as e:
-            logger.error(f"Failed to send crosspost to channel {target_channel['id']}: {e}")
+            try:
+                _record_send_failure(delivery, e, deadline)
+            except ContentError:
+                # Only that delivery's run is stopped; the other retries are still due
+                continue
+
+def resume_interrupted_crossposts() -> bool:
+    """Finish any crosspost run that was interrupted mid-delivery, e.g. by a restart.
+    
+    Returns:
+        True if at least one run was resumed
+    """
+    run_ids = outbox.get_runs_by_status(outbox.RUN_RUNNING)
+    for run_id in run_ids:
+        logger.info(f"Resuming interrupted crosspost run {run_id}")
+        deliver_crosspost_run(run_id)
+    return bool(run_ids)
+
+def create_and_send_crosspost(active_channels: List[str], deadline: Optional[datetime] = None,
+                              on_run: Optional[Callable[[str], None]] = None, cooldown: float = 0) -> Optional[str]:
+    """Create and send a crosspost message to all active channels.
+    
+    If an earlier run was interrupted, that run is finished instead, with its
+    original selection and without re-sending to channels that already got it.
+    If a crosspost is already being sent on any instance, this waits for it
+    and returns its result instead of sending a second one.
+    
+    Args:
+        active_channels: IDs of the channels taking part
+        deadline: When the sends should be done by, if they should be spread out
+        on_run: Called with the ID of the new run before its delivery starts
+        cooldown: Return the result of a crosspost that finished at most this many seconds ago
+    
+    Returns:
+        The ID of the run, or None if no new run was made
+    """
+    return singleflight.run(OPERATION_CROSSPOST, _create_and_send_crosspost, active_channels, deadline, on_run,
+                            cooldown=cooldown)
+
+def _create_and_send_crosspost(active_channels: List[str], deadline: Optional[datetime],
+                               on_run: Optional[Callable[[str], None]]) -> Optional[str]:
+    """Plan a manual crosspost for the given channels and deliver it."""
+    if resume_interrupted_crossposts():
+        return None
+    
+    plan = build_crosspost_plan(active_channels)
+    if plan is None:
+        return None
+    
+    run_id = f"manual-{plan['created_at']}"
+    outbox.create_run(run_id, plan, deadline.isoformat() if deadline else None)
+    if on_run:
+        on_run(run_id)
+    deliver_crosspost_run(run_id)
+    return run_id
+
+def get_catchup_deadline(post_time: str, deadline: Optional[str]) -> Optional[str]:
+    """Get the deadline for a scheduled crosspost that may be starting late.
     
-    logger.info(f"Completed crosspost for {type_tag} group")
+    A crosspost caught up on after a restart is squeezed into a short window
+    instead of being dropped. A burst crosspost stays a burst, and a window
+    crosspost keeps its own deadline while enough of its window is left.
+    
+    Args:
+        post_time: ISO timestamp the crosspost was due to start at
+        deadline: ISO timestamp of the end of its delivery window, if any
+    
+    Returns:
+        The deadline to deliver by, as an ISO timestamp
+    """
+    start = datetime.fromisoformat(post_time)
+    now = datetime.now(start.tzinfo)
+    if deadline is None or now - start < timedelta(minutes=1):
+        return deadline
+    
+    compressed = now + timedelta(minutes=config.CROSSPOST_CATCHUP_WINDOW_MINUTES)
+    if datetime.fromisoformat(deadline) < compressed:
+        logger.info(f"Crosspost for {post_time} is starting late, delivering it by {compressed.strftime('%H:%M')}")
+        return compressed.isoformat()
+    return deadline
+
+def get_slot_channels(post_time: str, groups: Optional[List[str]] = None) -> List[str]:
+    """Get the channels taking part in a posting slot, as the schedule stands right now.
+    
+    Args:
+        post_time: ISO timestamp of the slot
+        groups: The channel groups posted in the slot, all of them if not given
+    
+    Returns:
+        The IDs of the active channels of the slot's groups on the slot's day
+    """
+    day = datetime.fromisoformat(post_time).weekday()
+    if groups is None or {GROUP_SFW, GROUP_NSFW} <= set(groups):
+        return storage.get_channels_for_day(day)
+    return [
+        channel_id for group in groups
+        for channel_id in storage.get_channels_for_day(day, is_sfw=group == GROUP_SFW)
+    ]
+
+def _is_plan_current(run: Dict, active_channels: List[str]) -> bool:
+    """Check whether a planned run still covers exactly the channels taking part."""
+    covered = set(outbox.get_run_channel_ids(run["run_id"])) | set(run["excluded"])
+    return covered == set(active_channels)
+
+def send_planned_crosspost(post_time: str, deadline: Optional[str] = None,
+                           groups: Optional[List[str]] = None) -> Optional[str]:
+    """Send the crosspost planned ahead of time for post_time.
+    
+    The channels taking part are resolved now, so channels approved, removed
+    or rescheduled after the plan was made are accounted for: a plan that no
+    longer matches them is made again, as it is when no plan was saved, e.g.
+    because the planning job failed. A crosspost that starts late, e.g.
+    caught up on after a restart, is delivered in a compressed window.
+    
+    Args:
+        post_time: ISO timestamp of the slot the plan was made for
+        deadline: ISO timestamp of the end of the delivery window, if the sends should be spread out
+        groups: The channel groups posted in the slot, all of them if not given
+    
+    Returns:
+        The ID of the slot's run, or None if there was nothing to send
+    """
+    # Wait for a crosspost in flight, e.g. a manual one, instead of racing it,
+    # but send this slot's own crosspost afterwards
+    return singleflight.run(OPERATION_CROSSPOST, _send_planned_crosspost, post_time, deadline, groups, join=False)
+
+def _send_planned_crosspost(post_time: str, deadline: Optional[str], groups: Optional[List[str]]) -> Optional[str]:
+    """Deliver a slot's run, planning it (again) if needed."""
+    run_id = get_daily_run_id(post_time)
+    run = outbox.get_run(run_id)
+    deadline = get_catchup_deadline(post_time, deadline)
+    if run is not None and run["status"] == outbox.RUN_DONE:
+        logger.info(f"Crosspost run {run_id} was already delivered")
+        return run_id
+    if run is not None and run["status"] == outbox.RUN_FAILED:
+        logger.warning(f"Crosspost run {run_id} was stopped after Telegram rejected its post, not sending it again")
+        return run_id
+    
+    active_channels = get_slot_channels(post_time, groups)
+    if run is None:
+        logger.warning(f"No saved plan for {post_time}, planning crosspost now")
+    elif run["status"] == outbox.RUN_PLANNED and not _is_plan_current(run, active_channels):
+        logger.info(f"Channels of the crosspost for {post_time} changed since it was planned, planning it again")
+        # Whatever happens to the new plan, channels that left the slot aren't sent to
+        removed = set(outbox.get_run_channel_ids(run_id)) - set(active_channels)
+        outbox.drop_pending_deliveries(run_id, {channel_id: "no longer scheduled" for channel_id in removed})
+        run = None
+    
+    if run is None:
+        _plan_slot(active_channels, post_time, deadline)
+        run = outbox.get_run(run_id)
+        if run is None:
+            return None
+    elif run["deadline"] != deadline:
+        outbox.set_run_deadline(run_id, deadline)
+    
+    logger.info(f"Sending crosspost planned at {run['created_at']}")
+    deliver_crosspost_run(run_id)
+    return run_id
+
+def plan_crosspost(post_time: str, deadline: Optional[str] = None, groups: Optional[List[str]] = None):
+    """Build the plan for a scheduled crosspost and queue it in the outbox.
+    
+    Args:
+        post_time: ISO timestamp of the slot to plan
+        deadline: ISO timestamp of the end of the delivery window, if the sends should be spread out
+        groups: The channel groups posted in the slot, all of them if not given
+    """
+    _plan_slot(get_slot_channels(post_time, groups), post_time, deadline)
+
+def _plan_slot(active_channels: List[str], post_time: str, deadline: Optional[str]):
+    """Plan a slot's crosspost for the given channels and queue it in the outbox."""
+    plan = build_crosspost_plan(active_channels, datetime.fromisoformat(post_time))
+    if plan is None:
+        return
+    if outbox.create_run(get_daily_run_id(post_time), plan, deadline):
+        logger.info(f"Queued crosspost plan for {post_time}")
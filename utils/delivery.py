@@ -0,0 +1,109 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from datetime import time as time_of_day
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+import config
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+KYIV_TIMEZONE_PYTZ = pytz.timezone('Europe/Kiev')
+
+DELIVERY_MODE_BURST = "burst"
+DELIVERY_MODE_WINDOW = "window"
+
+# Channel groups that can have posting slots of their own
+GROUP_SFW = "sfw"
+GROUP_NSFW = "nsfw"
+
+def get_daily_slots() -> Dict[time_of_day, List[str]]:
+    """Get the daily posting slots, with the channel groups posted in each.
+    
+    Returns:
+        The groups posted in each slot, by slot time, earliest slot first
+    """
+    slots = {}
+    for group, times in config.CROSSPOST_GROUP_SLOTS.items():
+        for slot in times:
+            slots.setdefault(slot, []).append(group)
+    return dict(sorted(slots.items()))
+
+def get_delivery_window(day: datetime, slot: time_of_day) -> Tuple[datetime, datetime]:
+    """Get the start and end of the delivery window of a slot on a day.
+    
+    The window ends at the slot and is as long as the configured window from
+    CROSSPOST_START_TIME to CROSSPOST_END_TIME.
+    
+    Args:
+        day: Any datetime on the day in question
+        slot: The slot's time
+        
+    Returns:
+        The window's (start, end) as Kyiv-localized datetimes
+    """
+    length = (datetime.combine(day.date(), config.CROSSPOST_END_TIME)
+              - datetime.combine(day.date(), config.CROSSPOST_START_TIME))
+    end = KYIV_TIMEZONE_PYTZ.localize(datetime.combine(day.date(), slot))
+    return end - length, end
+
+class DeliveryPacer:
+    """Spaces out the sends of one delivery.
+    
+    Without a deadline every send goes out as soon as the rate limit allows
+    (burst). With a deadline the remaining sends are spread evenly over the
+    time left, recomputed before every send so that slow requests don't push
+    the delivery past the end of its window.
+    """
+    
+    def __init__(self, total: int, deadline: Optional[datetime] = None,
+                 limiter: Optional[RateLimiter] = None):
+        """Create a pacer for `total` sends that should finish by `deadline`."""
+        self.total = total
+        self.deadline = deadline
+        self.limiter = limiter or RateLimiter(config.CROSSPOST_MAX_SENDS_PER_SECOND)
+        self._sent = 0
+        self._last_send = None
+    
+    @property
+    def mode(self) -> str:
+        """The delivery mode this pacer works in."""
+        return DELIVERY_MODE_WINDOW if self.deadline else DELIVERY_MODE_BURST
+    
+    def projected_completion(self) -> datetime:
+        """Estimate when the last send will go out."""
+        now = datetime.now(KYIV_TIMEZONE_PYTZ)
+        remaining = self.total - self._sent
+        fastest = now + timedelta(seconds=max(remaining - 1, 0) * self.limiter.interval)
+        
+        if self.deadline and self.deadline > fastest:
+            # The last send is spaced one gap before the deadline
+            gap = (self.deadline - now) / (remaining + 1) if remaining else timedelta(0)
+            return self.deadline - gap
+        return fastest
+    
+    def next_delay(self) -> float:
+        """Get the number of seconds until the next send is due, not counting the rate limit."""
+        if not self.deadline or self._last_send is None:
+            return 0.0
+        
+        remaining = self.total - self._sent
+        time_left = (self.deadline - self._last_send).total_seconds()
+        due = self._last_send + timedelta(seconds=time_left / (remaining + 1))
+        return max((due - datetime.now(KYIV_TIMEZONE_PYTZ)).total_seconds(), 0.0)
+    
+    def wait(self):
+        """Block until the next send is due."""
+        delay = self.next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        
+        self.limiter.acquire()
+    
+    def record_send(self):
+        """Note that a send has just gone out."""
+        self._sent += 1
+        self._last_send = datetime.now(KYIV_TIMEZONE_PYTZ)
@@ -0,0 +1,67 @@
+from typing import Optional
+
+from telebot.apihelper import ApiTelegramException
+
+try:
+    from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+    _API_ERRORS = (ApiTelegramException, AsyncApiTelegramException)
+except ImportError:
+    # aiohttp is only installed where the async engine is used
+    _API_ERRORS = (ApiTelegramException,)
+
+# Bad requests that are about the channel, not the message
+_CHANNEL_ERRORS = (
+    "chat not found",
+    "not enough rights",
+    "have no rights",
+    "need administrator rights",
+    "bot was kicked",
+    "bot was blocked",
+    "bot is not a member",
+)
+
+# Bad requests caused by the message itself, which every channel rejects alike
+_CONTENT_ERRORS = (
+    "can't parse entities",
+    "caption is too long",
+    "message is too long",
+)
+
+class ContentError(Exception):
+    """Raised when Telegram rejects a crosspost for its own content, so sending it to other channels is pointless."""
+
+def _get_description(error: Exception) -> str:
+    return (getattr(error, "description", None) or "").lower()
+
+def is_permanent_error(error: Exception) -> bool:
+    """Check whether a failed Telegram request will keep failing for this channel if retried.
+    
+    Forbidden errors (bot kicked or blocked) and bad requests about the
+    channel (chat not found, lacking rights) are permanent. Bad requests
+    about the message, like an unparseable caption, are our own bug and not
+    the channel's; they, flood waits, server errors, timeouts, connection
+    problems and anything unrecognised don't count as permanent.
+    
+    Args:
+        error: The exception raised by the request
+        
+    Returns:
+        True if retrying the request is pointless
+    """
+    if not isinstance(error, _API_ERRORS):
+        return False
+    if error.error_code == 403:
+        return True
+    return error.error_code == 400 and any(text in _get_description(error) for text in _CHANNEL_ERRORS)
+
+def is_content_error(error: Exception) -> bool:
+    """Check whether a failed Telegram request was rejected for the message it sent, e.g. broken Markdown."""
+    if not isinstance(error, _API_ERRORS) or error.error_code != 400:
+        return False
+    return any(text in _get_description(error) for text in _CONTENT_ERRORS)
+
+def get_retry_after(error: Exception) -> Optional[int]:
+    """Get the number of seconds Telegram asked us to wait, for flood wait errors."""
+    if isinstance(error, _API_ERRORS) and isinstance(error.result_json, dict):
+        return error.result_json.get("parameters", {}).get("retry_after")
+    return None
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import config
+from utils import jobs, storage
+
+logger = logging.getLogger(__name__)
+
+# Events sent to the dashboard
+EVENT_STATS = "stats"
+EVENT_PENDING = "pending"
+EVENT_JOB = "job"
+
+# Events a slow client can fall behind by; older ones are dropped, as later ones supersede them
+CLIENT_QUEUE_SIZE = 100
+
+# How long a client waits before reconnecting after the stream broke
+RECONNECT_MILLISECONDS = 5000
+
+_lock = threading.Lock()
+_subscribers = {}
+_next_token = 0
+_watcher = None
+_server_thread = None
+
+def format_event(event: str, data: Dict) -> str:
+    """Format an event in the text/event-stream format."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def _get_stats_events() -> List[str]:
+    """Get the events with the current network statistics and pending count."""
+    stats = dict(storage.get_network_stats())
+    stats["scope"] = "network"
+    stats["timestamp"] = datetime.now().isoformat()
+    stats["generation"] = storage.get_generation()
+    return [
+        format_event(EVENT_STATS, stats),
+        format_event(EVENT_PENDING, {"count": stats["pending_applications"]})
+    ]
+
+def subscribe(deliver: Callable[[str], None]) -> int:
+    """Start getting events.
+    
+    The current statistics are delivered right away, and every change after
+    that. `deliver` is called from the watcher thread and must not block; if it
+    raises, the subscriber is dropped.
+    
+    Args:
+        deliver: Called with every formatted event
+    
+    Returns:
+        The token to unsubscribe with
+    """
+    global _next_token, _watcher
+    for message in _get_stats_events():
+        deliver(message)
+    
+    with _lock:
+        _next_token += 1
+        token = _next_token
+        _subscribers[token] = deliver
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(target=_watch, name="events-watcher", daemon=True)
+            _watcher.start()
+    return token
+
+def unsubscribe(token: int):
+    """Stop getting events."""
+    with _lock:
+        _subscribers.pop(token, None)
+
+def get_subscriber_count() -> int:
+    """Get the number of clients getting events."""
+    with _lock:
+        return len(_subscribers)
+
+def _publish(message: str):
+    """Deliver an event to every subscriber."""
+    with _lock:
+        subscribers = list(_subscribers.items())
+    for token, deliver in subscribers:
+        try:
+            deliver(message)
+        except Exception as e:
+            logger.debug(f"Dropping event subscriber {token}: {e}")
+            unsubscribe(token)
+
+def _watch():
+    """Pick up changes to the channel data and jobs, and publish them.
+    
+    One watcher serves all clients, so the cost of a check doesn't grow with
+    the number of open dashboards. Nothing is checked while nobody listens.
+    """
+    generation = None
+    pending_event = None
+    since = datetime.now().isoformat()
+    job_states = {}
+    
+    while True:
+        time.sleep(config.EVENTS_POLL_SECONDS)
+        if not get_subscriber_count():
+            generation = pending_event = None
+            continue
+        
+        try:
+            current_generation = storage.get_generation()
+            if current_generation != generation:
+                generation = current_generation
+                stats_event, current_pending_event = _get_stats_events()
+                _publish(stats_event)
+                if current_pending_event != pending_event:
+                    pending_event = current_pending_event
+                    _publish(pending_event)
+            
+            # Jobs that are running or changed since the last check; a crosspost
+            # job's progress comes from its deliveries, so compare what's shown
+            now = datetime.now().isoformat()
+            live_jobs = jobs.get_jobs_since(since)
+            since = now
+            for job in live_jobs:
+                state = (job["status"], job["done"], job["total"], job.get("delivery_counts"))
+                if job_states.get(job["job_id"]) != state:
+                    job_states[job["job_id"]] = state
+                    _publish(format_event(EVENT_JOB, job))
+            job_states = {job["job_id"]: job_states[job["job_id"]] for job in live_jobs}
+        except Exception as e:
+            logger.error(f"Error checking for dashboard updates: {e}")
+
+def iter_events() -> Iterator[str]:
+    """Stream events from the calling thread.
+    
+    This holds a thread for as long as the client stays connected, so it's
+    only for servers that give every request its own thread, like Flask's
+    development server. Under uWSGI, the events server streams them instead.
+    
+    Yields:
+        Formatted events, with a keep-alive comment when there are none
+    """
+    messages = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    
+    def deliver(message: str):
+        while True:
+            try:
+                messages.put_nowait(message)
+                return
+            except queue.Full:
+                messages.get_nowait()
+    
+    token = subscribe(deliver)
+    try:
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        while True:
+            try:
+                yield messages.get(timeout=config.EVENTS_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+    finally:
+        unsubscribe(token)
+
+def _offer(messages: asyncio.Queue, message: str):
+    """Queue an event for a client, dropping its oldest one if it has fallen behind."""
+    if messages.full():
+        messages.get_nowait()
+    messages.put_nowait(message)
+
+def _respond(writer: asyncio.StreamWriter, status: str, headers: Optional[Dict] = None, body: str = ""):
+    lines = [f"HTTP/1.1 {status}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n" + body).encode())
+
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         check_auth: Callable[[Optional[str]], bool]):
+    """Answer one request to the events server, streaming events until the client leaves."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, _, target = request_line.partition(" ")
+    path = target.split(" ")[0].split("?")[0]
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    
+    if method != "GET" or path != "/api/events":
+        _respond(writer, "404 Not Found")
+    elif not check_auth(headers.get("authorization")):
+        _respond(writer, "401 Unauthorized", {"WWW-Authenticate": 'Basic realm="Login Required"'})
+    elif get_subscriber_count() >= config.EVENTS_MAX_CLIENTS:
+        _respond(writer, "503 Service Unavailable", {"Retry-After": "60"})
+    else:
+        await _stream(reader, writer)
+        return
+    
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+async def _stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Stream events to a client until it disconnects."""
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    
+    def deliver(message: str):
+        loop.call_soon_threadsafe(_offer, messages, message)
+    
+    _respond(writer, "200 OK", {
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }, f"retry: {RECONNECT_MILLISECONDS}\n\n")
+    
+    # Getting the current statistics reads storage, so keep it off the event loop
+    token = await loop.run_in_executor(None, subscribe, deliver)
+    # The client sends nothing more, so a finished read means it went away
+    disconnected = asyncio.ensure_future(reader.read(1))
+    try:
+        while not disconnected.done():
+            next_message = asyncio.ensure_future(messages.get())
+            done, _ = await asyncio.wait({next_message, disconnected}, timeout=config.EVENTS_KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_message in done:
+                message = next_message.result()
+            else:
+                next_message.cancel()
+                message = ": keepalive\n\n"
+            writer.write(message.encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        disconnected.cancel()
+        unsubscribe(token)
+        writer.close()
+
+async def _serve(check_auth: Callable[[Optional[str]], bool]):
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_client(reader, writer, check_auth),
+        config.EVENTS_HOST, config.EVENTS_PORT
+    )
+    logger.info(f"Events server listening on {config.EVENTS_HOST}:{config.EVENTS_PORT}")
+    async with server:
+        await server.serve_forever()
+
+def _serve_forever(check_auth: Callable[[Optional[str]], bool]):
+    """Run the events server, retrying while another worker holds its port."""
+    while True:
+        try:
+            asyncio.run(_serve(check_auth))
+        except OSError as e:
+            logger.info(f"Events server port {config.EVENTS_PORT} is not available ({e}), retrying later")
+        except Exception as e:
+            logger.error(f"Events server stopped: {e}")
+        time.sleep(30)
+
+def start_server(check_auth: Callable[[Optional[str]], bool]):
+    """Start the server that streams live dashboard updates.
+    
+    All clients are served by one asyncio loop on a thread of its own, so
+    idle connections cost no threads. uWSGI routes /api/events to it (see
+    uwsgi.ini) and hands the connections to its offload threads. Of several
+    workers, the one that gets the port serves the events; the others keep
+    trying, in case it goes away. Starting again does nothing.
+    
+    Args:
+        check_auth: Called with a request's Authorization header, if any,
+            and returns whether the client may get the events
+    """
+    global _server_thread
+    with _lock:
+        if _server_thread is not None and _server_thread.is_alive():
+            return
+        _server_thread = threading.Thread(target=_serve_forever, args=(check_auth,), name="events-server",
+                                          daemon=True)
+        _server_thread.start()
@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import config
+from utils import outbox
+from utils.storage import ensure_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Kinds of jobs
+JOB_CROSSPOST = "crosspost"
+JOB_UPDATE_SUBSCRIBERS = "update_subscribers"
+
+# Progress is written at most this often, apart from the first and last update
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_by INTEGER,
+    owner TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    run_id TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+"""
+
+_executor = ThreadPoolExecutor(max_workers=config.JOB_WORKERS, thread_name_prefix="job")
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+class JobCancelled(Exception):
+    """Raised inside a job when it was asked to stop."""
+
+@contextmanager
+def _connect():
+    """Open a connection to the jobs database, committing on success."""
+    global _schema_ready
+    ensure_data_dir()
+    conn = sqlite3.connect(config.JOBS_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _fail_orphaned_jobs(conn)
+                _schema_ready = True
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+def _get_owner() -> str:
+    """Get the owner ID of the jobs run by this process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _fail_orphaned_jobs(conn: sqlite3.Connection):
+    """Fail the unfinished jobs of processes that are gone, e.g. a restarted worker."""
+    hostname = socket.gethostname()
+    rows = conn.execute(
+        "SELECT job_id, owner FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+    ).fetchall()
+    orphaned = []
+    for row in rows:
+        host, _, pid = row["owner"].rpartition(":")
+        if host == hostname and not _is_process_alive(int(pid)):
+            orphaned.append(row["job_id"])
+    
+    now = _now()
+    conn.executemany(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? WHERE job_id = ?",
+        [(JOB_FAILED, "worker process stopped", now, now, job_id) for job_id in orphaned]
+    )
+    if orphaned:
+        logger.warning(f"Marked {len(orphaned)} jobs of stopped worker processes as failed")
+
+def _update(job_id: str, **fields):
+    fields["updated_at"] = _now()
+    columns = ", ".join(f"{column} = ?" for column in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+class JobHandle:
+    """Lets a running job report its progress and notice that it was cancelled."""
+    
+    def __init__(self, job_id: str):
+        """Create the handle of the job `job_id`."""
+        self.job_id = job_id
+        self._last_flush = 0.0
+    
+    def is_cancelled(self) -> bool:
+        """Check whether the job was asked to stop."""
+        with _connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (self.job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+    
+    def set_progress(self, done: int, total: Optional[int] = None):
+        """Record how far the job has come.
+        
+        Updates are written at most once per PROGRESS_INTERVAL_SECONDS, apart
+        from the last one.
+        
+        Args:
+            done: Number of items done
+            total: Number of items in all, if known
+        
+        Raises:
+            JobCancelled: If the job was asked to stop
+        """
+        now = time.monotonic()
+        if now - self._last_flush < PROGRESS_INTERVAL_SECONDS and done != total:
+            return
+        self._last_flush = now
+        
+        fields = {"done": done}
+        if total is not None:
+            fields["total"] = total
+        _update(self.job_id, **fields)
+        if self.is_cancelled():
+            raise JobCancelled()
+    
+    def track_run(self, run_id: str):
+        """Take the job's progress from the deliveries of a crosspost run."""
+        _update(self.job_id, run_id=run_id)
+
+def _run_job(job_id: str, func: Callable, args: tuple, kwargs: Dict):
+    """Run a job in the worker pool and record how it went."""
+    handle = JobHandle(job_id)
+    if handle.is_cancelled():
+        return
+    _update(job_id, status=JOB_RUNNING, started_at=_now())
+    
+    try:
+        result = func(handle, *args, **kwargs)
+    except JobCancelled:
+        logger.info(f"Job {job_id} was cancelled")
+        _update(job_id, status=JOB_CANCELLED, finished_at=_now())
+        return
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        _update(job_id, status=JOB_FAILED, finished_at=_now(), error=str(e))
+        return
+    
+    status = JOB_CANCELLED if handle.is_cancelled() else JOB_DONE
+    _update(job_id, status=status, finished_at=_now(), result=json.dumps(result, ensure_ascii=False, default=str))
+    logger.info(f"Job {job_id} finished ({status})")
+
+def submit(kind: str, func: Callable, *args, created_by: Optional[int] = None, **kwargs) -> str:
+    """Queue an operation to run in the background.
+    
+    The job is persisted, so its state can be looked up from any worker,
+    and runs on a small thread pool of the process that queued it.
+    
+    Args:
+        kind: What kind of operation this is, e.g. "crosspost"
+        func: The operation; called with a JobHandle and the remaining arguments,
+            it returns a JSON-serializable result
+        created_by: User ID of whoever started the job, if known
+    
+    Returns:
+        The ID of the job
+    """
+    job_id = uuid.uuid4().hex
+    now = _now()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, kind, status, created_by, owner, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, JOB_QUEUED, created_by, _get_owner(), now, now)
+        )
+    _executor.submit(_run_job, job_id, func, args, kwargs)
+    logger.info(f"Queued {kind} job {job_id}")
+    return job_id
+
+def _to_dict(row: sqlite3.Row) -> Dict:
+    """Turn a job row into its API representation."""
+    job = dict(row)
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    
+    # A crosspost job's progress is the state of its run's deliveries
+    if job["run_id"]:
+        run = outbox.get_run(job["run_id"])
+        if run is not None:
+            counts = run["counts"]
+            job["total"] = sum(counts.values())
+            job["done"] = job["total"] - sum(
+                counts.get(state, 0) for state in
+                (outbox.DELIVERY_PENDING, outbox.DELIVERY_SENDING, outbox.DELIVERY_RETRY)
+            )
+            job["delivery_counts"] = counts
+    return job
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Get a job's state, progress and result."""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _to_dict(row) if row else None
+
+def get_recent_jobs(limit: int = 20) -> List[Dict]:
+    """Get the most recently queued jobs, newest first."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [_to_dict(row) for row in rows]
+
+def get_jobs_since(since: str) -> List[Dict]:
+    """Get the jobs that are still queued or running, or were updated after `since`.
+    
+    Args:
+        since: ISO timestamp
+    
+    Returns:
+        The jobs, oldest first
+    """
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status IN (?, ?) OR updated_at > ? ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING, since)
+        ).fetchall()
+    return [_to_dict(row) for row in rows]
+
+def cancel_job(job_id: str) -> bool:
+    """Ask a job to stop.
+    
+    A queued job never starts. A running job stops at its next progress
+    update; a crosspost job's remaining deliveries are withdrawn right away.
+    
+    Args:
+        job_id: ID of the job
+    
+    Returns:
+        True if the job was still queued or running
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT status, run_id FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row["status"] in FINISHED_STATES:
+            return False
+        
+        now = _now()
+        if row["status"] == JOB_QUEUED:
+            conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ?, updated_at = ? WHERE job_id = ?",
+                (JOB_CANCELLED, now, now, job_id)
+            )
+        else:
+            conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ?", (now, job_id))
+    
+    if row["run_id"]:
+        withdrawn = outbox.cancel_run(row["run_id"])
+        logger.info(f"Withdrew {withdrawn} deliveries of crosspost run {row['run_id']}")
+    logger.info(f"Cancellation of job {job_id} requested")
+    return True
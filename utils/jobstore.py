@@ -0,0 +1,137 @@
+import logging
+import pickle
+import sqlite3
+from contextlib import contextmanager
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+from utils.storage import ensure_data_dir
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    next_run_time REAL,
+    job_state BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_next_run_time ON jobs (next_run_time);
+"""
+
+class SQLiteJobStore(BaseJobStore):
+    """APScheduler job store that keeps jobs in a SQLite database.
+    
+    This works like APScheduler's SQLAlchemy job store, which we can't use
+    without adding SQLAlchemy as a dependency. Jobs survive restarts, so a
+    run that was due while the process was down is still found and can be
+    caught up on.
+    """
+    
+    def __init__(self, path: str, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        """Create a job store backed by the SQLite database at `path`."""
+        super().__init__()
+        self.path = path
+        self.pickle_protocol = pickle_protocol
+    
+    @contextmanager
+    def _connect(self):
+        """Open a connection to the database, committing on success."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        ensure_data_dir()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+    
+    def lookup_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT job_state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+    
+    def get_due_jobs(self, now):
+        return self._get_jobs("WHERE next_run_time <= ?", (datetime_to_utc_timestamp(now),))
+    
+    def get_next_run_time(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT next_run_time FROM jobs WHERE next_run_time IS NOT NULL ORDER BY next_run_time LIMIT 1"
+            ).fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+    
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+    
+    def add_job(self, job):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                    (job.id, datetime_to_utc_timestamp(job.next_run_time), self._serialize_job(job))
+                )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+    
+    def update_job(self, job):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET next_run_time = ?, job_state = ? WHERE id = ?",
+                (datetime_to_utc_timestamp(job.next_run_time), self._serialize_job(job), job.id)
+            )
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+    
+    def remove_job(self, job_id):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+    
+    def remove_all_jobs(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs")
+    
+    def _serialize_job(self, job: Job) -> bytes:
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+    
+    def _reconstitute_job(self, job_state: bytes) -> Job:
+        job_state = pickle.loads(job_state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+    
+    def _get_jobs(self, where: str = "", params: tuple = ()):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT id, job_state FROM jobs {where} ORDER BY next_run_time", params).fetchall()
+        
+        jobs = []
+        failed_job_ids = []
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except Exception:
+                logger.exception(f"Unable to restore scheduled job {job_id}, removing it")
+                failed_job_ids.append(job_id)
+        
+        # Remove the jobs that can't be restored, e.g. because their function no longer exists
+        if failed_job_ids:
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in failed_job_ids])
+        
+        return jobs
+    
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path})>"
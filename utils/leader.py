@@ -0,0 +1,168 @@
+import atexit
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+import config
+from utils.storage import ensure_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Name of the lease held by the instance that runs the scheduler and polling
+RUNNER_LEASE = "runner"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+_instance_id = None
+_instance_pid = None
+_is_leader = False
+_thread = None
+_on_elected = None
+_on_lost = None
+
+def get_instance_id() -> str:
+    """Get the ID this process holds the lease under.
+
+    The ID is made per process, so a worker forked from a process that already
+    made one gets its own.
+    """
+    global _instance_id, _instance_pid
+    if _instance_pid != os.getpid():
+        _instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        _instance_pid = os.getpid()
+    return _instance_id
+
+def _connect() -> sqlite3.Connection:
+    ensure_data_dir()
+    conn = sqlite3.connect(config.SCHEDULER_DB, timeout=30, isolation_level=None)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def try_acquire() -> bool:
+    """Take or renew the runner lease, if no other live instance holds it.
+
+    Returns:
+        True if this instance holds the lease until the next renewal is due
+    """
+    holder = get_instance_id()
+    now = time.time()
+    conn = _connect()
+    try:
+        # Take the write lock before reading, so two instances can't both see an expired lease
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (RUNNER_LEASE,)).fetchone()
+        if row is not None and row[0] != holder and row[1] > now:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+            (RUNNER_LEASE, holder, now + config.LEADER_LEASE_SECONDS)
+        )
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()
+
+def release():
+    """Give up the runner lease, so another instance can take over right away."""
+    global _is_leader
+    with _lock:
+        _is_leader = False
+    try:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (RUNNER_LEASE, get_instance_id()))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to release the runner lease: {e}")
+
+def get_leader() -> Optional[Dict]:
+    """Get the instance that holds the runner lease, if the lease is live."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (RUNNER_LEASE,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row[1] <= time.time():
+        return None
+    return {"holder": row[0], "expires_at": row[1]}
+
+def is_leader() -> bool:
+    """Check whether this instance runs the scheduler and polling."""
+    with _lock:
+        return _is_leader
+
+def wait_until_leader():
+    """Block until this instance holds the runner lease."""
+    while not is_leader():
+        time.sleep(config.LEADER_HEARTBEAT_SECONDS)
+
+def _heartbeat():
+    """Renew or contend for the lease, and hand over the runner duties when it changes hands."""
+    global _is_leader
+    while True:
+        try:
+            acquired = try_acquire()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to renew the runner lease: {e}")
+            acquired = False
+
+        with _lock:
+            was_leader = _is_leader
+            _is_leader = acquired
+            on_elected, on_lost = _on_elected, _on_lost
+
+        if acquired and not was_leader:
+            logger.info(f"Instance {get_instance_id()} is now running the scheduler and polling")
+            _run_callback(on_elected)
+        elif was_leader and not acquired:
+            logger.warning(f"Instance {get_instance_id()} lost the runner lease, stopping the scheduler and polling")
+            _run_callback(on_lost)
+
+        time.sleep(config.LEADER_HEARTBEAT_SECONDS)
+
+def _run_callback(callback: Optional[Callable]):
+    if callback is None:
+        return
+    try:
+        callback()
+    except Exception as e:
+        logger.error(f"Error handing over runner duties: {e}")
+
+def start(on_elected: Callable, on_lost: Optional[Callable] = None):
+    """Take part in the election of the instance that runs the scheduler and polling.
+
+    Every instance, e.g. every uWSGI worker, can serve web requests, but only
+    the one holding the runner lease should do background work. A heartbeat
+    thread renews the lease every config.LEADER_HEARTBEAT_SECONDS; when the
+    leader dies its lease runs out after config.LEADER_LEASE_SECONDS and
+    another instance takes over. The lease is kept in SQLite, so this
+    coordinates the processes of one host.
+
+    Starting again only replaces the callbacks.
+
+    Args:
+        on_elected: Called when this instance becomes the leader
+        on_lost: Called when this instance loses the lease
+    """
+    global _thread, _on_elected, _on_lost
+    with _lock:
+        _on_elected, _on_lost = on_elected, on_lost
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_heartbeat, name="leader-heartbeat", daemon=True)
+        _thread.start()
+    atexit.register(release)
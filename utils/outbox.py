@@ -0,0 +1,379 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+from utils.storage import ensure_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Run states
+RUN_PLANNED = "planned"
+RUN_RUNNING = "running"
+RUN_DONE = "done"
+RUN_FAILED = "failed"  # Stopped because Telegram rejected the post itself
+
+# Delivery states
+DELIVERY_PENDING = "pending"
+DELIVERY_SENDING = "sending"
+DELIVERY_SENT = "sent"
+DELIVERY_RETRY = "retry"  # Failed transiently, waiting for next_attempt_at
+DELIVERY_DEAD = "dead"    # Failed permanently, parked for admins to inspect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    post_time TEXT,
+    deadline TEXT,
+    cta_url TEXT NOT NULL,
+    excluded TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    idempotency_key TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    channel_id TEXT NOT NULL,
+    type_tag TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    file_id TEXT,
+    caption TEXT NOT NULL,
+    subscribers INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    message_id INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TEXT,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Indexes are created after migrating, since they may cover added columns
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS deliveries_run_state ON deliveries (run_id, state);
+CREATE INDEX IF NOT EXISTS deliveries_state_next_attempt ON deliveries (state, next_attempt_at);
+"""
+
+# Columns added after the first release of the outbox, with their definitions
+_ADDED_COLUMNS = {
+    "deliveries": {"next_attempt_at": "TEXT"},
+}
+
+def _migrate(conn: sqlite3.Connection):
+    """Add any columns missing from an outbox created by an older version."""
+    for table, columns in _ADDED_COLUMNS.items():
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+@contextmanager
+def _connect():
+    """Open a connection to the outbox database, committing on success."""
+    global _schema_ready
+    ensure_data_dir()
+    conn = sqlite3.connect(config.OUTBOX_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _migrate(conn)
+                conn.executescript(_INDEXES)
+                _schema_ready = True
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+def get_delivery_key(run_id: str, channel_id: str) -> str:
+    """Get the idempotency key of a run's delivery to a channel."""
+    return f"{run_id}:{channel_id}"
+
+def create_run(run_id: str, plan: Dict, deadline: Optional[str] = None) -> bool:
+    """Store a crosspost plan as a run with one pending delivery per target.
+    
+    A run that hasn't started sending yet is replaced; a run that has is
+    left alone, so re-planning can never lead to duplicate sends.
+    
+    Args:
+        run_id: Unique ID of the run
+        plan: The plan built by crosspost.build_crosspost_plan
+        deadline: ISO timestamp of the end of the delivery window, if any
+        
+    Returns:
+        True if the run was stored, False if it already started
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is not None:
+            if row["status"] != RUN_PLANNED:
+                logger.warning(f"Crosspost run {run_id} already started, keeping it")
+                return False
+            conn.execute("DELETE FROM deliveries WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        
+        conn.execute(
+            "INSERT INTO runs (run_id, status, created_at, post_time, deadline, cta_url, excluded) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, RUN_PLANNED, plan["created_at"], plan.get("post_time"), deadline,
+             plan["cta_url"], json.dumps(plan.get("excluded", {}), ensure_ascii=False))
+        )
+        now = _now()
+        conn.executemany(
+            "INSERT INTO deliveries (idempotency_key, run_id, channel_id, type_tag, image_path, file_id, "
+            "caption, subscribers, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (get_delivery_key(run_id, target["channel_id"]), run_id, target["channel_id"],
+                 group["type_tag"], group["image_path"], group.get("file_id"), target["caption"],
+                 target.get("subscribers", 0), DELIVERY_PENDING, now)
+                for group in plan["groups"] for target in group["targets"]
+            ]
+        )
+    return True
+
+def get_run(run_id: str) -> Optional[Dict]:
+    """Get a run with its delivery counts by state."""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["excluded"] = json.loads(run["excluded"])
+        run["counts"] = {
+            state: count for state, count in conn.execute(
+                "SELECT state, COUNT(*) FROM deliveries WHERE run_id = ? GROUP BY state", (run_id,)
+            )
+        }
+    return run
+
+def get_runs_by_status(status: str) -> List[str]:
+    """Get the IDs of all runs in a given state, oldest first."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT run_id FROM runs WHERE status = ? ORDER BY created_at", (status,)
+        ).fetchall()
+    return [row["run_id"] for row in rows]
+
+def start_run(run_id: str):
+    """Mark a run as sending.
+    
+    Deliveries left in the sending state by an earlier, interrupted attempt
+    may or may not have reached Telegram. They are parked in the dead-letter
+    store rather than retried, so a restart never posts twice to the same
+    channel; an admin can requeue them after checking the channel.
+    """
+    with _connect() as conn:
+        conn.execute("UPDATE runs SET status = ? WHERE run_id = ?", (RUN_RUNNING, run_id))
+    dead_letter_interrupted(run_id)
+
+def dead_letter_interrupted(run_id: str) -> int:
+    """Dead-letter a run's deliveries left in the sending state, e.g. by a worker process that died.
+    
+    They may or may not have reached Telegram, so they aren't retried; an
+    admin can requeue them after checking the channel.
+    
+    Returns:
+        The number of deliveries dead-lettered
+    """
+    with _connect() as conn:
+        interrupted = conn.execute(
+            "UPDATE deliveries SET state = ?, last_error = ?, updated_at = ? WHERE run_id = ? AND state = ?",
+            (DELIVERY_DEAD, "interrupted while sending, delivery unknown", _now(), run_id, DELIVERY_SENDING)
+        ).rowcount
+    if interrupted:
+        logger.warning(f"{interrupted} deliveries of run {run_id} were interrupted mid-send and dead-lettered")
+    return interrupted
+
+def set_run_deadline(run_id: str, deadline: Optional[str]):
+    """Change when a run that hasn't finished yet has to be delivered by."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE runs SET deadline = ? WHERE run_id = ? AND status NOT IN (?, ?)",
+            (deadline, run_id, RUN_DONE, RUN_FAILED)
+        )
+
+def fail_run(run_id: str, error: str) -> Optional[int]:
+    """Stop a run for good, dead-lettering every delivery of it that hasn't been sent yet.
+    
+    A run that was already delivered keeps its status; only its pending
+    retries are dead-lettered.
+    
+    Args:
+        run_id: ID of the run
+        error: Why the run was stopped, recorded on its deliveries
+        
+    Returns:
+        The number of deliveries dead-lettered, or None if the run had already been stopped
+    """
+    with _connect() as conn:
+        # Changing the status first holds the write lock, so only one caller stops the run
+        stopped = conn.execute(
+            "UPDATE runs SET status = ? WHERE run_id = ? AND status NOT IN (?, ?)",
+            (RUN_FAILED, run_id, RUN_DONE, RUN_FAILED)
+        ).rowcount
+        if not stopped:
+            row = conn.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None or row["status"] == RUN_FAILED:
+                return None
+        return conn.execute(
+            "UPDATE deliveries SET state = ?, last_error = ?, updated_at = ? WHERE run_id = ? AND state IN (?, ?)",
+            (DELIVERY_DEAD, error, _now(), run_id, DELIVERY_PENDING, DELIVERY_RETRY)
+        ).rowcount
+
+def finish_run(run_id: str):
+    """Mark a run as done."""
+    with _connect() as conn:
+        conn.execute("UPDATE runs SET status = ? WHERE run_id = ?", (RUN_DONE, run_id))
+
+def get_pending_deliveries(run_id: str) -> List[Dict]:
+    """Get a run's deliveries that still have to be sent, largest audience first."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM deliveries WHERE run_id = ? AND state = ? ORDER BY subscribers DESC",
+            (run_id, DELIVERY_PENDING)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def mark_sending(idempotency_key: str) -> bool:
+    """Record that a delivery is about to be sent.
+    
+    Returns:
+        False if the delivery is no longer waiting to be sent, e.g. because its run was cancelled
+    """
+    with _connect() as conn:
+        return conn.execute(
+            "UPDATE deliveries SET state = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE idempotency_key = ? AND state IN (?, ?)",
+            (DELIVERY_SENDING, _now(), idempotency_key, DELIVERY_PENDING, DELIVERY_RETRY)
+        ).rowcount > 0
+
+def mark_sent(idempotency_key: str, message_id: int):
+    """Record that a delivery was sent, with the ID of the posted message."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE deliveries SET state = ?, message_id = ?, last_error = NULL, updated_at = ? "
+            "WHERE idempotency_key = ?",
+            (DELIVERY_SENT, message_id, _now(), idempotency_key)
+        )
+
+def mark_failed(idempotency_key: str, error: str, next_attempt_at: Optional[datetime] = None):
+    """Record that a delivery failed.
+    
+    Args:
+        idempotency_key: Key of the delivery
+        error: Description of the failure
+        next_attempt_at: When to retry, or None to park the delivery as a dead letter
+    """
+    if next_attempt_at is None:
+        state, retry_at = DELIVERY_DEAD, None
+    else:
+        state, retry_at = DELIVERY_RETRY, next_attempt_at.isoformat()
+    
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE deliveries SET state = ?, last_error = ?, next_attempt_at = ?, updated_at = ? "
+            "WHERE idempotency_key = ?",
+            (state, error, retry_at, _now(), idempotency_key)
+        )
+
+def get_run_channel_ids(run_id: str) -> List[str]:
+    """Get the IDs of the channels a run has a delivery to, in any state."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT channel_id FROM deliveries WHERE run_id = ?", (run_id,)).fetchall()
+    return [row["channel_id"] for row in rows]
+
+def drop_pending_deliveries(run_id: str, reasons: Dict[str, str]) -> int:
+    """Dead-letter a run's pending deliveries to some channels, e.g. ones the bot can't post to.
+    
+    Args:
+        run_id: ID of the run
+        reasons: Why each channel is dropped, keyed by channel ID
+        
+    Returns:
+        The number of deliveries dropped
+    """
+    now = _now()
+    with _connect() as conn:
+        return sum(
+            conn.execute(
+                "UPDATE deliveries SET state = ?, last_error = ?, updated_at = ? "
+                "WHERE idempotency_key = ? AND state = ?",
+                (DELIVERY_DEAD, reason, now, get_delivery_key(run_id, channel_id), DELIVERY_PENDING)
+            ).rowcount
+            for channel_id, reason in reasons.items()
+        )
+
+def cancel_run(run_id: str) -> int:
+    """Withdraw all of a run's deliveries that haven't been sent yet.
+    
+    They are dead-lettered, so they can still be requeued.
+    
+    Args:
+        run_id: ID of the run
+        
+    Returns:
+        The number of deliveries withdrawn
+    """
+    with _connect() as conn:
+        return conn.execute(
+            "UPDATE deliveries SET state = ?, last_error = ?, updated_at = ? WHERE run_id = ? AND state IN (?, ?)",
+            (DELIVERY_DEAD, "cancelled", _now(), run_id, DELIVERY_PENDING, DELIVERY_RETRY)
+        ).rowcount
+
+def get_due_retries(now: datetime) -> List[Dict]:
+    """Get the deliveries whose retry is due, with their run's CTA link and deadline."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT d.*, r.cta_url, r.deadline FROM deliveries d JOIN runs r ON r.run_id = d.run_id "
+            "WHERE d.state = ? AND d.next_attempt_at <= ? ORDER BY d.next_attempt_at",
+            (DELIVERY_RETRY, now.isoformat())
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def get_dead_letters(limit: int = 500) -> List[Dict]:
+    """Get the most recent dead-lettered deliveries."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM deliveries WHERE state = ? ORDER BY updated_at DESC LIMIT ?",
+            (DELIVERY_DEAD, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def count_dead_letters() -> int:
+    """Count the dead-lettered deliveries."""
+    with _connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM deliveries WHERE state = ?", (DELIVERY_DEAD,)).fetchone()[0]
+
+def requeue_dead_letters(idempotency_keys: Optional[List[str]] = None) -> int:
+    """Move dead-lettered deliveries back to the retry queue, due immediately.
+    
+    Args:
+        idempotency_keys: Keys of the deliveries to requeue, or None for all of them
+        
+    Returns:
+        The number of deliveries requeued
+    """
+    now = _now()
+    query = "UPDATE deliveries SET state = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE state = ?"
+    params = [DELIVERY_RETRY, now, now, DELIVERY_DEAD]
+    
+    if idempotency_keys is not None:
+        if not idempotency_keys:
+            return 0
+        query += f" AND idempotency_key IN ({', '.join('?' for _ in idempotency_keys)})"
+        params.extend(idempotency_keys)
+    
+    with _connect() as conn:
+        return conn.execute(query, params).rowcount
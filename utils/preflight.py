@@ -0,0 +1,231 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+
+import config
+from utils import breaker, outbox, senders, storage
+from utils.crosspost import escape_markdown, get_bot_instance, get_bot_user, get_daily_run_id, get_slot_channels
+from utils.errors import is_permanent_error
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+KYIV_TIMEZONE_PYTZ = pytz.timezone('Europe/Kiev')
+
+# Reported while a channel's breaker stays open, whatever the original problem was
+BREAKER_OPEN_PROBLEM = "circuit breaker open"
+
+# Membership checks share one limiter, however many threads run them
+_check_limiter = RateLimiter(config.PREFLIGHT_MAX_REQUESTS_PER_SECOND)
+
+def get_bot_posting_problem(channel_id: str, bot_id: int) -> Optional[str]:
+    """Check whether the bot can still post to a channel.
+    
+    Args:
+        channel_id: The ID of the channel
+        bot_id: The user ID of the bot itself
+        
+    Returns:
+        A short description of the problem, or None if the bot can post
+    """
+    if not breaker.allow_request(channel_id):
+        return BREAKER_OPEN_PROBLEM
+    
+    bot = get_bot_instance()
+    try:
+        member = bot.get_chat_member(int(channel_id), bot_id)
+    except Exception as e:
+        # Bad request/forbidden mean the chat is gone or the bot was kicked; anything else is not conclusive
+        if is_permanent_error(e):
+            breaker.record_failure(channel_id, e)
+            return e.description
+        logger.warning(f"Could not verify bot membership in channel {channel_id}: {e}")
+        return None
+    
+    problem = None
+    if member.status == "administrator" and getattr(member, "can_post_messages", None) is False:
+        problem = "bot is not allowed to post messages"
+    elif member.status not in ("administrator", "creator"):
+        problem = f"bot is not an administrator (status: {member.status})"
+    
+    if problem:
+        breaker.record_permanent_failure(channel_id, problem)
+    else:
+        breaker.record_success(channel_id)
+    return problem
+
+def check_channels(channel_ids: List[str]) -> Dict[str, str]:
+    """Check in parallel, under the rate limit, that the bot can post to each channel.
+    
+    Args:
+        channel_ids: IDs of the channels to check
+        
+    Returns:
+        The problem found for each channel the bot can't post to, keyed by channel ID
+    """
+    if not channel_ids:
+        return {}
+    bot_id = get_bot_user().id
+    
+    def check(channel_id):
+        _check_limiter.acquire()
+        return channel_id, get_bot_posting_problem(channel_id, bot_id)
+    
+    with ThreadPoolExecutor(max_workers=config.PREFLIGHT_WORKERS) as executor:
+        results = list(executor.map(check, channel_ids))
+    
+    return {channel_id: problem for channel_id, problem in results if problem}
+
+def _get_todays_result() -> Optional[Dict]:
+    """Get today's pre-flight result, if the pre-flight pass already ran today."""
+    result = storage.get_preflight_result()
+    today = datetime.now(KYIV_TIMEZONE_PYTZ).date().isoformat()
+    return result if result.get("date") == today else None
+
+def get_unpostable_channels(channel_ids: List[str]) -> Dict[str, str]:
+    """Find the channels among channel_ids that the bot can't post to.
+    
+    Channels covered by today's pre-flight pass aren't checked again; any
+    others (e.g. approved since) are checked now.
+    
+    Args:
+        channel_ids: IDs of the channels taking part in a crosspost
+        
+    Returns:
+        The problem found for each unpostable channel, keyed by channel ID
+    """
+    result = _get_todays_result()
+    if result is None:
+        return check_channels(channel_ids)
+    
+    checked = set(result["checked"])
+    unpostable = {
+        channel_id: problem for channel_id, problem in result["unpostable"].items()
+        if channel_id in channel_ids
+    }
+    unpostable.update(check_channels([channel_id for channel_id in channel_ids if channel_id not in checked]))
+    return unpostable
+
+def _get_unnotified_problems(unpostable: Dict[str, str], notified: Dict[str, Dict]) -> Dict[str, str]:
+    """Get the problems among unpostable that the owners and admins haven't been told about yet.
+    
+    A channel is notified again only once its problem changes; its breaker
+    opening over the same problem doesn't count.
+    
+    Args:
+        unpostable: The problem found for each unpostable channel, keyed by channel ID
+        notified: The last problem each channel was notified of and when, keyed by channel ID
+        
+    Returns:
+        The problems to notify, keyed by channel ID
+    """
+    new_problems = {}
+    for channel_id, problem in unpostable.items():
+        previous = notified.get(channel_id)
+        if previous and (previous["problem"] == problem or problem == BREAKER_OPEN_PROBLEM):
+            continue
+        new_problems[channel_id] = problem
+    return new_problems
+
+def notify_unpostable_channels(unpostable: Dict[str, str], already_notified: int = 0):
+    """Tell channel owners, and the admins, which channels will be left out of today's crosspost.
+    
+    Args:
+        unpostable: The problem to notify for each channel, keyed by channel ID
+        already_notified: Number of other channels left out that were notified before
+    """
+    if not unpostable:
+        return
+    
+    bot = get_bot_instance()
+    channels = storage.get_channels()
+    
+    for channel_id, problem in unpostable.items():
+        channel_data = channels.get(channel_id, {})
+        owner_id = channel_data.get("owner_id")
+        if not owner_id:
+            continue
+        try:
+            bot.send_message(
+                owner_id,
+                f"⚠️ The bot can't post to your channel *{escape_markdown(channel_data.get('title', 'Unknown'))}*: "
+                f"{escape_markdown(problem)}.\n\n"
+                "Make sure the bot is an administrator with permission to post messages, "
+                "otherwise your channel will be left out of today's crosspost.",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify owner {owner_id} of channel {channel_id}: {e}")
+    
+    summary = f"*Pre-flight check*\n\n{len(unpostable)} channels will be left out of today's crosspost:\n\n"
+    for idx, (channel_id, problem) in enumerate(unpostable.items(), 1):
+        title = channels.get(channel_id, {}).get("title", "Unknown")
+        summary += f"{idx}. {escape_markdown(title)} ({channel_id}): {escape_markdown(problem)}\n"
+    if already_notified:
+        summary += f"\n{already_notified} more channels are still left out, as reported before.\n"
+    
+    for admin_id in config.ADMIN_IDS:
+        try:
+            bot.send_message(admin_id, summary, parse_mode="Markdown")
+        except Exception as e:
+            logger.error(f"Failed to send pre-flight summary to admin {admin_id}: {e}")
+
+def run_preflight(post_time: Optional[str] = None, groups: Optional[List[str]] = None):
+    """Check that the bot can still post to every channel taking part in a crosspost today.
+    
+    The result is saved for the planning stage, merged with the results of
+    today's earlier slots. Channels found unpostable are also dropped from
+    the slot's plan if it was already built. Their owners and the admins are
+    notified when a channel first becomes unpostable or its problem changes,
+    not again on every slot; a channel that can be posted to again is
+    forgotten, so a later problem is reported anew.
+    
+    Args:
+        post_time: ISO timestamp of the scheduled slot, if there is one; all of today's channels are checked if not
+        groups: The channel groups posted in the slot, all of them if not given
+    """
+    now = datetime.now(KYIV_TIMEZONE_PYTZ)
+    channel_ids = get_slot_channels(post_time or now.isoformat(), groups)
+    logger.info(f"Running pre-flight check for {len(channel_ids)} channels")
+    
+    unpostable = check_channels(channel_ids)
+    
+    # Keep what today's other slots found about their own channels
+    previous = _get_todays_result() or {"checked": [], "unpostable": {}}
+    checked = set(channel_ids)
+    
+    # Notifications are remembered across days, until the channel's problem is fixed
+    notified = {
+        channel_id: entry for channel_id, entry in storage.get_preflight_result().get("notified", {}).items()
+        if channel_id not in checked or channel_id in unpostable
+    }
+    new_problems = _get_unnotified_problems(unpostable, notified)
+    for channel_id, problem in new_problems.items():
+        notified[channel_id] = {"problem": problem, "notified_at": now.isoformat()}
+    
+    all_unpostable = {
+        channel_id: problem for channel_id, problem in previous["unpostable"].items()
+        if channel_id not in checked
+    }
+    all_unpostable.update(unpostable)
+    storage.save_preflight_result({
+        "date": now.date().isoformat(),
+        "checked_at": now.isoformat(),
+        "checked": sorted(checked | set(previous["checked"])),
+        "unpostable": all_unpostable,
+        "notified": notified
+    })
+    logger.info(f"Pre-flight check done: {len(unpostable)} of {len(channel_ids)} channels can't be posted to")
+    
+    # Channels that gained or lost a sender bot are picked up before the plan is built
+    senders.assign_senders([channel_id for channel_id in channel_ids if channel_id not in unpostable])
+    
+    if post_time and unpostable:
+        dropped = outbox.drop_pending_deliveries(get_daily_run_id(post_time), unpostable)
+        if dropped:
+            logger.info(f"Dropped {dropped} unpostable channels from the crosspost planned for {post_time}")
+    
+    notify_unpostable_channels(new_problems, len(unpostable) - len(new_problems))
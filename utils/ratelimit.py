@@ -0,0 +1,34 @@
+import threading
+import time
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least 1/rate seconds apart.
+    
+    Each caller reserves the next free slot under the lock and then sleeps
+    outside of it, so many threads can share one limiter without serializing
+    on the sleep.
+    """
+    
+    def __init__(self, rate: float):
+        """Create a limiter allowing `rate` calls per second (0 disables limiting)."""
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def reserve(self) -> float:
+        """Reserve the next free slot without waiting for it.
+        
+        Returns:
+            The number of seconds the caller has to wait before making its call
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+    
+    def acquire(self):
+        """Block until the caller is allowed to make its call."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
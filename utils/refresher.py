@@ -0,0 +1,113 @@
+import logging
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+import config
+from utils import storage
+from utils.crosspost import get_subscriber_counts
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest observation in a channel's smoothed rate of change
+VOLATILITY_SMOOTHING = 0.3
+
+def get_refresh_interval(subscribers: int, change_per_hour: float) -> timedelta:
+    """Work out how long a channel's subscriber count can go without a refresh.
+    
+    A count only matters for crossposts when it crosses the small/large
+    threshold, so the interval is half the time the channel would take to
+    reach the threshold at its recent rate of change. Volatile channels and
+    channels close to the threshold are refreshed often, stable channels far
+    from it rarely.
+    
+    Args:
+        subscribers: The channel's current subscriber count
+        change_per_hour: Smoothed number of subscribers gained or lost per hour
+    
+    Returns:
+        The time until the next refresh, within the configured bounds
+    """
+    distance = abs(subscribers - config.SMALL_CHANNEL_THRESHOLD)
+    minutes_to_threshold = distance / max(change_per_hour, 0.1) * 60
+    minutes = min(max(minutes_to_threshold / 2, config.SUBSCRIBER_REFRESH_MIN_MINUTES),
+                  config.SUBSCRIBER_REFRESH_MAX_MINUTES)
+    return timedelta(minutes=minutes)
+
+def _update_state(state: Dict, subscribers: int, now: datetime) -> Dict:
+    """Fold a fresh subscriber count into a channel's refresh state."""
+    change_per_hour = state.get("change_per_hour", 0.0)
+    if state.get("refreshed_at") and state.get("subscribers"):
+        hours = max((now - datetime.fromisoformat(state["refreshed_at"])).total_seconds() / 3600, 1 / 60)
+        observed = abs(subscribers - state["subscribers"]) / hours
+        change_per_hour = VOLATILITY_SMOOTHING * observed + (1 - VOLATILITY_SMOOTHING) * change_per_hour
+    
+    return {
+        "subscribers": subscribers,
+        "change_per_hour": change_per_hour,
+        "refreshed_at": now.isoformat(),
+        "next_refresh_at": (now + get_refresh_interval(subscribers, change_per_hour)).isoformat()
+    }
+
+def refresh_due_channels() -> int:
+    """Refresh the subscriber counts of the channels that are due, a few at a time.
+    
+    This runs every config.SUBSCRIBER_REFRESH_TICK_SECONDS. Each tick makes at
+    most the share of requests that spreads one refresh per channel evenly
+    over an hour, most overdue channels first, so there is never a burst of
+    requests. The counts of one tick are written to the channel data in a
+    single save.
+    
+    Returns:
+        The number of channels refreshed
+    """
+    channels = storage.get_channels()
+    states = storage.get_refresh_state()
+    now = datetime.now()
+    
+    # Forget channels that left the network
+    changed = bool(set(states) - set(channels))
+    for channel_id in set(states) - set(channels):
+        del states[channel_id]
+    
+    # New channels get a random first refresh within the hour, instead of all at once
+    for channel_id in channels:
+        if channel_id not in states:
+            changed = True
+            states[channel_id] = {"next_refresh_at": (now + timedelta(seconds=random.uniform(0, 3600))).isoformat()}
+    
+    due = sorted(
+        (channel_id for channel_id, state in states.items() if datetime.fromisoformat(state["next_refresh_at"]) <= now),
+        key=lambda channel_id: states[channel_id]["next_refresh_at"]
+    )
+    budget = max(1, math.ceil(len(channels) * config.SUBSCRIBER_REFRESH_TICK_SECONDS / 3600))
+    batch = due[:budget]
+    
+    counts = get_subscriber_counts(batch) if batch else {}
+    updated = {}
+    for channel_id in batch:
+        if counts.get(channel_id, 0) > 0:
+            states[channel_id] = _update_state(states[channel_id], counts[channel_id], now)
+            updated[channel_id] = counts[channel_id]
+        else:
+            # Try again soon, but not on every tick
+            retry_at = now + timedelta(minutes=config.SUBSCRIBER_REFRESH_MIN_MINUTES)
+            states[channel_id]["next_refresh_at"] = retry_at.isoformat()
+    
+    if updated:
+        # Apply the counts to the channels as they are now, so edits made meanwhile are kept
+        try:
+            with storage.transaction() as tx:
+                channels = tx.change(storage.DATA_CHANNELS)
+                for channel_id, subscribers in updated.items():
+                    if channel_id in channels:
+                        channels[channel_id]["subscribers"] = subscribers
+        except storage.StorageError as e:
+            logger.error(f"Failed to save refreshed subscriber counts: {e}")
+    
+    if changed or batch:
+        storage.save_refresh_state(states)
+    if batch:
+        logger.info(f"Refreshed subscriber counts of {len(updated)}/{len(batch)} channels ({len(due)} were due)")
+    return len(updated)
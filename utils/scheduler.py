@@ -1,84 +1,222 @@
 import logging
 import random
 from datetime import datetime, time, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 
 import config
-from utils import storage
-from utils.crosspost import create_and_send_crosspost, update_all_channel_subscribers
+from utils import outbox, storage, warmup
+from utils.jobs import JobHandle
+from utils.delivery import DELIVERY_MODE_WINDOW, get_daily_slots, get_delivery_window
+from utils.preflight import run_preflight
+from utils.crosspost import (
+    create_and_send_crosspost, get_daily_run_id, plan_crosspost, resume_interrupted_crossposts,
+    retry_due_deliveries, send_planned_crosspost, update_all_channel_subscribers
+)
+from utils.jobstore import SQLiteJobStore
+from utils.refresher import refresh_due_channels
 
 logger = logging.getLogger(__name__)
 
 # Create a pytz timezone for Kyiv instead of using ZoneInfo
 KYIV_TIMEZONE_PYTZ = pytz.timezone('Europe/Kiev')
 
-# Global scheduler instance
-scheduler = BackgroundScheduler(timezone=KYIV_TIMEZONE_PYTZ)
+# Global scheduler instance. Jobs are kept on disk, so a run that was due
+# while the bot was down is caught up on (once) after the restart.
+scheduler = BackgroundScheduler(
+    timezone=KYIV_TIMEZONE_PYTZ,
+    jobstores={'default': SQLiteJobStore(config.SCHEDULER_DB)},
+    job_defaults={
+        'coalesce': True,
+        'misfire_grace_time': config.SCHEDULER_MISFIRE_GRACE_MINUTES * 60
+    }
+)
 
 def init_scheduler():
-    """Initialize the scheduler."""
-    if not scheduler.running:
+    """Initialize the scheduler, or resume it if it was paused."""
+    if scheduler.state == STATE_PAUSED:
+        scheduler.resume()
+        logger.info("Scheduler resumed")
+    elif not scheduler.running:
         scheduler.start()
         logger.info("Scheduler started")
-        
-        # Schedule daily crosspost
-        scheduler.add_job(
-            schedule_daily_crosspost,
-            CronTrigger(hour=0, minute=0, timezone=KYIV_TIMEZONE_PYTZ),  # Run at midnight to schedule for the day
-            id='schedule_daily_crosspost',
-            replace_existing=True
-        )
-        
-        # Schedule hourly subscriber count updates
-        scheduler.add_job(
-            update_all_channel_subscribers,
-            CronTrigger(minute=0, timezone=KYIV_TIMEZONE_PYTZ),  # Run at the start of every hour
-            id='update_subscribers',
-            replace_existing=True
-        )
-        
-        # Call it immediately to set up today's schedule
-        schedule_daily_crosspost()
-        
-        # Also update subscriber counts immediately on startup
-        update_all_channel_subscribers()
+    else:
+        return
+    
+    # Schedule daily crosspost
+    scheduler.add_job(
+        schedule_daily_crosspost,
+        CronTrigger(hour=0, minute=0, timezone=KYIV_TIMEZONE_PYTZ),  # Run at midnight to schedule for the day
+        id='schedule_daily_crosspost',
+        replace_existing=True
+    )
+    
+    # Keep subscriber counts fresh with a steady trickle of requests
+    scheduler.add_job(
+        refresh_due_channels,
+        IntervalTrigger(seconds=config.SUBSCRIBER_REFRESH_TICK_SECONDS, timezone=KYIV_TIMEZONE_PYTZ),
+        id='refresh_subscribers',
+        replace_existing=True
+    )
+    
+    # Retry failed crosspost sends in the background, apart from the first pass
+    scheduler.add_job(
+        retry_due_deliveries,
+        IntervalTrigger(seconds=config.CROSSPOST_RETRY_CHECK_SECONDS, timezone=KYIV_TIMEZONE_PYTZ),
+        id='retry_due_deliveries',
+        replace_existing=True
+    )
+    
+    # Finish any crosspost that a restart interrupted mid-delivery
+    scheduler.add_job(
+        resume_interrupted_crossposts,
+        id='resume_interrupted_crossposts',
+        replace_existing=True
+    )
+    
+    # Set up today's schedule in the background, so startup doesn't wait for it
+    warmup.start_task('schedule_daily_crosspost', schedule_daily_crosspost)
+
+def pause_scheduler():
+    """Stop running scheduled jobs, e.g. when another instance takes over.
+    
+    The jobs stay in the job store, so the instance that runs the scheduler
+    next picks them up. init_scheduler resumes a paused scheduler.
+    """
+    if scheduler.state == STATE_RUNNING:
+        scheduler.pause()
+        logger.info("Scheduler paused")
+
+# Jobs scheduled for every slot; their IDs end in the slot's time, e.g. daily_crosspost_1800
+SLOT_JOB_PREFIXES = ('preflight_daily_crosspost', 'plan_daily_crosspost', 'daily_crosspost')
+
+def get_slot_job_id(prefix: str, slot: time) -> str:
+    """Get the ID of one of a slot's jobs."""
+    return f"{prefix}_{slot.strftime('%H%M')}"
 
 def schedule_daily_crosspost():
-    """Schedule the crosspost for today at exactly 6 PM Kyiv time."""
+    """Schedule today's crosspost slots.
+    
+    Every slot is planned and sent on its own. In burst mode a slot's
+    crosspost goes out at exactly the slot time; in window mode its sends are
+    spread over the delivery window ending at the slot. The jobs only carry
+    the slot, not its channels, which are resolved when the jobs fire.
+    """
     # Get current date in Kyiv timezone
     now = datetime.now(KYIV_TIMEZONE_PYTZ)
-    today_day_of_week = now.weekday()  # 0-6 (Monday to Sunday)
+    slots = get_daily_slots()
     
-    # Get the channels that participate in crossposting today
-    active_channels = storage.get_channels_for_day(today_day_of_week)
+    # Drop the jobs of slots that are no longer configured
+    job_ids = {get_slot_job_id(prefix, slot) for slot in slots for prefix in SLOT_JOB_PREFIXES}
+    for job in scheduler.get_jobs():
+        if job.id.startswith(SLOT_JOB_PREFIXES) and job.id not in job_ids:
+            logger.info(f"Removing job {job.id} of a slot that is no longer configured")
+            scheduler.remove_job(job.id)
     
-    if not active_channels:
-        logger.info(f"No active channels for today (day {today_day_of_week})")
-        return
+    for slot, groups in slots.items():
+        schedule_slot(now, slot, groups)
+
+def schedule_slot(now: datetime, slot: time, groups: List[str]):
+    """Schedule the pre-flight check, planning and sending of one of today's slots.
     
-    # Set the exact time to 6:00 PM (18:00) Kyiv time
-    target_time = time(18, 0, 0)  # 6:00 PM exactly
-    post_time = KYIV_TIMEZONE_PYTZ.localize(datetime.combine(now.date(), target_time))
+    Args:
+        now: The current Kyiv time
+        slot: The slot's time
+        groups: The channel groups posted in the slot
+    """
+    if config.CROSSPOST_DELIVERY_MODE == DELIVERY_MODE_WINDOW:
+        # Spread the sends over the delivery window
+        post_time, deadline = get_delivery_window(now, slot)
+        deadline_arg = deadline.isoformat()
+    else:
+        post_time = KYIV_TIMEZONE_PYTZ.localize(datetime.combine(now.date(), slot))
+        deadline_arg = None
     
-    # If current time is already past 6 PM, skip today
-    if now.time() > target_time:
-        logger.info("Current time is past 6 PM Kyiv time, skipping today")
+    # If the delivery should already have started, catch up on it unless it's done or too late
+    if now > post_time:
+        schedule_catchup_crosspost(slot, groups, post_time, deadline_arg)
         return
     
-    logger.info(f"Scheduling crosspost for exactly 6 PM Kyiv time: {post_time}")
+    # Check well ahead that the bot can still post everywhere, so owners have time to fix it
+    preflight_time = max(post_time - timedelta(minutes=config.CROSSPOST_PREFLIGHT_LEAD_MINUTES), now)
+    logger.info(f"Scheduling pre-flight check for {preflight_time}")
+    
+    scheduler.add_job(
+        run_preflight,
+        DateTrigger(run_date=preflight_time, timezone=KYIV_TIMEZONE_PYTZ),
+        id=get_slot_job_id('preflight_daily_crosspost', slot),
+        replace_existing=True,
+        args=[post_time.isoformat(), groups]
+    )
+    
+    # Build the plan ahead of time so that only the sends are left at post time
+    plan_time = max(post_time - timedelta(minutes=config.CROSSPOST_PLAN_LEAD_MINUTES), now)
+    logger.info(f"Scheduling crosspost planning for {plan_time}")
+    
+    scheduler.add_job(
+        plan_crosspost,
+        DateTrigger(run_date=plan_time, timezone=KYIV_TIMEZONE_PYTZ),
+        id=get_slot_job_id('plan_daily_crosspost', slot),
+        replace_existing=True,
+        args=[post_time.isoformat(), deadline_arg, groups]
+    )
+    
+    logger.info(
+        f"Scheduling {'/'.join(groups).upper()} crosspost for {post_time} Kyiv time "
+        f"({config.CROSSPOST_DELIVERY_MODE} delivery)"
+    )
     
     # Schedule the crosspost
     scheduler.add_job(
-        create_and_send_crosspost,
+        send_planned_crosspost,
         DateTrigger(run_date=post_time, timezone=KYIV_TIMEZONE_PYTZ),
-        id='daily_crosspost',
+        id=get_slot_job_id('daily_crosspost', slot),
         replace_existing=True,
-        args=[active_channels]
+        args=[post_time.isoformat(), deadline_arg, groups]
+    )
+
+def schedule_catchup_crosspost(slot: time, groups: List[str], post_time: datetime, deadline: Optional[str]):
+    """Send a slot's crosspost now if its time passed without it being delivered.
+    
+    This covers a bot that was down at post time. The crosspost is planned on
+    the spot and delivered in a compressed window; past the misfire grace
+    period the slot is skipped today instead.
+    
+    Args:
+        slot: The slot's time
+        groups: The channel groups posted in the slot
+        post_time: When the crosspost was due to start
+        deadline: ISO timestamp of the end of the delivery window, if the sends are spread out
+    """
+    job_id = get_slot_job_id('daily_crosspost', slot)
+    
+    # A run that was started is finished by resume_interrupted_crossposts, and a
+    # send job kept from before the restart is caught up on by the scheduler itself
+    run = outbox.get_run(get_daily_run_id(post_time.isoformat()))
+    if run is not None and run["status"] != outbox.RUN_PLANNED:
+        logger.info(f"Today's crosspost ({post_time.strftime('%H:%M')} Kyiv time) was already sent or is under way")
+        return
+    if scheduler.get_job(job_id) is not None:
+        return
+    
+    now = datetime.now(KYIV_TIMEZONE_PYTZ)
+    if now - post_time > timedelta(minutes=config.SCHEDULER_MISFIRE_GRACE_MINUTES):
+        logger.info(f"Current time is too far past today's crosspost time ({post_time.strftime('%H:%M')} Kyiv time), skipping it today")
+        return
+    
+    logger.warning(f"Today's crosspost ({post_time.strftime('%H:%M')} Kyiv time) was missed, catching up now")
+    scheduler.add_job(
+        send_planned_crosspost,
+        DateTrigger(run_date=now, timezone=KYIV_TIMEZONE_PYTZ),
+        id=job_id,
+        replace_existing=True,
+        args=[post_time.isoformat(), deadline, groups]
     )
 
 def schedule_immediate_crosspost(active_channels: Optional[List[str]] = None):
@@ -102,9 +240,42 @@ def schedule_immediate_crosspost(active_channels: Optional[List[str]] = None):
         from utils.crosspost import create_and_send_crosspost
         
         # Execute directly for immediate feedback
-        create_and_send_crosspost(active_channels)
+        create_and_send_crosspost(active_channels, cooldown=config.CROSSPOST_COOLDOWN_SECONDS)
         logger.info("Successfully executed manual crosspost")
         return True
     except Exception as e:
         logger.error(f"Failed to execute manual crosspost: {e}")
         return False
+
+def run_crosspost_job(job: JobHandle) -> Dict:
+    """Send an immediate crosspost to today's channels as a background job.
+    
+    The job's progress is the state of the run's deliveries, and cancelling
+    it withdraws the deliveries that haven't been sent yet.
+    
+    Args:
+        job: Handle of the job
+        
+    Returns:
+        The ID of the run and the number of channels taking part
+    """
+    today_day_of_week = datetime.now(KYIV_TIMEZONE_PYTZ).weekday()
+    active_channels = storage.get_channels_for_day(today_day_of_week)
+    if not active_channels:
+        raise ValueError("No active channels found for today")
+    
+    logger.info(f"Found {len(active_channels)} active channels for immediate crosspost")
+    run_id = create_and_send_crosspost(active_channels, on_run=job.track_run, cooldown=config.CROSSPOST_COOLDOWN_SECONDS)
+    return {"run_id": run_id, "channels": len(active_channels)}
+
+def run_subscriber_update_job(job: JobHandle) -> Dict:
+    """Update the subscriber counts of all channels as a background job.
+    
+    Args:
+        job: Handle of the job
+        
+    Returns:
+        The number of channels whose count was updated
+    """
+    updated = update_all_channel_subscribers(progress=job.set_progress, cooldown=config.SUBSCRIBER_UPDATE_COOLDOWN_SECONDS)
+    return {"updated": updated}
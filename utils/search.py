@@ -0,0 +1,228 @@
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from utils import storage
+
+logger = logging.getLogger(__name__)
+
+# Query words shorter than this are looked up as word prefixes, longer ones by
+# trigrams, which finds them anywhere in a word
+TRIGRAM_MIN_LENGTH = 3
+
+# Letters that are searched as one, and apostrophes, which are ignored
+_FOLDS = str.maketrans({
+    "ґ": "г", "ё": "е", "ї": "і", "й": "и", "ў": "у",
+    "ʼ": None, "'": None, "’": None, "`": None
+})
+
+# Latin letters with diacritics and combining marks, which are decomposed and stripped
+_DIACRITICS = re.compile("[À-ɏ̀-ͯḀ-ỿ]")
+
+_WORD = re.compile(r"\w+")
+
+_lock = threading.Lock()
+_version = None
+_docs = {}
+_prefixes = {}
+_trigrams = {}
+_usernames = {}
+_subscribers = {}
+_sfw = set()
+
+def normalize(text: str) -> str:
+    """Fold text for searching: case, diacritics, ґ/г and apostrophes are ignored."""
+    text = text.casefold().translate(_FOLDS)
+    if _DIACRITICS.search(text):
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return text
+
+def _get_key(channel_data: Dict) -> Tuple[str, str]:
+    """Get the names a channel is found by."""
+    return channel_data.get("title") or channel_data.get("name") or "", channel_data.get("username") or ""
+
+def to_result(channel_id: str, channel_data: Dict) -> Dict:
+    """Get the fields of a channel that searches return."""
+    title, username = _get_key(channel_data)
+    return {
+        "channel_id": channel_id,
+        "title": title,
+        "username": username,
+        "subscribers": int(channel_data.get("subscribers", 0) or 0),
+        "is_sfw": channel_data.get("is_sfw", True)
+    }
+
+def _get_postings(word: str) -> Tuple[Set[str], Set[str]]:
+    """Get the prefixes and trigrams a word is indexed under."""
+    prefixes = {word[:length] for length in range(1, TRIGRAM_MIN_LENGTH)}
+    trigrams = {word[i:i + 3] for i in range(len(word) - 2)}
+    return prefixes, trigrams
+
+def _set_fields(channel_id: str, channel_data: Dict):
+    """Update the fields of an indexed channel that are only ranked or filtered by."""
+    result = to_result(channel_id, channel_data)
+    _docs[channel_id]["result"] = result
+    _subscribers[channel_id] = result["subscribers"]
+    if result["is_sfw"]:
+        _sfw.add(channel_id)
+    else:
+        _sfw.discard(channel_id)
+
+def _add(channel_id: str, channel_data: Dict):
+    """Index a channel."""
+    key = _get_key(channel_data)
+    words = set(_WORD.findall(normalize(" ".join(key))))
+    prefixes, trigrams = set(), set()
+    for word in words:
+        word_prefixes, word_trigrams = _get_postings(word)
+        prefixes |= word_prefixes
+        trigrams |= word_trigrams
+    
+    for prefix in prefixes:
+        _prefixes.setdefault(prefix, set()).add(channel_id)
+    for trigram in trigrams:
+        _trigrams.setdefault(trigram, set()).add(channel_id)
+    username = normalize(key[1])
+    if username:
+        _usernames[username] = channel_id
+    
+    _docs[channel_id] = {"key": key, "username": username, "words": words,
+                         "prefixes": prefixes, "trigrams": trigrams}
+    _set_fields(channel_id, channel_data)
+
+def _discard(postings: Dict[str, Set[str]], keys: Set[str], channel_id: str):
+    for key in keys:
+        channel_ids = postings[key]
+        channel_ids.discard(channel_id)
+        if not channel_ids:
+            del postings[key]
+
+def _remove(channel_id: str):
+    """Drop a channel from the index."""
+    doc = _docs.pop(channel_id)
+    _discard(_prefixes, doc["prefixes"], channel_id)
+    _discard(_trigrams, doc["trigrams"], channel_id)
+    if _usernames.get(doc["username"]) == channel_id:
+        del _usernames[doc["username"]]
+    del _subscribers[channel_id]
+    _sfw.discard(channel_id)
+
+def _apply(channels: Dict[str, Dict]):
+    """Bring the index in line with the channels, re-indexing only the ones whose names changed."""
+    for channel_id in [channel_id for channel_id in _docs if channel_id not in channels]:
+        _remove(channel_id)
+    
+    for channel_id, channel_data in channels.items():
+        doc = _docs.get(channel_id)
+        if doc is not None:
+            if doc["key"] == _get_key(channel_data):
+                _set_fields(channel_id, channel_data)
+                continue
+            _remove(channel_id)
+        _add(channel_id, channel_data)
+
+def _ensure_current():
+    """Catch the index up with the channel file, e.g. after another process saved it."""
+    global _version
+    version = storage.get_file_version(config.CHANNELS_FILE)
+    if version == _version:
+        return
+    
+    logger.info(f"Updating the search index ({'changed' if _version else 'first build'})")
+    _apply(storage.get_channels())
+    _version = version
+
+def _on_change(name: str, data: Dict):
+    """Apply channels saved by this process right away, without reading them back."""
+    global _version
+    if name != storage.DATA_CHANNELS:
+        return
+    with _lock:
+        # Until the first search there's nothing to keep up to date
+        if _version is None:
+            return
+        _apply(data)
+        _version = storage.get_file_version(config.CHANNELS_FILE)
+
+def build_index():
+    """Build the search index now instead of on the first search."""
+    with _lock:
+        _ensure_current()
+    logger.info(f"Search index holds {len(_docs)} channels")
+
+def _match(term: str) -> Tuple[Set[str], Set[str]]:
+    """Find the channels with a word containing a query word.
+    
+    Returns:
+        The channels found, and those of them with a word starting with it
+    """
+    if len(term) < TRIGRAM_MIN_LENGTH:
+        matches = _prefixes.get(term, set())
+        return matches, matches
+    
+    postings = [_trigrams.get(trigram) for trigram in _get_postings(term)[1]]
+    if not all(postings):
+        return set(), set()
+    postings.sort(key=len)
+    # Trigrams can all be present without being in one word, in that order
+    matches = {channel_id for channel_id in postings[0].intersection(*postings[1:])
+               if any(term in word for word in _docs[channel_id]["words"])}
+    starting = {channel_id for channel_id in matches & _prefixes.get(term[:TRIGRAM_MIN_LENGTH - 1], set())
+                if any(word.startswith(term) for word in _docs[channel_id]["words"])}
+    return matches, starting
+
+def search(query: str, limit: int = 20, is_sfw: Optional[bool] = None) -> List[Dict]:
+    """Find approved channels by title or username.
+    
+    Every word of the query has to be found in the channel's title or
+    username: at the start of a word if it's shorter than three letters, and
+    anywhere in a word otherwise. Case, diacritics, ґ/г and apostrophes are
+    ignored. An exact username comes first, then the channels whose words
+    start with the query words, then the rest, the largest first.
+    
+    The index is kept in memory and updated as channels are saved, so a
+    search doesn't read the channel file.
+    
+    Args:
+        query: Words to look for; a leading @ is ignored
+        limit: Maximum number of channels to return
+        is_sfw: Only find SFW (True) or NSFW (False) channels, if given
+    
+    Returns:
+        The best matches with their channel ID, title, username, subscriber
+        count and type
+    """
+    normalized = normalize(query.strip().lstrip("@"))
+    terms = set(_WORD.findall(normalized))
+    if not terms or limit <= 0:
+        return []
+    
+    with _lock:
+        _ensure_current()
+        matches = starting = None
+        for term in terms:
+            term_matches, term_starting = _match(term)
+            matches = term_matches if matches is None else matches & term_matches
+            starting = term_starting if starting is None else starting & term_starting
+            if not matches:
+                return []
+        if is_sfw is not None:
+            matches = matches & _sfw if is_sfw else matches - _sfw
+        
+        best = []
+        exact = _usernames.get(normalized)
+        if exact in matches:
+            best.append(exact)
+        for tier in (matches & starting, matches - starting):
+            tier.discard(exact)
+            if len(best) >= limit:
+                break
+            best.extend(heapq.nlargest(limit - len(best), tier, key=_subscribers.__getitem__))
+        return [dict(_docs[channel_id]["result"]) for channel_id in best]
+
+storage.add_change_listener(_on_change)
@@ -0,0 +1,160 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import telebot
+
+import config
+from utils import storage
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Sender ID of the main bot, which also handles all user interaction
+PRIMARY_SENDER = "primary"
+
+# Every sender bot has its own flood limit, and so its own limiter
+_limiters = {}
+_bots = {}
+_lock = threading.Lock()
+
+# Sender bot user IDs keyed by channel ID; channels not in here use the primary bot.
+# Every process keeps a copy, read again whenever another process saved the file.
+_assignments = None
+_version = None
+
+def _get_assignments() -> Dict[str, str]:
+    """Get the channel assignments, loading them if they changed since they were last loaded."""
+    global _assignments, _version
+    version = storage.get_file_version(config.SENDER_ASSIGNMENTS_FILE)
+    if _assignments is None or version != _version:
+        _assignments = storage.get_sender_assignments()
+        _version = version
+    return _assignments
+
+@contextmanager
+def _update() -> Iterator[Dict[str, str]]:
+    """Change the channel assignments, starting from the ones saved last, by any process.
+
+    The change is made under the storage lock, so assignments made at the
+    same time by other processes aren't overwritten.
+    """
+    global _version
+    with storage.transaction(), _lock:
+        assignments = _get_assignments()
+        yield assignments
+        if storage.save_sender_assignments(assignments):
+            _version = storage.get_file_version(config.SENDER_ASSIGNMENTS_FILE)
+        else:
+            logger.error("Failed to save sender bot assignments")
+
+def get_sender_tokens() -> Dict[str, str]:
+    """Get the tokens of the extra sender bots, keyed by the bot's user ID."""
+    return {token.split(":")[0]: token for token in config.SENDER_TOKENS}
+
+def get_sender_token(sender_id: str) -> str:
+    """Get the bot token of a sender."""
+    if sender_id == PRIMARY_SENDER:
+        return config.TOKEN
+    return get_sender_tokens()[sender_id]
+
+def get_sender_bot(sender_id: str) -> telebot.TeleBot:
+    """Get the bot that sends on behalf of a sender (not used for the primary bot)."""
+    with _lock:
+        if sender_id not in _bots:
+            _bots[sender_id] = telebot.TeleBot(get_sender_token(sender_id), threaded=False)
+        return _bots[sender_id]
+
+def get_sender_limiter(sender_id: str) -> RateLimiter:
+    """Get the send rate limiter of a sender, shared by every run and retry."""
+    with _lock:
+        if sender_id not in _limiters:
+            _limiters[sender_id] = RateLimiter(config.CROSSPOST_MAX_SENDS_PER_SECOND)
+        return _limiters[sender_id]
+
+def get_total_send_rate() -> float:
+    """Get the combined send rate of the primary bot and all sender bots."""
+    return config.CROSSPOST_MAX_SENDS_PER_SECOND * (1 + len(config.SENDER_TOKENS))
+
+def get_channel_sender(channel_id: str) -> str:
+    """Get the sender that posts to a channel.
+
+    Channels without a sender bot, or whose sender bot is no longer
+    configured, are posted to by the primary bot.
+    """
+    with _lock:
+        sender_id = _get_assignments().get(str(channel_id))
+    if sender_id and sender_id in get_sender_tokens():
+        return sender_id
+    return PRIMARY_SENDER
+
+def _can_post(sender_id: str, channel_id: str) -> bool:
+    """Check whether a sender bot is an administrator allowed to post in a channel."""
+    get_sender_limiter(sender_id).acquire()
+    try:
+        member = get_sender_bot(sender_id).get_chat_member(int(channel_id), int(sender_id))
+    except Exception as e:
+        logger.debug(f"Sender bot {sender_id} can't check channel {channel_id}: {e}")
+        return False
+
+    if member.status == "creator":
+        return True
+    return member.status == "administrator" and getattr(member, "can_post_messages", None) is not False
+
+def assign_senders(channel_ids: List[str]) -> Dict[str, str]:
+    """Assign channels without a working sender to a sender bot that is an admin there.
+
+    Among the sender bots that can post to a channel, the one with the fewest
+    channels is picked, so the load stays spread out. Channels no sender bot
+    can post to are left to the primary bot.
+
+    Args:
+        channel_ids: IDs of the channels to assign
+
+    Returns:
+        The new assignments, by channel ID
+    """
+    sender_tokens = get_sender_tokens()
+    if not sender_tokens:
+        return {}
+
+    with _lock:
+        assignments = dict(_get_assignments())
+    unassigned = [channel_id for channel_id in map(str, channel_ids) if assignments.get(channel_id) not in sender_tokens]
+
+    # Check every sender bot in every unassigned channel in parallel, each sender under its own limiter
+    probes = [(channel_id, sender_id) for channel_id in unassigned for sender_id in sender_tokens]
+    with ThreadPoolExecutor(max_workers=config.SENDER_CHECK_WORKERS) as executor:
+        allowed = dict(zip(probes, executor.map(lambda probe: _can_post(probe[1], probe[0]), probes)))
+
+    load = Counter(assignments.values())
+    assigned = {}
+    released = []
+    for channel_id in unassigned:
+        candidates = [sender_id for sender_id in sender_tokens if allowed[(channel_id, sender_id)]]
+        if candidates:
+            sender_id = min(candidates, key=lambda s: load[s])
+            assigned[channel_id] = sender_id
+            load[sender_id] += 1
+        elif channel_id in assignments:
+            released.append(channel_id)
+
+    if assigned or released:
+        with _update() as saved:
+            saved.update(assigned)
+            for channel_id in released:
+                saved.pop(channel_id, None)
+    logger.info(f"Assigned {len(assigned)} channels to sender bots")
+    return assigned
+
+def unassign_sender(channel_id: str):
+    """Hand a channel back to the primary bot, e.g. after its sender bot was removed there."""
+    with _lock:
+        if str(channel_id) not in _get_assignments():
+            return
+    with _update() as assignments:
+        assignments.pop(str(channel_id), None)
+    logger.info(f"Channel {channel_id} is posted to by the primary bot again")
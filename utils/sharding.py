@@ -0,0 +1,227 @@
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+from telebot.types import InlineKeyboardMarkup
+
+import config
+from utils import breaker, outbox, senders
+from utils.crosspost import _record_send_failure, get_delivery_file_id, remember_file_id, send_crosspost_message
+from utils.delivery import DeliveryPacer
+from utils.errors import ContentError, is_content_error
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+def _get_python() -> str:
+    """Get the Python interpreter to start the worker processes with.
+    
+    Under uWSGI, sys.executable is the uwsgi binary, which can't run them.
+    """
+    if config.CROSSPOST_WORKER_PYTHON:
+        return config.CROSSPOST_WORKER_PYTHON
+    if os.path.basename(sys.executable).startswith("python"):
+        return sys.executable
+    for name in ("python3", "python"):
+        candidate = os.path.join(sys.prefix, "bin", name)
+        if os.path.exists(candidate):
+            return candidate
+    return shutil.which("python3") or sys.executable
+
+# Workers are spawned rather than forked, since the parent runs the scheduler and bot threads
+_mp_context = multiprocessing.get_context("spawn")
+_mp_context.set_executable(_get_python())
+
+# Events the workers report back to the parent, which owns the outbox
+EVENT_SENDING = "sending"
+EVENT_SENT = "sent"
+EVENT_FAILED = "failed"
+
+def _serialize_error(error: Exception) -> Dict:
+    """Turn a send error into something that can be passed between processes."""
+    if isinstance(error, ApiTelegramException):
+        return {"function_name": error.function_name, "result_json": error.result_json}
+    return {"message": str(error)}
+
+def _deserialize_error(data: Dict) -> Exception:
+    """Rebuild a send error reported by a worker, so it can be classified as in-process errors are."""
+    if "result_json" in data:
+        return ApiTelegramException(data["function_name"], None, data["result_json"])
+    return Exception(data["message"])
+
+def _deliver_shard(shard: List[Dict], keyboard: InlineKeyboardMarkup, deadline: Optional[str],
+                   workers: int, events) -> int:
+    """Send one shard of a crosspost run. This runs in a worker process.
+    
+    The worker has its own bots, and therefore its own HTTP sessions, and
+    its own share of every sender's rate limit. It does not touch the outbox
+    or any other storage; every step is reported to the parent through `events`.
+    
+    Args:
+        shard: The deliveries to send, in order, with their sender and file_id resolved
+        keyboard: The CTA keyboard of the run
+        deadline: ISO timestamp the shard should be delivered by, if the sends are spread out
+        workers: Number of workers the rate limits are shared by
+        events: Queue shared with the parent
+        
+    Returns:
+        The number of deliveries the worker went through
+    """
+    limiter = RateLimiter(senders.get_total_send_rate() / workers)
+    pacer = DeliveryPacer(len(shard), datetime.fromisoformat(deadline) if deadline else None, limiter)
+    bots = {}
+    sender_limiters = {}
+    file_ids = {}
+    
+    for delivery in shard:
+        pacer.wait()
+        key = delivery["idempotency_key"]
+        sender_id = delivery["sender_id"]
+        image = (sender_id, delivery["image_path"])
+        file_id = file_ids.get(image) or delivery["file_id"]
+        
+        if sender_id not in bots:
+            bots[sender_id] = telebot.TeleBot(senders.get_sender_token(sender_id), threaded=False)
+            sender_limiters[sender_id] = RateLimiter(config.CROSSPOST_MAX_SENDS_PER_SECOND / workers)
+        sender_limiters[sender_id].acquire()
+        
+        events.put((EVENT_SENDING, key))
+        try:
+            message = send_crosspost_message(bots[sender_id], delivery, keyboard, file_id)
+        except Exception as e:
+            events.put((EVENT_FAILED, key, _serialize_error(e)))
+            if is_content_error(e):
+                # Every other channel would reject the post too
+                break
+        else:
+            if not file_id and getattr(message, "photo", None):
+                # Keep the uploaded image's file_id for the sender's rest of the shard
+                file_id = file_ids[image] = message.photo[-1].file_id
+            events.put((EVENT_SENT, key, message.message_id, file_id))
+        pacer.record_send()
+    
+    return len(shard)
+
+def _apply_event(event: tuple, deliveries: Dict[str, Dict], deadline: Optional[datetime]) -> bool:
+    """Record an event reported by a worker in the outbox.
+    
+    Returns:
+        True if the event is a successful send
+    """
+    kind, key = event[0], event[1]
+    delivery = deliveries[key]
+    
+    if kind == EVENT_SENDING:
+        outbox.mark_sending(key)
+        return False
+    
+    if kind == EVENT_FAILED:
+        _record_send_failure(delivery, _deserialize_error(event[2]), deadline)
+        return False
+    
+    message_id, file_id = event[2], event[3]
+    outbox.mark_sent(key, message_id)
+    breaker.record_success(delivery["channel_id"])
+    if file_id and file_id != delivery["file_id"]:
+        remember_file_id(delivery["image_path"], file_id, delivery["sender_id"])
+        for other in deliveries.values():
+            if other["image_path"] == delivery["image_path"] and other["sender_id"] == delivery["sender_id"]:
+                other["file_id"] = file_id
+    logger.info(f"Sent {delivery['type_tag']} crosspost to channel {delivery['channel_id']} (excluding itself from list)")
+    return True
+
+def deliver_in_shards(deliveries: List[Dict], keyboard: InlineKeyboardMarkup, pacer: DeliveryPacer) -> int:
+    """Send the deliveries of a run from a pool of worker processes.
+    
+    The deliveries are dealt out round-robin, so every shard starts with the
+    largest audiences, and each worker gets an equal slice of the global send
+    rate of every sender bot. The workers report through a queue held by a multiprocessing
+    manager, and the parent records their results in the outbox as they come
+    in. Deliveries a worker that crashed never started are queued for retry;
+    ones it was in the middle of sending are dead-lettered, as they may have
+    been posted. A post Telegram rejects for its content stops every worker
+    and raises ContentError once they're done.
+    
+    Args:
+        deliveries: The pending deliveries of the run, largest audiences first
+        keyboard: The CTA keyboard of the run
+        pacer: The run's pacer, whose deadline the workers keep to
+        
+    Returns:
+        The number of successful sends
+    """
+    workers = max(1, min(config.CROSSPOST_WORKER_PROCESSES, len(deliveries)))
+    deadline = pacer.deadline.isoformat() if pacer.deadline else None
+    
+    # Resolve senders and images once, so the workers only upload what was never uploaded
+    for delivery in deliveries:
+        delivery["sender_id"] = senders.get_channel_sender(delivery["channel_id"])
+        delivery["file_id"] = get_delivery_file_id(delivery, delivery["sender_id"])
+    shards = [deliveries[i::workers] for i in range(workers)]
+    by_key = {delivery["idempotency_key"]: delivery for delivery in deliveries}
+    
+    logger.info(f"Delivering {len(deliveries)} crossposts from {workers} worker processes")
+    
+    started = set()
+    sent_count = 0
+    content_error = None
+    
+    def apply(event: tuple):
+        nonlocal sent_count, content_error
+        if event[0] == EVENT_SENDING:
+            started.add(event[1])
+        try:
+            sent_count += _apply_event(event, by_key, pacer.deadline)
+        except ContentError as error:
+            # Keep recording the other workers' events until they've stopped too
+            content_error = error
+    
+    try:
+        with _mp_context.Manager() as manager:
+            events = manager.Queue()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context) as executor:
+                futures = [
+                    executor.submit(_deliver_shard, shard, keyboard, deadline, workers, events)
+                    for shard in shards
+                ]
+                
+                while True:
+                    try:
+                        apply(events.get(timeout=1))
+                    except queue.Empty:
+                        if all(future.done() for future in futures):
+                            break
+            
+            # Pick up whatever arrived between the last read and the workers finishing
+            while True:
+                try:
+                    apply(events.get_nowait())
+                except queue.Empty:
+                    break
+        
+        for future, shard in zip(futures, shards):
+            error = future.exception()
+            if error is None:
+                continue
+            
+            logger.error(f"Crosspost worker process failed: {error}")
+            for delivery in shard:
+                if delivery["idempotency_key"] not in started:
+                    outbox.mark_failed(delivery["idempotency_key"], f"worker process failed: {error}", datetime.now())
+        
+        if content_error:
+            raise content_error
+    finally:
+        # A worker that died mid-send never reported how the send ended
+        for run_id in {delivery["run_id"] for delivery in deliveries}:
+            outbox.dead_letter_interrupted(run_id)
+    
+    return sent_count
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import config
+from utils.storage import ensure_data_dir
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    key TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+"""
+
+class OperationFailed(Exception):
+    """Raised to the callers that waited for an operation that failed."""
+
+def _connect() -> sqlite3.Connection:
+    ensure_data_dir()
+    conn = sqlite3.connect(config.SCHEDULER_DB, timeout=30, isolation_level=None)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _get_outcome(row: sqlite3.Row):
+    """Get the result of a finished operation, or raise its error."""
+    if row["error"] is not None:
+        raise OperationFailed(row["error"])
+    return json.loads(row["result"]) if row["result"] is not None else None
+
+def _claim(key: str, holder: str, join: bool, cooldown: float) -> Optional[sqlite3.Row]:
+    """Take the key for a new call, unless a call is in flight or a fresh result can be reused.
+    
+    Returns:
+        None if the key was taken, otherwise the row of the call in flight or of the fresh result
+    """
+    now = time.time()
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    try:
+        # Take the write lock before reading, so two callers can't both start a call
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM flights WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            in_flight = row["finished_at"] is None and row["expires_at"] > now
+            fresh = (row["finished_at"] is not None and row["error"] is None and join
+                     and now - row["finished_at"] < cooldown)
+            if in_flight or fresh:
+                conn.execute("ROLLBACK")
+                return row
+        conn.execute(
+            "INSERT OR REPLACE INTO flights (key, holder, started_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, holder, now, now + config.OPERATION_LEASE_SECONDS)
+        )
+        conn.execute("COMMIT")
+        return None
+    finally:
+        conn.close()
+
+def _wait(key: str, holder: str) -> Optional[sqlite3.Row]:
+    """Wait for the call of `holder` to end.
+    
+    Returns:
+        Its row if it finished, or None if its instance died or another call took over
+    """
+    while True:
+        time.sleep(config.OPERATION_POLL_SECONDS)
+        conn = _connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM flights WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or row["holder"] != holder:
+            return None
+        if row["finished_at"] is not None:
+            return row
+        if row["expires_at"] <= time.time():
+            logger.warning(f"Operation {key} of {holder} stopped renewing its lease, giving up on it")
+            return None
+
+def _update(key: str, holder: str, **fields):
+    columns = ", ".join(f"{column} = ?" for column in fields)
+    conn = _connect()
+    try:
+        conn.execute(f"UPDATE flights SET {columns} WHERE key = ? AND holder = ?", (*fields.values(), key, holder))
+    finally:
+        conn.close()
+
+def _keep_alive(key: str, holder: str, stop: threading.Event):
+    """Renew the lease of a call until it ends."""
+    while not stop.wait(config.OPERATION_LEASE_SECONDS / 3):
+        try:
+            _update(key, holder, expires_at=time.time() + config.OPERATION_LEASE_SECONDS)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to renew the lease of operation {key}: {e}")
+
+def run(key: str, func: Callable, *args, join: bool = True, cooldown: float = 0, **kwargs):
+    """Run an operation at most once at a time per key, across all instances.
+    
+    A caller that comes in while a call with the same key is in flight waits
+    for it and gets its result (or an OperationFailed with its error) instead
+    of starting another one. A successful result that finished less than
+    `cooldown` seconds ago is returned straight away. A caller that must run the
+    operation itself, e.g. for its own arguments, passes join=False: it waits
+    for the call in flight to finish and then makes its own call, which later
+    callers can join.
+    
+    The key is held under a lease kept in SQLite, so this coordinates the
+    processes of one host. If the instance of a call dies, its lease runs out
+    after config.OPERATION_LEASE_SECONDS and the waiting callers start over.
+    
+    Args:
+        key: Name of the operation, e.g. "crosspost"
+        func: The operation; its result must be JSON-serializable
+        join: Whether to take the result of a call in flight instead of making a new one
+        cooldown: How many seconds a finished result can be reused for
+    
+    Returns:
+        The result of the call made or joined
+    """
+    holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    while True:
+        row = _claim(key, holder, join, cooldown)
+        if row is None:
+            break
+        if row["finished_at"] is not None:
+            logger.info(f"Reusing the result of operation {key} from {time.time() - row['finished_at']:.0f}s ago")
+            return _get_outcome(row)
+        
+        logger.info(f"Operation {key} is already running, waiting for it")
+        finished = _wait(key, row["holder"])
+        if finished is not None and join:
+            return _get_outcome(finished)
+    
+    stop = threading.Event()
+    threading.Thread(target=_keep_alive, args=(key, holder, stop), name=f"flight-{key}", daemon=True).start()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        _update(key, holder, finished_at=time.time(), error=str(e) or type(e).__name__)
+        raise
+    finally:
+        stop.set()
+    
+    _update(key, holder, finished_at=time.time(), result=json.dumps(result, ensure_ascii=False, default=str))
+    return result
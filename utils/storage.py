@@ -1,11 +1,41 @@
+import fcntl
 import json
 import os
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Any, Optional
 import config
 
 logger = logging.getLogger(__name__)
 
+# Names of the data passed to change listeners
+DATA_CHANNELS = "channels"
+DATA_PENDING = "pending"
+DATA_SCHEDULE = "schedule"
+
+_change_listeners = []
+
+def add_change_listener(listener: Callable[[str, Dict], None]):
+    """Get told whenever this process saves the channels, applications or schedule.
+    
+    Changes saved by other processes aren't announced; listeners that keep
+    derived data have to compare file versions for those.
+    
+    Args:
+        listener: Called with DATA_CHANNELS, DATA_PENDING or DATA_SCHEDULE and
+            the data just saved, which it must not modify
+    """
+    _change_listeners.append(listener)
+
+def _notify_change(name: str, data: Dict):
+    for listener in _change_listeners:
+        try:
+            listener(name, data)
+        except Exception as e:
+            logger.error(f"Error handling a change of the {name} data: {e}")
+
 def ensure_data_dir():
     """Ensure the data directory exists."""
     os.makedirs(config.DATA_DIR, exist_ok=True)
@@ -26,14 +56,24 @@ def load_json(filename: str) -> Dict:
         return {}
 
 def save_json(filename: str, data: Dict) -> bool:
-    """Save data to a JSON file."""
+    """Save data to a JSON file.
+    
+    The data is written to a temporary file that then replaces the old one,
+    so readers never see a file that is only partly written.
+    """
     ensure_data_dir()
+    temp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(temp_filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_filename, filename)
         return True
     except Exception as e:
         logger.error(f"Error saving data to {filename}: {e}")
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
         return False
 
 def get_channels() -> Dict[str, Dict]:
@@ -49,12 +89,23 @@ def get_user_channels(user_id: int) -> Dict[str, Dict]:
         # Check if channel is owned by this user
         if channel_data.get("owner_id") == user_id:
             user_channels[channel_id] = channel_data
-            
+    
     return user_channels
 
 def save_channels(channels: Dict[str, Dict]) -> bool:
-    """Save all approved channels."""
-    return save_json(config.CHANNELS_FILE, channels)
+    """Replace all approved channels.
+    
+    To change some channels, change them in a transaction() instead, so
+    changes saved meanwhile by other threads and processes aren't lost.
+    """
+    return _replace(DATA_CHANNELS, channels)
+
+def _save_channels(channels: Dict[str, Dict]) -> bool:
+    if not save_json(config.CHANNELS_FILE, channels):
+        return False
+    _update_stats(channels=channels)
+    _notify_change(DATA_CHANNELS, channels)
+    return True
 
 def get_pending_channels() -> Dict[str, Dict]:
     """Get all pending channel applications."""
@@ -69,71 +120,314 @@ def get_user_pending_channels(user_id: int) -> Dict[str, Dict]:
         # Check if channel is owned by this user
         if channel_data.get("owner_id") == user_id:
             user_pending[channel_id] = channel_data
-            
+    
     return user_pending
 
 def save_pending_channels(pending: Dict[str, Dict]) -> bool:
-    """Save all pending channel applications."""
-    return save_json(config.PENDING_FILE, pending)
+    """Replace all pending channel applications; see save_channels."""
+    return _replace(DATA_PENDING, pending)
+
+def _save_pending_channels(pending: Dict[str, Dict]) -> bool:
+    if not save_json(config.PENDING_FILE, pending):
+        return False
+    _update_stats(pending=pending)
+    _notify_change(DATA_PENDING, pending)
+    return True
 
 def get_schedule() -> Dict[str, Dict]:
     """Get the crossposting schedule."""
     return load_json(config.SCHEDULE_FILE)
 
 def save_schedule(schedule: Dict[str, Dict]) -> bool:
-    """Save the crossposting schedule."""
-    return save_json(config.SCHEDULE_FILE, schedule)
+    """Replace the crossposting schedule; see save_channels."""
+    return _replace(DATA_SCHEDULE, schedule)
+
+def _save_schedule(schedule: Dict[str, Dict]) -> bool:
+    if not save_json(config.SCHEDULE_FILE, schedule):
+        return False
+    _update_stats(schedule=schedule)
+    _notify_change(DATA_SCHEDULE, schedule)
+    return True
+
+def get_media_cache() -> Dict[str, Dict]:
+    """Get the Telegram file_ids of already uploaded post images."""
+    return load_json(config.MEDIA_CACHE_FILE)
+
+def save_media_cache(media_cache: Dict[str, Dict]) -> bool:
+    """Save the Telegram file_ids of already uploaded post images."""
+    return save_json(config.MEDIA_CACHE_FILE, media_cache)
+
+def get_circuit_breakers() -> Dict[str, Dict]:
+    """Get the circuit breaker state of failing channels."""
+    return load_json(config.CIRCUIT_BREAKERS_FILE)
+
+def save_circuit_breakers(breakers: Dict[str, Dict]) -> bool:
+    """Save the circuit breaker state of failing channels."""
+    return save_json(config.CIRCUIT_BREAKERS_FILE, breakers)
+
+def get_sender_assignments() -> Dict[str, str]:
+    """Get the sender bot assigned to each channel, by channel ID."""
+    return load_json(config.SENDER_ASSIGNMENTS_FILE)
+
+def save_sender_assignments(assignments: Dict[str, str]) -> bool:
+    """Save the sender bot assigned to each channel."""
+    return save_json(config.SENDER_ASSIGNMENTS_FILE, assignments)
+
+def get_refresh_state() -> Dict[str, Dict]:
+    """Get the subscriber refresh schedule and rate of change of each channel."""
+    return load_json(config.SUBSCRIBER_REFRESH_FILE)
+
+def save_refresh_state(states: Dict[str, Dict]) -> bool:
+    """Save the subscriber refresh schedule of each channel."""
+    return save_json(config.SUBSCRIBER_REFRESH_FILE, states)
+
+def get_preflight_result() -> Dict:
+    """Get the result of the last pre-flight check of bot membership."""
+    return load_json(config.PREFLIGHT_FILE)
+
+def save_preflight_result(result: Dict) -> bool:
+    """Save the result of a pre-flight check of bot membership."""
+    return save_json(config.PREFLIGHT_FILE, result)
 
 def add_pending_channel(channel_id: str, channel_data: Dict) -> bool:
     """Add a channel to the pending list."""
-    pending = get_pending_channels()
-    pending[channel_id] = channel_data
-    return save_pending_channels(pending)
+    channel_data.setdefault("created_at", datetime.now().isoformat(timespec="seconds"))
+    
+    def add(tx: "Transaction"):
+        tx.change(DATA_PENDING)[channel_id] = channel_data
+    
+    return _change(f"add the application of channel {channel_id}", add)
 
-def approve_channel(channel_id: str) -> bool:
-    """Move a channel from pending to approved."""
-    pending = get_pending_channels()
-    channels = get_channels()
+class StorageError(Exception):
+    """Raised when changed channel data could not be saved."""
+
+class Transaction:
+    """Changes to the channels, applications and schedule that are saved together.
     
-    if channel_id not in pending:
-        return False
+    Every file is loaded once, when it's first needed, and saved once when the
+    transaction ends, if it was changed. A change that can't be made raises a
+    ValueError saying why, before touching the data.
     
-    channel_data = pending.pop(channel_id)
-    channels[channel_id] = channel_data
+    All changes to these files go through transactions, including the ones
+    made by save_channels, save_pending_channels and save_schedule.
+    """
     
-    # Initialize the schedule for this channel
-    schedule = get_schedule()
-    if channel_id not in schedule:
-        # Default schedule: active all days of the week
-        schedule[channel_id] = {str(i): True for i in range(7)}
+    def __init__(self):
+        """Start a transaction without changes."""
+        self._data = {}
+        self._changed = set()
+    
+    def get(self, name: str) -> Dict[str, Dict]:
+        """Get DATA_CHANNELS, DATA_PENDING or DATA_SCHEDULE to read."""
+        if name not in self._data:
+            self._data[name] = _LOADERS[name]()
+        return self._data[name]
+    
+    def change(self, name: str) -> Dict[str, Dict]:
+        """Get DATA_CHANNELS, DATA_PENDING or DATA_SCHEDULE to change."""
+        self._changed.add(name)
+        return self.get(name)
+    
+    def replace(self, name: str, data: Dict[str, Dict]):
+        """Replace DATA_CHANNELS, DATA_PENDING or DATA_SCHEDULE as a whole."""
+        self._data[name] = data
+        self._changed.add(name)
+    
+    def _require_channel(self, channel_id: str):
+        if channel_id not in self.get(DATA_CHANNELS):
+            raise ValueError(f"Channel {channel_id} not found")
+    
+    def _require_application(self, channel_id: str):
+        if channel_id not in self.get(DATA_PENDING):
+            raise ValueError(f"No pending application for channel {channel_id}")
+    
+    def approve(self, channel_id: str):
+        """Move a channel from pending to approved."""
+        self._require_application(channel_id)
+        self.change(DATA_CHANNELS)[channel_id] = self.change(DATA_PENDING).pop(channel_id)
+        
+        # Initialize the schedule for this channel
+        if channel_id not in self.get(DATA_SCHEDULE):
+            # Default schedule: active all days of the week
+            self.change(DATA_SCHEDULE)[channel_id] = {str(i): True for i in range(7)}
+    
+    def reject(self, channel_id: str):
+        """Remove a channel from the pending list (reject application)."""
+        self._require_application(channel_id)
+        self.change(DATA_PENDING).pop(channel_id)
+    
+    def remove(self, channel_id: str):
+        """Remove a channel from the approved list."""
+        self._require_channel(channel_id)
+        self.change(DATA_CHANNELS).pop(channel_id)
+        if channel_id in self.get(DATA_SCHEDULE):
+            self.change(DATA_SCHEDULE).pop(channel_id)
+    
+    def set_schedule_day(self, channel_id: str, day: int, active: Optional[bool] = None) -> bool:
+        """Update a channel's schedule for a specific day.
+        
+        Args:
+            channel_id: The ID of the channel
+            day: The day of the week (0-6, Monday-Sunday)
+            active: True to enable, False to disable, None to toggle current state
+        
+        Returns:
+            Whether the channel is now active on that day
+        """
+        self._require_channel(channel_id)
+        if isinstance(day, bool) or not isinstance(day, int) or not 0 <= day <= 6:
+            raise ValueError(f"Invalid day {day!r}, expected 0-6 (Monday-Sunday)")
+        
+        # Initialize schedule if not exists
+        channel_schedule = self.change(DATA_SCHEDULE).setdefault(channel_id, {str(i): True for i in range(7)})
+        
+        # Toggle mode if active is None
+        if active is None:
+            active = not channel_schedule.get(str(day), True)
+            logger.info(f"Toggled schedule for channel {channel_id} on day {day} to {active}")
+        else:
+            logger.info(f"Set schedule for channel {channel_id} on day {day} to {active}")
+        channel_schedule[str(day)] = active
+        
+        # Also update the channel object's schedule
+        channel_data = self.change(DATA_CHANNELS)[channel_id]
+        channel_data.setdefault('schedule', {str(i): True for i in range(7)})[str(day)] = active
+        return active
     
-    return (save_pending_channels(pending) and 
-            save_channels(channels) and 
-            save_schedule(schedule))
-
-def reject_channel(channel_id: str) -> bool:
-    """Remove a channel from the pending list (reject application)."""
-    pending = get_pending_channels()
+    def set_schedule(self, channel_id: str, days: Dict[str, bool]):
+        """Set whether a channel is active on some days of the week.
+        
+        Args:
+            channel_id: The ID of the channel
+            days: Whether the channel is active, by day of the week ("0"-"6", Monday-Sunday)
+        """
+        self._require_channel(channel_id)
+        if not isinstance(days, dict) or not days:
+            raise ValueError('Expected the days to set, e.g. {"0": true, "6": false}')
+        
+        changes = {}
+        for day, active in days.items():
+            if not str(day).isdigit() or not 0 <= int(day) <= 6:
+                raise ValueError(f"Invalid day {day!r}, expected 0-6 (Monday-Sunday)")
+            if not isinstance(active, bool):
+                raise ValueError(f"Expected true or false for day {day}")
+            changes[int(day)] = active
+        
+        for day, active in changes.items():
+            self.set_schedule_day(channel_id, day, active)
+    
+    def set_emojis(self, channel_id: str, emojis: List[str]):
+        """Update a channel's custom emojis."""
+        self._require_channel(channel_id)
+        if not isinstance(emojis, list) or not all(isinstance(emoji, str) and emoji.strip() for emoji in emojis):
+            raise ValueError("Expected a list of emojis")
+        
+        # Keep only up to 3 emojis
+        self.change(DATA_CHANNELS)[channel_id]['emojis'] = emojis[:3]
     
-    if channel_id not in pending:
-        return False
+    def set_sfw(self, channel_id: str, is_sfw: bool):
+        """Set whether a channel is SFW or NSFW."""
+        self._require_channel(channel_id)
+        self.change(DATA_CHANNELS)[channel_id]['is_sfw'] = is_sfw
     
-    pending.pop(channel_id)
-    return save_pending_channels(pending)
+    def set_reserved_position(self, channel_id: str, position: int):
+        """Set a reserved position for a channel in crosspost lists.
+        
+        Args:
+            channel_id: The ID of the channel
+            position: The position to reserve (1-10, or 0 to remove reservation)
+        """
+        self._require_channel(channel_id)
+        if isinstance(position, bool) or not isinstance(position, int) or not 0 <= position <= 10:
+            raise ValueError(f"Invalid position {position!r}, expected 1-10, or 0 to remove the reservation")
+        
+        channel_data = self.change(DATA_CHANNELS)[channel_id]
+        # If position is 0, remove the reserved position
+        if position == 0:
+            if channel_data.pop('reserved_position', None) is not None:
+                logger.info(f"Removed reserved position for channel {channel_id}")
+        else:
+            channel_data['reserved_position'] = position
+            logger.info(f"Set reserved position {position} for channel {channel_id}")
+    
+    def commit(self):
+        """Save the changed data.
+        
+        Channels are saved before applications, so an approval cut short
+        leaves the channel approved and still pending rather than lost.
+        """
+        for name in (DATA_CHANNELS, DATA_SCHEDULE, DATA_PENDING):
+            if name in self._changed and not _SAVERS[name](self._data[name]):
+                raise StorageError(f"Failed to save the {name} data")
+        self._changed.clear()
 
-def remove_channel(channel_id: str) -> bool:
-    """Remove a channel from the approved list."""
-    channels = get_channels()
-    schedule = get_schedule()
+_LOADERS = {DATA_CHANNELS: get_channels, DATA_PENDING: get_pending_channels, DATA_SCHEDULE: get_schedule}
+_SAVERS = {DATA_CHANNELS: _save_channels, DATA_PENDING: _save_pending_channels, DATA_SCHEDULE: _save_schedule}
+
+# The transaction of the current thread, which transactions started inside it join
+_local = threading.local()
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    """Change the channel data in one go.
     
-    if channel_id not in channels:
-        return False
+    Transactions run one at a time across all threads and processes, so the
+    data can't change between being read and saved. The changes are saved
+    when the block ends, and not at all if it raises. A transaction started
+    inside another one joins it. Other small files that several processes
+    change, like the circuit breakers, are changed under the same lock.
+    
+    Yields:
+        The Transaction to make the changes with
     
-    channels.pop(channel_id)
-    if channel_id in schedule:
-        schedule.pop(channel_id)
+    Raises:
+        StorageError: If the changes could not be saved
+    """
+    current = getattr(_local, "transaction", None)
+    if current is not None:
+        yield current
+        return
+    
+    ensure_data_dir()
+    with open(config.DATA_LOCK_FILE, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _local.transaction = current = Transaction()
+        try:
+            yield current
+            current.commit()
+        finally:
+            _local.transaction = None
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _change(description: str, change: Callable[[Transaction], Any]) -> bool:
+    """Make a change in a transaction of its own.
     
-    return save_channels(channels) and save_schedule(schedule)
+    Returns:
+        True on success, False on failure
+    """
+    try:
+        with transaction() as tx:
+            change(tx)
+    except (ValueError, StorageError) as e:
+        logger.warning(f"Failed to {description}: {e}")
+        return False
+    return True
+
+def _replace(name: str, data: Dict[str, Dict]) -> bool:
+    """Replace some channel data as a whole, in a transaction of its own."""
+    return _change(f"save the {name} data", lambda tx: tx.replace(name, data))
+
+def approve_channel(channel_id: str) -> bool:
+    """Move a channel from pending to approved."""
+    return _change(f"approve channel {channel_id}", lambda tx: tx.approve(channel_id))
+
+def reject_channel(channel_id: str) -> bool:
+    """Remove a channel from the pending list (reject application)."""
+    return _change(f"reject channel {channel_id}", lambda tx: tx.reject(channel_id))
+
+def remove_channel(channel_id: str) -> bool:
+    """Remove a channel from the approved list."""
+    return _change(f"remove channel {channel_id}", lambda tx: tx.remove(channel_id))
 
 def update_channel_schedule(channel_id: str, day: int, active: Optional[bool] = None) -> bool:
     """Update a channel's schedule for a specific day.
@@ -142,42 +436,12 @@ def update_channel_schedule(channel_id: str, day: int, active: Optional[bool] =
         channel_id: The ID of the channel
         day: The day of the week (0-6, Monday-Sunday)
         active: True to enable, False to disable, None to toggle current state
-        
+    
     Returns:
         True on success, False on failure
     """
-    schedule = get_schedule()
-    channels = get_channels()
-    
-    # Make sure the channel exists in approved channels
-    if channel_id not in channels:
-        logger.error(f"Attempted to update schedule for non-existent channel: {channel_id}")
-        return False
-    
-    # Initialize schedule if not exists
-    if channel_id not in schedule:
-        schedule[channel_id] = {str(i): True for i in range(7)}
-    
-    # Toggle mode if active is None
-    if active is None:
-        current_state = schedule[channel_id].get(str(day), True)
-        schedule[channel_id][str(day)] = not current_state
-        logger.info(f"Toggled schedule for channel {channel_id} on day {day} to {not current_state}")
-    else:
-        schedule[channel_id][str(day)] = active
-        logger.info(f"Set schedule for channel {channel_id} on day {day} to {active}")
-    
-    # Also update the channel object's schedule
-    if 'schedule' not in channels[channel_id]:
-        channels[channel_id]['schedule'] = {str(i): True for i in range(7)}
-        
-    channels[channel_id]['schedule'][str(day)] = schedule[channel_id][str(day)]
-    
-    # Save both schedule and channels
-    schedule_saved = save_schedule(schedule)
-    channels_saved = save_channels(channels)
-    
-    return schedule_saved and channels_saved
+    return _change(f"update the schedule of channel {channel_id}",
+                   lambda tx: tx.set_schedule_day(channel_id, day, active))
 
 def get_channel_schedule(channel_id: str) -> Dict[str, bool]:
     """Get a channel's schedule."""
@@ -186,27 +450,415 @@ def get_channel_schedule(channel_id: str) -> Dict[str, bool]:
 
 def update_channel_emojis(channel_id: str, emojis: List[str]) -> bool:
     """Update a channel's custom emojis."""
-    channels = get_channels()
+    return _change(f"update the emojis of channel {channel_id}", lambda tx: tx.set_emojis(channel_id, emojis))
+
+def set_channel_sfw(channel_id: str, is_sfw: bool) -> bool:
+    """Set whether a channel is SFW or NSFW."""
+    return _change(f"update the type of channel {channel_id}", lambda tx: tx.set_sfw(channel_id, is_sfw))
+
+# Operations of a batch, by name, with the Transaction method and the field of its argument
+BATCH_OPERATIONS = {
+    "approve": (Transaction.approve, None),
+    "reject": (Transaction.reject, None),
+    "remove": (Transaction.remove, None),
+    "schedule": (Transaction.set_schedule, "days"),
+    "emojis": (Transaction.set_emojis, "emojis"),
+    "reserved_position": (Transaction.set_reserved_position, "position"),
+}
+
+class _BatchRejected(Exception):
+    """Raised to drop the changes of an all-or-nothing batch with a failed operation."""
+
+def _apply_operation(tx: Transaction, operation: Dict):
+    """Apply one operation of a batch, raising a ValueError if it can't be."""
+    if not isinstance(operation, dict):
+        raise ValueError("Expected an object with op and channel_id")
+    if operation.get("op") not in BATCH_OPERATIONS:
+        raise ValueError(f"Unknown op {operation.get('op')!r}, expected one of: {', '.join(BATCH_OPERATIONS)}")
+    channel_id = operation.get("channel_id")
+    if isinstance(channel_id, bool) or not isinstance(channel_id, (str, int)) or not str(channel_id):
+        raise ValueError("Missing channel_id")
+    
+    method, argument = BATCH_OPERATIONS[operation["op"]]
+    if argument is None:
+        method(tx, str(channel_id))
+    elif argument not in operation:
+        raise ValueError(f"Missing {argument}")
+    else:
+        method(tx, str(channel_id), operation[argument])
+
+def apply_batch(operations: List[Dict], all_or_nothing: bool = False) -> Dict[str, Any]:
+    """Apply many operations to the channel data in one transaction.
     
-    if channel_id not in channels:
-        return False
+    Operations are applied in order, each to the data as the ones before it
+    left it, and saved together at the end. One that can't be applied is
+    skipped, or, with `all_or_nothing`, makes the whole batch be dropped.
+    
+    Args:
+        operations: Objects with an "op" (one of BATCH_OPERATIONS), a
+            "channel_id" and, for schedule, emojis and reserved_position, the
+            new "days", "emojis" or "position"
+        all_or_nothing: Whether to save nothing if any operation fails
+    
+    Returns:
+        Whether the changes were saved, the numbers of operations applied and
+        failed, and the result of each operation, in order
+    
+    Raises:
+        StorageError: If the changes could not be saved
+    """
+    results = []
+    try:
+        with transaction() as tx:
+            for index, operation in enumerate(operations):
+                result = {"index": index}
+                if isinstance(operation, dict):
+                    result.update(op=operation.get("op"), channel_id=operation.get("channel_id"))
+                try:
+                    _apply_operation(tx, operation)
+                    result["ok"] = True
+                except ValueError as e:
+                    result.update(ok=False, error=str(e))
+                results.append(result)
+            
+            if all_or_nothing and not all(result["ok"] for result in results):
+                raise _BatchRejected()
+        committed = True
+    except _BatchRejected:
+        committed = False
+    
+    applied = sum(result["ok"] for result in results)
+    return {
+        "committed": committed,
+        "applied": applied if committed else 0,
+        "failed": len(results) - applied,
+        "results": results
+    }
+
+# Active channels by (day of week, is_sfw), rebuilt whenever the channel or schedule files change
+_day_index = {}
+_day_index_version = None
+
+def get_file_version(filename: str) -> Optional[tuple]:
+    """Get a version of a data file that changes whenever it's saved, or None if it doesn't exist.
     
-    # Keep only up to 3 emojis
-    channels[channel_id]['emojis'] = emojis[:3]
-    return save_channels(channels)
+    Saving replaces the file with a new one, so its inode tells saves apart
+    even when they have the same size within the file system's mtime
+    resolution.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
 
-def get_channels_for_day(day_of_week: int) -> List[str]:
-    """Get all channels that are active for a specific day of the week."""
+def _get_day_index() -> Dict[tuple, List[str]]:
+    """Get the index of active channels by day, rebuilding it if the data changed."""
+    global _day_index, _day_index_version
+    version = (get_file_version(config.CHANNELS_FILE), get_file_version(config.SCHEDULE_FILE))
+    if version == _day_index_version:
+        return _day_index
+    
     channels = get_channels()
     schedule = get_schedule()
     
-    active_channels = []
+    index = {(day, is_sfw): [] for day in range(7) for is_sfw in (True, False)}
     for channel_id, channel_data in channels.items():
         channel_schedule = schedule.get(channel_id, {str(i): True for i in range(7)})
-        if channel_schedule.get(str(day_of_week), True):
-            active_channels.append(channel_id)
+        for day in range(7):
+            if channel_schedule.get(str(day), True):
+                index[(day, channel_data.get("is_sfw", True))].append(channel_id)
+    
+    _day_index, _day_index_version = index, version
+    return index
+
+def get_channels_for_day(day_of_week: int, is_sfw: Optional[bool] = None) -> List[str]:
+    """Get all channels that are active for a specific day of the week.
+    
+    Args:
+        day_of_week: The day of the week (0-6, Monday-Sunday)
+        is_sfw: Only get SFW (True) or NSFW (False) channels, if given
     
-    return active_channels
+    Returns:
+        The IDs of the active channels
+    """
+    index = _get_day_index()
+    if is_sfw is not None:
+        return list(index[(day_of_week, is_sfw)])
+    return index[(day_of_week, True)] + index[(day_of_week, False)]
+
+def get_generation() -> str:
+    """Get the generation of the channel data.
+    
+    The generation changes whenever the channels, the applications or the
+    schedule are saved, by any process, so pages and API responses built from
+    them can be cached until it does. Getting it costs three stat calls.
+    
+    Returns:
+        An opaque token of the current generation
+    """
+    versions = (
+        get_file_version(config.CHANNELS_FILE),
+        get_file_version(config.PENDING_FILE),
+        get_file_version(config.SCHEDULE_FILE)
+    )
+    return "-".join(".".join(f"{part:x}" for part in version) if version else "0" for version in versions)
+
+# Network statistics, kept up to date by the save functions so reading them needs
+# no scan of the channels. Every part records the version of the files it was
+# computed from and is recomputed if they were changed some other way.
+_stats = None
+_stats_version = None
+
+def _get_bucket_label(subscribers: int) -> str:
+    """Get the label of the channel size histogram bucket a subscriber count falls in."""
+    lower = 0
+    for upper in config.STATS_SUBSCRIBER_BUCKETS:
+        if subscribers < upper:
+            return f"{lower}-{upper - 1}"
+        lower = upper
+    return f"{lower}+"
+
+def get_subscriber_bucket_labels() -> List[str]:
+    """Get the labels of the channel size histogram buckets, smallest first."""
+    return [_get_bucket_label(bound) for bound in (0, *config.STATS_SUBSCRIBER_BUCKETS)]
+
+def _summarize_channels(channels: Dict[str, Dict]) -> Dict:
+    """Count the channels by content type and size, and sum their subscribers."""
+    buckets = dict.fromkeys(get_subscriber_bucket_labels(), 0)
+    sfw_count = 0
+    total_subscribers = 0
+    for channel_data in channels.values():
+        subscribers = int(channel_data.get("subscribers", 0) or 0)
+        total_subscribers += subscribers
+        buckets[_get_bucket_label(subscribers)] += 1
+        if channel_data.get("is_sfw", True):
+            sfw_count += 1
+    
+    return {
+        "total_channels": len(channels),
+        "sfw_channels": sfw_count,
+        "nsfw_channels": len(channels) - sfw_count,
+        "total_subscribers": total_subscribers,
+        "subscriber_buckets": buckets
+    }
+
+def _summarize_days(channels: Dict[str, Dict], schedule: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Count the channels taking part on each day of the week, by content type."""
+    days = {str(day): {"sfw": 0, "nsfw": 0} for day in range(7)}
+    for channel_id, channel_data in channels.items():
+        group = "sfw" if channel_data.get("is_sfw", True) else "nsfw"
+        channel_schedule = schedule.get(channel_id, {})
+        for day in days:
+            if channel_schedule.get(day, True):
+                days[day][group] += 1
+    return days
+
+def _get_stats_versions() -> Dict[str, Optional[tuple]]:
+    """Get the versions of the files each part of the statistics is computed from."""
+    channels_version = get_file_version(config.CHANNELS_FILE)
+    return {
+        "channels": channels_version,
+        "pending": get_file_version(config.PENDING_FILE),
+        "days": (channels_version, get_file_version(config.SCHEDULE_FILE))
+    }
+
+def _to_version(value) -> Optional[tuple]:
+    """Turn a version read back from JSON into a tuple again."""
+    if isinstance(value, list):
+        return tuple(_to_version(item) for item in value)
+    return value
+
+def _update_stats(channels: Optional[Dict] = None, pending: Optional[Dict] = None,
+                  schedule: Optional[Dict] = None) -> Dict:
+    """Bring the parts of the statistics computed from the data just saved up to date.
+    
+    Returns:
+        The statistics, even if they could not be saved
+    """
+    global _stats, _stats_version
+    stats = load_json(config.STATS_FILE)
+    versions = _get_stats_versions()
+    
+    if channels is not None:
+        stats["channels"] = dict(_summarize_channels(channels), version=versions["channels"])
+    if pending is not None:
+        stats["pending"] = {"count": len(pending), "version": versions["pending"]}
+    if channels is not None or schedule is not None:
+        days = _summarize_days(channels if channels is not None else get_channels(),
+                               schedule if schedule is not None else get_schedule())
+        stats["days"] = {"counts": days, "version": versions["days"]}
+    
+    if save_json(config.STATS_FILE, stats):
+        _stats, _stats_version = None, None
+    else:
+        logger.warning("Failed to save the network statistics, they will be recomputed")
+    return stats
+
+def get_network_stats() -> Dict:
+    """Get the statistics of the whole network.
+    
+    The statistics are maintained as channels, applications and schedules are
+    saved, so this only reads a small file, and nothing when they haven't
+    changed since the last call.
+    
+    Returns:
+        The numbers of approved, SFW and NSFW channels and pending applications,
+        the sum of subscribers, the channel size histogram and the numbers of
+        SFW and NSFW channels taking part on each day of the week
+    """
+    global _stats, _stats_version
+    versions = _get_stats_versions()
+    version = (get_file_version(config.STATS_FILE), versions["channels"], versions["pending"], versions["days"])
+    if version == _stats_version:
+        return _stats
+    
+    stats = load_json(config.STATS_FILE)
+    stale = [part for part in versions if part not in stats or _to_version(stats[part]["version"]) != versions[part]]
+    if stale:
+        logger.info(f"Recomputing network statistics: {', '.join(stale)}")
+        channels = get_channels() if {"channels", "days"} & set(stale) else None
+        stats = _update_stats(
+            channels=channels,
+            pending=get_pending_channels() if "pending" in stale else None,
+            schedule=get_schedule() if "days" in stale else None
+        )
+        version = (get_file_version(config.STATS_FILE), *version[1:])
+    
+    network_stats = {key: value for key, value in stats["channels"].items() if key != "version"}
+    network_stats["pending_applications"] = stats["pending"]["count"]
+    network_stats["channels_by_day"] = stats["days"]["counts"]
+    
+    _stats, _stats_version = network_stats, version
+    return network_stats
+
+# Ways the channel and application lists can be sorted; "added" is the order they were saved in
+SORT_ADDED = "added"
+SORT_SUBSCRIBERS = "subscribers"
+SORT_TITLE = "title"
+SORT_KEYS = (SORT_ADDED, SORT_SUBSCRIBERS, SORT_TITLE)
+
+# Sorted and filtered lists of channels and applications, by data file, rebuilt when it changes
+_list_indexes = {}
+
+# Filtered result lists kept per index; a list is only built again after the data changes
+MAX_CACHED_QUERIES = 64
+
+def _get_title(channel_data: Dict) -> str:
+    return channel_data.get("title") or channel_data.get("name") or ""
+
+def _build_list_index(records: Dict[str, Dict], schedule: Dict[str, Dict]) -> Dict:
+    """Precompute the sort orders and filter sets of a channel list."""
+    ids = list(records)
+    days = {day: set() for day in range(7)}
+    owners = {}
+    for channel_id, channel_data in records.items():
+        channel_schedule = schedule.get(channel_id, {})
+        for day in range(7):
+            if channel_schedule.get(str(day), True):
+                days[day].add(channel_id)
+        owners.setdefault(channel_data.get("owner_id"), set()).add(channel_id)
+    
+    return {
+        "records": records,
+        "orders": {
+            SORT_ADDED: ids,
+            SORT_SUBSCRIBERS: sorted(ids, key=lambda channel_id: int(records[channel_id].get("subscribers", 0) or 0)),
+            SORT_TITLE: sorted(ids, key=lambda channel_id: _get_title(records[channel_id]).casefold())
+        },
+        "sfw": {channel_id for channel_id in ids if records[channel_id].get("is_sfw", True)},
+        "reserved": {channel_id for channel_id in ids if "reserved_position" in records[channel_id]},
+        "days": days,
+        "owners": owners,
+        "results": {}
+    }
+
+def _get_list_index(pending: bool) -> Dict:
+    """Get the list index of the channels or the applications, rebuilding it if the data changed."""
+    if pending:
+        filename = config.PENDING_FILE
+        version = get_file_version(config.PENDING_FILE)
+    else:
+        filename = config.CHANNELS_FILE
+        version = (get_file_version(config.CHANNELS_FILE), get_file_version(config.SCHEDULE_FILE))
+    
+    cached = _list_indexes.get(filename)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    if pending:
+        records = get_pending_channels()
+        # Applications carry the schedule they were submitted with
+        schedule = {channel_id: data.get("schedule", {}) for channel_id, data in records.items()}
+    else:
+        records = get_channels()
+        schedule = get_schedule()
+    
+    index = _build_list_index(records, schedule)
+    _list_indexes[filename] = (version, index)
+    return index
+
+def query_channels(pending: bool = False, sort: str = SORT_ADDED, descending: bool = False,
+                   page: int = 1, page_size: int = 50, is_sfw: Optional[bool] = None,
+                   day: Optional[int] = None, reserved: Optional[bool] = None,
+                   owner_id: Optional[int] = None) -> Dict[str, Any]:
+    """Get one page of the approved channels or the applications.
+    
+    The sort orders and filter sets are computed once per change of the data,
+    and every filtered list once per query, so fetching a page costs the same
+    however large the network is.
+    
+    Args:
+        pending: Whether to list the applications instead of the approved channels
+        sort: One of SORT_KEYS
+        descending: Whether to list the largest, last or latest first
+        page: The page to get, from 1
+        page_size: The number of channels on a page
+        is_sfw: Only list SFW (True) or NSFW (False) channels, if given
+        day: Only list channels active on this day of the week (0-6), if given
+        reserved: Only list channels with (True) or without (False) a reserved position, if given
+        owner_id: Only list the channels of this user, if given
+    
+    Returns:
+        The page's channels by ID, in order, with the total number of matches,
+        the page number and size and the number of pages. The channel data is
+        shared with the index and must not be modified.
+    """
+    index = _get_list_index(pending)
+    if sort not in SORT_KEYS:
+        sort = SORT_ADDED
+    
+    key = (sort, descending, is_sfw, day, reserved, owner_id)
+    ids = index["results"].get(key)
+    if ids is None:
+        ids = index["orders"][sort]
+        if is_sfw is not None:
+            ids = [channel_id for channel_id in ids if (channel_id in index["sfw"]) == is_sfw]
+        if day is not None:
+            ids = [channel_id for channel_id in ids if channel_id in index["days"].get(day, ())]
+        if reserved is not None:
+            ids = [channel_id for channel_id in ids if (channel_id in index["reserved"]) == reserved]
+        if owner_id is not None:
+            owned = index["owners"].get(owner_id, set())
+            ids = [channel_id for channel_id in ids if channel_id in owned]
+        if descending:
+            ids = ids[::-1]
+        
+        if len(index["results"]) >= MAX_CACHED_QUERIES:
+            index["results"].clear()
+        index["results"][key] = ids
+    
+    page_size = max(1, page_size)
+    pages = max(1, -(-len(ids) // page_size))
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    return {
+        "channels": {channel_id: index["records"][channel_id] for channel_id in ids[start:start + page_size]},
+        "total": len(ids),
+        "page": page,
+        "page_size": page_size,
+        "pages": pages
+    }
 
 def get_channel_info(channel_id: str) -> Optional[Dict]:
     """Get information about a specific channel."""
@@ -222,14 +874,14 @@ def is_channel_approved(channel_id: str) -> bool:
     """Check if a channel is in the approved list."""
     channels = get_channels()
     return channel_id in channels
-    
+
 def is_channel_owner(channel_id: str, user_id: int) -> bool:
     """Check if a user owns a specific channel.
     
     Args:
         channel_id: The ID of the channel
         user_id: The ID of the user
-        
+    
     Returns:
         True if the user owns the channel, False otherwise
     """
@@ -242,7 +894,7 @@ def is_channel_owner(channel_id: str, user_id: int) -> bool:
     pending = get_pending_channels()
     if channel_id in pending and pending[channel_id].get("owner_id") == user_id:
         return True
-        
+    
     return False
 
 def set_channel_reserved_position(channel_id: str, position: int) -> bool:
@@ -251,39 +903,19 @@ def set_channel_reserved_position(channel_id: str, position: int) -> bool:
     Args:
         channel_id: The ID of the channel
         position: The position to reserve (1-10, or 0 to remove reservation)
-        
+    
     Returns:
         True on success, False on failure
     """
-    channels = get_channels()
-    
-    if channel_id not in channels:
-        logger.error(f"Attempted to set reserved position for non-existent channel: {channel_id}")
-        return False
-    
-    # If position is 0, remove the reserved position
-    if position == 0:
-        if 'reserved_position' in channels[channel_id]:
-            del channels[channel_id]['reserved_position']
-            logger.info(f"Removed reserved position for channel {channel_id}")
-    else:
-        # Validate position (1-10)
-        if position < 1 or position > 10:
-            logger.error(f"Invalid position {position} for channel {channel_id}")
-            return False
-            
-        # Set the reserved position
-        channels[channel_id]['reserved_position'] = position
-        logger.info(f"Set reserved position {position} for channel {channel_id}")
-    
-    return save_channels(channels)
+    return _change(f"set the reserved position of channel {channel_id}",
+                   lambda tx: tx.set_reserved_position(channel_id, position))
 
 def get_channels_with_reserved_positions(is_sfw: Optional[bool] = None) -> Dict[int, str]:
     """Get all channels with reserved positions.
     
     Args:
         is_sfw: If provided, filter channels by SFW/NSFW status
-        
+    
     Returns:
         Dictionary mapping position -> channel_id
     """
@@ -294,11 +926,11 @@ def get_channels_with_reserved_positions(is_sfw: Optional[bool] = None) -> Dict[
         # Skip if channel doesn't have a reserved position
         if 'reserved_position' not in channel_data:
             continue
-            
+        
         # Skip if we're filtering by SFW/NSFW and this channel doesn't match
         if is_sfw is not None and channel_data.get('is_sfw', True) != is_sfw:
             continue
-            
+        
         position = channel_data['reserved_position']
         reserved_positions[position] = channel_id
     
@@ -0,0 +1,312 @@
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from utils import storage
+
+logger = logging.getLogger(__name__)
+
+# Formats of exports and imports
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+
+# Kinds of records, and the data they are kept in
+RECORD_CHANNEL = "channel"
+RECORD_PENDING = "pending"
+RECORD_SCHEDULE = "schedule"
+RECORD_TYPES = {
+    RECORD_CHANNEL: storage.DATA_CHANNELS,
+    RECORD_PENDING: storage.DATA_PENDING,
+    RECORD_SCHEDULE: storage.DATA_SCHEDULE,
+}
+
+# The first line of an NDJSON export, which imports skip
+RECORD_EXPORT = "export"
+EXPORT_VERSION = 1
+
+# Columns of a CSV export; fields of a channel that have no column of their own go into "extra" as JSON
+CSV_FIELDS = ["type", "channel_id", "title", "username", "is_sfw", "subscribers", "owner_id",
+              "emojis", "reserved_position", "days", "extra"]
+_CSV_CHANNEL_FIELDS = {"title", "username", "is_sfw", "subscribers", "owner_id", "emojis",
+                       "reserved_position", "schedule"}
+
+# Records serialized before a piece of the export is handed to the client
+EXPORT_BATCH_RECORDS = 500
+
+# Errors listed in the result of an import; the rest are only counted
+IMPORT_MAX_ERRORS = 100
+
+def _format_days(days: Optional[Dict]) -> str:
+    """Write a schedule as seven 1s and 0s, Monday to Sunday."""
+    if days is None:
+        return ""
+    return "".join("1" if days.get(str(day), True) else "0" for day in range(7))
+
+def _parse_days(value: str) -> Dict[str, bool]:
+    if len(value) != 7 or set(value) - {"0", "1"}:
+        raise ValueError(f"Invalid days {value!r}, expected seven 1s and 0s, Monday to Sunday")
+    return {str(day): flag == "1" for day, flag in enumerate(value)}
+
+def _to_csv_row(record_type: str, channel_id: str, record: Dict) -> List[Any]:
+    if record_type == RECORD_SCHEDULE:
+        return [record_type, channel_id, "", "", "", "", "", "", "", _format_days(record), ""]
+    
+    extra = {key: value for key, value in record.items() if key not in _CSV_CHANNEL_FIELDS}
+    return [
+        record_type,
+        channel_id,
+        record.get("title", ""),
+        record.get("username", ""),
+        "" if "is_sfw" not in record else str(record["is_sfw"]).lower(),
+        record.get("subscribers", ""),
+        record.get("owner_id", ""),
+        " ".join(record.get("emojis", [])),
+        record.get("reserved_position", ""),
+        _format_days(record.get("schedule")),
+        json.dumps(extra, ensure_ascii=False) if extra else ""
+    ]
+
+def _from_csv_row(row: Dict[str, str]) -> Dict:
+    """Turn a CSV row into the record an NDJSON line would hold."""
+    record_type = row.get("type") or ""
+    record = {"type": record_type, "channel_id": row.get("channel_id") or ""}
+    if record_type == RECORD_SCHEDULE:
+        record["days"] = _parse_days(row.get("days") or "")
+        return record
+    
+    data = json.loads(row["extra"]) if row.get("extra") else {}
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object in extra")
+    for field in ("title", "username"):
+        if row.get(field):
+            data[field] = row[field]
+    for field in ("subscribers", "owner_id", "reserved_position"):
+        if row.get(field):
+            try:
+                data[field] = int(row[field])
+            except ValueError:
+                raise ValueError(f"Invalid {field} {row[field]!r}, expected a number")
+    if row.get("is_sfw"):
+        if row["is_sfw"].lower() not in ("true", "false"):
+            raise ValueError(f"Invalid is_sfw {row['is_sfw']!r}, expected true or false")
+        data["is_sfw"] = row["is_sfw"].lower() == "true"
+    if row.get("emojis"):
+        data["emojis"] = row["emojis"].split()
+    if row.get("days"):
+        data["schedule"] = _parse_days(row["days"])
+    record["data"] = data
+    return record
+
+def _take_snapshot(record_types: Iterable[str]) -> Dict[str, Dict[str, Dict]]:
+    """Read the data to export in one transaction.
+    
+    Every write of the channel data takes the same lock, so the files can't
+    change between being read, even while the bot writes.
+    """
+    with storage.transaction() as tx:
+        return {record_type: tx.get(RECORD_TYPES[record_type]) for record_type in record_types}
+
+def iter_export(export_format: str = FORMAT_NDJSON, record_types: Iterable[str] = tuple(RECORD_TYPES)) -> Iterator[str]:
+    """Export the channel registry a piece at a time.
+    
+    The data is read in one go, under the storage lock that every write of
+    the channel data takes, so the export is a consistent snapshot. The
+    snapshot is held in memory; it's serialized as it's sent, so the export
+    itself is not.
+    
+    NDJSON exports start with a line describing the export, followed by one
+    record per line: {"type": "channel" or "pending", "channel_id", "data"}
+    or {"type": "schedule", "channel_id", "days"}. CSV exports have the
+    columns CSV_FIELDS, with schedules written as seven 1s and 0s.
+    
+    Args:
+        export_format: One of FORMATS
+        record_types: Which of RECORD_TYPES to export
+    
+    Yields:
+        Pieces of the export
+    """
+    snapshot = _take_snapshot(record_types)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == FORMAT_CSV:
+        writer.writerow(CSV_FIELDS)
+    else:
+        buffer.write(json.dumps({
+            "type": RECORD_EXPORT,
+            "version": EXPORT_VERSION,
+            "exported_at": datetime.now().isoformat(),
+            "counts": {record_type: len(records) for record_type, records in snapshot.items()}
+        }) + "\n")
+    
+    count = 0
+    for record_type, records in snapshot.items():
+        for channel_id, record in records.items():
+            if export_format == FORMAT_CSV:
+                writer.writerow(_to_csv_row(record_type, channel_id, record))
+            else:
+                line = {"type": record_type, "channel_id": channel_id}
+                line["days" if record_type == RECORD_SCHEDULE else "data"] = record
+                buffer.write(json.dumps(line, ensure_ascii=False) + "\n")
+            
+            count += 1
+            if count % EXPORT_BATCH_RECORDS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+    logger.info(f"Exported {count} records as {export_format}")
+
+def _validate_days(days: Any, field: str) -> Dict[str, bool]:
+    if not isinstance(days, dict) or not all(
+            key in {str(day) for day in range(7)} and isinstance(value, bool) for key, value in days.items()):
+        raise ValueError(f"Invalid {field}, expected true or false by day \"0\"-\"6\" (Monday-Sunday)")
+    return days
+
+def _validate(record: Any) -> Tuple[str, str, Dict]:
+    """Check an imported record.
+    
+    Returns:
+        The record's type, channel ID and the data to store for it
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    record_type = record.get("type")
+    if record_type not in RECORD_TYPES:
+        raise ValueError(f"Unknown type {record_type!r}, expected one of: {', '.join(RECORD_TYPES)}")
+    
+    channel_id = record.get("channel_id")
+    if isinstance(channel_id, int) and not isinstance(channel_id, bool):
+        channel_id = str(channel_id)
+    if not isinstance(channel_id, str) or not channel_id.lstrip("-").isdigit():
+        raise ValueError(f"Invalid channel_id {channel_id!r}, expected a Telegram chat ID")
+    
+    if record_type == RECORD_SCHEDULE:
+        return record_type, channel_id, _validate_days(record.get("days"), "days")
+    
+    data = record.get("data")
+    if not isinstance(data, dict):
+        raise ValueError("Missing data")
+    if not isinstance(data.get("title"), str) or not data["title"].strip():
+        raise ValueError("Missing title")
+    if "username" in data and not isinstance(data["username"], str):
+        raise ValueError("Invalid username, expected text")
+    if "is_sfw" in data and not isinstance(data["is_sfw"], bool):
+        raise ValueError("Invalid is_sfw, expected true or false")
+    for field in ("subscribers", "owner_id", "reserved_position"):
+        if field in data and (isinstance(data[field], bool) or not isinstance(data[field], int)):
+            raise ValueError(f"Invalid {field}, expected a number")
+    if data.get("subscribers", 0) < 0:
+        raise ValueError("Invalid subscribers, expected 0 or more")
+    if "reserved_position" in data and not 1 <= data["reserved_position"] <= 10:
+        raise ValueError("Invalid reserved_position, expected 1-10")
+    if "emojis" in data and (not isinstance(data["emojis"], list)
+                             or not all(isinstance(emoji, str) for emoji in data["emojis"])):
+        raise ValueError("Invalid emojis, expected a list of emojis")
+    if "schedule" in data:
+        _validate_days(data["schedule"], "schedule")
+    return record_type, channel_id, data
+
+def _iter_records(lines: Iterable[str], import_format: str) -> Iterator[Tuple[int, Any]]:
+    """Parse an import line by line.
+    
+    Yields:
+        The line number and the record, or the ValueError it couldn't be parsed with
+    """
+    if import_format == FORMAT_CSV:
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or not {"type", "channel_id"} <= set(reader.fieldnames):
+            yield 1, ValueError("Missing the header row, with at least the type and channel_id columns")
+            return
+        for row in reader:
+            try:
+                yield reader.line_num, _from_csv_row(row)
+            except ValueError as e:
+                yield reader.line_num, e
+        return
+    
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not (isinstance(record, dict) and record.get("type") == RECORD_EXPORT):
+            yield line_number, record
+
+def _save_chunk(chunk: List[Tuple[str, str, Dict]]):
+    """Upsert a chunk of records in one transaction."""
+    with storage.transaction() as tx:
+        for record_type, channel_id, data in chunk:
+            tx.change(RECORD_TYPES[record_type])[channel_id] = data
+
+def import_records(lines: Iterable[str], import_format: str = FORMAT_NDJSON, dry_run: bool = False,
+                   chunk_size: int = config.IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Import channels, applications and schedules, as exported by iter_export.
+    
+    The lines are read as they come, and valid records are upserted, replacing
+    the stored record with the same channel ID, a chunk at a time. Every chunk
+    is saved in a transaction of its own, so no write of the bot is lost to it
+    or overwrites it, and the bot can keep writing in between. The import as
+    a whole is not atomic: changes saved between chunks apply on top of the
+    records imported before them. Invalid records are skipped.
+    
+    Args:
+        lines: The lines of the import
+        import_format: One of FORMATS
+        dry_run: Whether to only check the records, without saving them
+        chunk_size: Number of records saved per transaction
+    
+    Returns:
+        The numbers of records imported by type and of invalid records, the
+        first IMPORT_MAX_ERRORS errors with their line numbers, and, if saving
+        a chunk failed, the error it failed with. Records of the chunks before
+        it stay imported.
+    """
+    result = {
+        "dry_run": dry_run,
+        "imported": {record_type: 0 for record_type in RECORD_TYPES},
+        "invalid": 0,
+        "errors": [],
+        "chunks": 0
+    }
+    chunk = []
+    
+    def save():
+        if not dry_run:
+            _save_chunk(chunk)
+        for record_type, _, _ in chunk:
+            result["imported"][record_type] += 1
+        result["chunks"] += 1
+        chunk.clear()
+    
+    try:
+        for line_number, record in _iter_records(lines, import_format):
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                chunk.append(_validate(record))
+            except ValueError as e:
+                result["invalid"] += 1
+                if len(result["errors"]) < IMPORT_MAX_ERRORS:
+                    result["errors"].append({"line": line_number, "error": str(e)})
+                continue
+            
+            if len(chunk) >= chunk_size:
+                save()
+        if chunk:
+            save()
+    except storage.StorageError as e:
+        logger.error(f"Import stopped after {result['chunks']} chunks: {e}")
+        result["error"] = str(e)
+    
+    logger.info(f"{'Checked' if dry_run else 'Imported'} {sum(result['imported'].values())} records "
+                f"in {result['chunks']} chunks, {result['invalid']} invalid")
+    return result
@@ -0,0 +1,87 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Warm-up task states
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+# Overall readiness
+STATUS_STARTING = "starting"      # The critical path hasn't finished yet
+STATUS_WARMING_UP = "warming_up"  # Serving, with warm-up tasks still running
+STATUS_READY = "ready"
+STATUS_DEGRADED = "degraded"      # Serving, but a warm-up task failed
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="warmup")
+_lock = threading.Lock()
+_tasks = {}
+_started_at = None
+
+def mark_started():
+    """Note that the critical startup path is done and the bot is serving."""
+    global _started_at
+    with _lock:
+        _started_at = datetime.now().isoformat()
+    logger.info("Startup critical path done")
+
+def _run_task(name: str, func: Callable):
+    """Run a warm-up task and keep track of how it went."""
+    with _lock:
+        _tasks[name].update(state=TASK_RUNNING, started_at=datetime.now().isoformat())
+
+    try:
+        func()
+    except Exception as e:
+        logger.error(f"Warm-up task {name} failed: {e}")
+        with _lock:
+            _tasks[name].update(state=TASK_FAILED, finished_at=datetime.now().isoformat(), error=str(e))
+        return
+
+    with _lock:
+        _tasks[name].update(state=TASK_DONE, finished_at=datetime.now().isoformat())
+    logger.info(f"Warm-up task {name} done")
+
+def start_task(name: str, func: Callable):
+    """Run a startup task in the background instead of on the critical path.
+
+    Starting a task that is already pending or running does nothing, so a
+    re-initialization never runs the same warm-up twice at once.
+
+    Args:
+        name: Name the task is reported under
+        func: The function to call, without arguments
+    """
+    with _lock:
+        task = _tasks.get(name)
+        if task and task["state"] in (TASK_PENDING, TASK_RUNNING):
+            return
+        _tasks[name] = {"state": TASK_PENDING, "queued_at": datetime.now().isoformat()}
+    _executor.submit(_run_task, name, func)
+
+def get_readiness() -> Dict:
+    """Report how far startup has come.
+
+    Returns:
+        The overall status, when the critical path finished and the state of every warm-up task
+    """
+    with _lock:
+        tasks = {name: dict(task) for name, task in _tasks.items()}
+        started_at = _started_at
+
+    states = {task["state"] for task in tasks.values()}
+    if started_at is None:
+        status = STATUS_STARTING
+    elif states & {TASK_PENDING, TASK_RUNNING}:
+        status = STATUS_WARMING_UP
+    elif TASK_FAILED in states:
+        status = STATUS_DEGRADED
+    else:
+        status = STATUS_READY
+
+    return {"status": status, "started_at": started_at, "tasks": tasks}
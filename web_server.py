@@ -7,7 +7,9 @@ import time
 import signal
 import atexit
 from dotenv import load_dotenv
-from server import app
+from werkzeug.datastructures import Authorization
+from server import app, is_authorized
+from utils import events, leader
 
 # Configure logging
 logging.basicConfig(
@@ -105,6 +107,9 @@ def run_bot(bot_instance):
     
     while True:
         try:
+            # Only the instance holding the runner lease polls, the others just serve web requests
+            leader.wait_until_leader()
+            
             # Update heartbeat before starting
             _heartbeat_timestamp = time.time()
             
@@ -115,6 +120,10 @@ def run_bot(bot_instance):
             # Custom polling loop to update heartbeat regularly
             bot_instance.polling(none_stop=True, interval=1, timeout=30)
             
+            if not leader.is_leader():
+                logger.info("Bot polling stopped, another instance took over")
+                continue
+            
             # If we get here, polling has stopped normally
             logger.info("Bot polling ended normally")
             break
@@ -176,7 +185,7 @@ def watchdog_thread():
             
             # Check if the bot hasn't sent a heartbeat in too long
             current_time = time.time()
-            if _heartbeat_timestamp > 0 and (current_time - _heartbeat_timestamp) > 300:  # 5 minutes
+            if leader.is_leader() and _heartbeat_timestamp > 0 and (current_time - _heartbeat_timestamp) > 300:  # 5 minutes
                 logger.warning(f"Bot heartbeat timeout: {current_time - _heartbeat_timestamp} seconds since last activity")
                 
                 # Try to restart the bot completely
@@ -246,6 +255,10 @@ def main():
     is_uwsgi = bool(os.environ.get("UWSGI_ORIGINAL_PROC_NAME"))
     logger.info(f"Running under uWSGI: {is_uwsgi}")
     
+    # Live dashboard updates are streamed by the events server, which uWSGI routes /api/events to
+    if is_uwsgi:
+        events.start_server(lambda header: is_authorized(Authorization.from_header(header)))
+    
     # Check if ADMIN_PASSWORD is set
     if not os.getenv("ADMIN_PASSWORD"):
         logger.warning("ADMIN_PASSWORD environment variable not set. Using default password 'admin'.")